@@ -28,6 +28,9 @@ class Settings(BaseSettings):
     debug: bool = True
     log_file_dir: str = "/var/log/datamate/backend-python"
     rag_storage_dir: str = "/data/rag_storage"
+    rag_load_concurrency: int = 8  # 知识库文件并发加载数
+    rag_insert_batch_size: int = 32  # 单次 ainsert 提交的最大文档页数
+    rag_insert_concurrency: int = 2  # 并发 ainsert 调用数
 
     # Database
     pgsql_host: str = "datamate-database"
@@ -71,11 +74,38 @@ class Settings(BaseSettings):
     label_studio_file_path_prefix: str = "/data/local-files/?d="  # Label Studio local file serving URL prefix
 
     ls_task_page_size: int = 1000
+    ls_sync_concurrency: int = 8  # 同步标注时并发请求 Label Studio 的数量
 
     # DataMate
     dm_file_path_prefix: str = "/dataset"  # DM存储文件夹前缀
 
     datamate_jwt_enable: bool = False
 
+    # LLM Client
+    llm_model_concurrency: int = 100  # 单个模型的最大并发调用数
+    llm_model_rpm: int = 0  # 单个模型每分钟最大请求数，<=0 表示不限制
+    llm_max_connections: int = 200  # 单个模型 HTTP 连接池的最大连接数
+    llm_max_keepalive_connections: int = 100  # 单个模型 HTTP 连接池的最大空闲长连接数
+    llm_keepalive_expiry: float = 60.0  # 空闲长连接的保持时间（秒）
+    llm_request_timeout: float = 600.0  # 单次模型调用超时时间（秒）
+
+    # Data Synthesis
+    synthesis_file_concurrency: int = 4  # 同一合成任务内并发处理的文件数
+    synthesis_llm_concurrency: int = 64  # 进程内所有合成任务共享的模型调用并发数
+    synthesis_split_workers: int = 2  # 文档加载与切片的进程数
+    synthesis_export_concurrency: int = 4  # 导出合成数据时并发导出的文件数
+    synthesis_export_compression: str = ""  # 导出文件压缩方式：空（不压缩）/gzip/zstd
+
+    # Data Evaluation
+    evaluation_concurrency: int = 32  # 同一评估任务内并发评估的条目数
+    evaluation_result_batch_size: int = 200  # 评估结果批量写回的条数
+    evaluation_parse_workers: int = 2  # 解析待评估文件的进程数
+    evaluation_stats_ttl_seconds: int = 3600  # 评估任务结束后执行统计在内存中保留的秒数
+
+    # Data Ratio
+    ratio_copy_concurrency: int = 16  # 配比任务并发复制的文件数
+    ratio_link_files: bool = False  # 开启后源文件与目标在同一文件系统时使用硬链接代替复制，目标文件与源文件共享内容
+    ratio_insert_batch_size: int = 1000  # 批量插入文件记录的批大小
+
 # 全局设置实例
 settings = Settings()
@@ -54,10 +54,15 @@ def _apply_data_scope(orm_execute_state):
         with_loader_criteria(BaseEntity, criteria_fn, include_aliases=True)
     )
 
+def get_audit_user() -> str:
+    """当前上下文的审计用户，未设置时为系统用户；绕过 ORM 的批量 UPDATE 需自行写入审计字段"""
+    user = DataScopeHandle.get_user_info()
+    return (user or "").strip() or SYSTEM_USER
+
+
 @event.listens_for(Session, "before_flush")
 def _audit_before_flush(session, flush_context, instances):
-    user = DataScopeHandle.get_user_info()
-    effective_user = (user or "").strip() or SYSTEM_USER
+    effective_user = get_audit_user()
     now = datetime.now()
 
     # new -> set created_* and updated_*
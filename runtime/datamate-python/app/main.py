@@ -19,6 +19,7 @@ from app.db.session import AsyncSessionLocal
 from app.middleware import UserContextMiddleware
 from app.module import router
 from app.module.collection.schedule import load_scheduled_collection_tasks, set_collection_scheduler
+from app.module.shared.llm import OpenAIClientRegistry
 from app.module.shared.schedule import Scheduler
 
 setup_logging()
@@ -66,6 +67,7 @@ async def lifespan(app: FastAPI):
 
     # @shutdown
     collection_scheduler.shutdown()
+    await OpenAIClientRegistry.aclose()
     logger.info("DataMate Python Backend shutting down ...\n\n")
 
 # 创建FastAPI应用
@@ -1,6 +1,7 @@
+import asyncio
 import httpx
 import re
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 
 from app.core.config import settings
 from app.core.logging import get_logger
@@ -255,18 +256,88 @@ class Client:
             logger.error(f"Error while creating single task: {e}")
             return None
 
+    async def _fetch_tasks_page(
+        self,
+        project_id: int,
+        page: int,
+        page_size: int,
+        include_annotations: bool = False
+    ) -> Dict[str, Any]:
+        """获取单页任务，返回 Label Studio 原始响应"""
+        params: Dict[str, Any] = {
+            "project": project_id,
+            "page": page,
+            "page_size": page_size
+        }
+        if include_annotations:
+            # fields=all 时任务中会内联 annotations 与 predictions，避免逐个任务查询标注
+            params["fields"] = "all"
+        response = await self.client.get("/api/tasks", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def iter_project_tasks(
+        self,
+        project_id: str,
+        page_size: int = 1000,
+        include_annotations: bool = False,
+        concurrency: Optional[int] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按页流式获取项目任务
+
+        先获取第一页得到任务总数，之后的页以有限并发请求，并按页码顺序逐页返回。
+
+        Args:
+            project_id: 项目ID
+            page_size: 每页大小
+            include_annotations: 是否在任务中内联标注结果
+            concurrency: 同时请求的页数，默认使用 ls_sync_concurrency 配置
+        """
+        pid = int(project_id)
+        concurrency = max(concurrency or settings.ls_sync_concurrency, 1)
+
+        first = await self._fetch_tasks_page(pid, 1, page_size, include_annotations)
+        tasks = first.get("tasks", [])
+        if tasks:
+            yield tasks
+        total = first.get("total")
+        if total is None:
+            # 未返回总数时逐页获取，直到返回空页
+            page = 2
+            while len(tasks) >= page_size:
+                result = await self._fetch_tasks_page(pid, page, page_size, include_annotations)
+                tasks = result.get("tasks", [])
+                if tasks:
+                    yield tasks
+                page += 1
+            return
+
+        total_pages = (int(total) + page_size - 1) // page_size
+        logger.debug(f"Fetching {total} tasks for project {pid} in {total_pages} pages")
+        for window_start in range(2, total_pages + 1, concurrency):
+            window = range(window_start, min(window_start + concurrency, total_pages + 1))
+            results = await asyncio.gather(
+                *(self._fetch_tasks_page(pid, page, page_size, include_annotations) for page in window)
+            )
+            for result in results:
+                tasks = result.get("tasks", [])
+                if tasks:
+                    yield tasks
+
     async def get_project_tasks(
         self,
         project_id: str,
         page: Optional[int] = None,
-        page_size: int = 1000
+        page_size: int = 1000,
+        include_annotations: bool = False
     ) -> Optional[Dict[str, Any]]:
         """获取项目任务信息
 
         Args:
             project_id: 项目ID
-            page: 页码（从1开始）。如果为None，则获取所有任务
+            page: 页码（从1开始）。如果为None，则分页获取所有任务
             page_size: 每页大小
+            include_annotations: 是否在任务中内联标注结果
 
         Returns:
             如果指定了page参数，返回包含分页信息的字典：
@@ -292,17 +363,7 @@ class Client:
             if page is not None:
                 logger.debug(f"Fetching tasks for project {pid}, page {page} (page_size={page_size})")
 
-                response = await self.client.get(
-                    f"/api/tasks",
-                    params={
-                        "project": pid,
-                        "page": page,
-                        "page_size": page_size
-                    }
-                )
-                response.raise_for_status()
-
-                result = response.json()
+                result = await self._fetch_tasks_page(pid, page, page_size, include_annotations)
 
                 # 返回单页结果，包含分页信息
                 return {
@@ -313,27 +374,15 @@ class Client:
                     "tasks": result.get("tasks", [])
                 }
 
-            # 如果未指定page，获取所有任务
+            # 如果未指定page，分页获取所有任务
             logger.debug(f"(page) not specified, fetching all tasks.")
             all_tasks = []
+            async for tasks in self.iter_project_tasks(pid, page_size, include_annotations):
+                all_tasks.extend(tasks)
 
-            response = await self.client.get(
-                f"/api/tasks",
-                params={
-                    "project": pid
-                }
-            )
-            response.raise_for_status()
-
-            result = response.json()
-            tasks = result.get("tasks", [])
-
-            if not tasks:
+            if not all_tasks:
                 logger.debug(f"No tasks found for this project.")
-
-
-            all_tasks.extend(tasks)
-            logger.debug(f"Fetched {len(tasks)} tasks.")
+            logger.debug(f"Fetched {len(all_tasks)} tasks.")
 
             # 返回所有任务，不包含分页信息
             return {
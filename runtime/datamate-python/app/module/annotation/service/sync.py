@@ -1,6 +1,10 @@
+from datetime import datetime
 from typing import Optional, List, Dict, Any, Tuple, Set
+import asyncio
 import os
 
+import httpx
+
 from app.module.dataset import DatasetManagementService
 from sqlalchemy import update, select
 from app.db.models import DatasetFiles
@@ -571,6 +575,142 @@ class SyncService:
         # 如果DataMate的标注更新，允许覆盖
         return self._compare_timestamps(dm_tags_updated_at, ls_updated_at) > 0
     
+    @staticmethod
+    def _latest_annotation(annotations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """取更新时间最新的标注"""
+        return max(annotations, key=lambda a: a.get("updated_at") or a.get("created_at", ""))
+    
+    async def _get_tasks_annotations(self, tasks: List[Dict[str, Any]]) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        获取一批任务的标注结果
+        
+        任务中已内联 annotations 时直接使用，否则以有限并发逐个任务查询
+        """
+        semaphore = asyncio.Semaphore(max(settings.ls_sync_concurrency, 1))
+        
+        async def _get(task: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+            if "annotations" in task:
+                return task.get("annotations") or []
+            async with semaphore:
+                return await self.ls_client.get_task_annotations(task.get("id"))
+        
+        return list(await asyncio.gather(*(_get(task) for task in tasks)))
+    
+    async def _sync_task_page_to_dm(
+        self,
+        mapping: DatasetMappingResponse,
+        tasks: List[Dict[str, Any]],
+        overwrite: bool
+    ) -> Dict[str, int]:
+        """
+        将一页Label Studio任务的标注同步到DataMate
+        
+        整页文件一次查询，需要更新的文件通过一次批量UPDATE写入并提交
+        """
+        counts = {"synced": 0, "skipped": 0, "failed": 0, "conflicts_resolved": 0}
+        
+        # file_id -> (简化后的标注, 标注更新时间)，同一文件对应多个任务时保留最新的标注
+        candidates: Dict[str, Tuple[List[Dict[str, Any]], str]] = {}
+        annotations_list = await self._get_tasks_annotations(tasks)
+        for task, annotations in zip(tasks, annotations_list):
+            task_id = task.get("id")
+            file_id = task.get("data", {}).get("file_id")
+            
+            if not file_id:
+                logger.warning(f"Task {task_id} has no file_id, skipping")
+                counts["skipped"] += 1
+                continue
+            
+            if not annotations:
+                logger.debug(f"No annotations for task {task_id}, skipping")
+                counts["skipped"] += 1
+                continue
+            
+            # 简化标注结果（取最新的标注）
+            simplified_annotations, ls_updated_at = self._simplify_annotation_result(
+                self._latest_annotation(annotations)
+            )
+            
+            if not simplified_annotations:
+                logger.debug(f"Task {task_id} has no valid annotation results")
+                counts["skipped"] += 1
+                continue
+            
+            file_id = str(file_id)
+            previous = candidates.get(file_id)
+            if previous is not None:
+                counts["skipped"] += 1
+                if self._compare_timestamps(ls_updated_at, previous[1]) <= 0:
+                    continue
+            candidates[file_id] = (simplified_annotations, ls_updated_at)
+        
+        if not candidates:
+            return counts
+        
+        counts_before_update = dict(counts)
+        try:
+            # 检查文件是否存在以及是否已有标注
+            result = await self.dm_client.db.execute(
+                select(DatasetFiles.id, DatasetFiles.tags, DatasetFiles.tags_updated_at).where(
+                    DatasetFiles.id.in_(list(candidates.keys())),
+                    DatasetFiles.dataset_id == mapping.dataset_id
+                )
+            )
+            file_records = {str(row.id): row for row in result.all()}
+            
+            updates = []
+            conflicts_resolved = 0
+            for file_id, (simplified_annotations, ls_updated_at) in candidates.items():
+                file_record = file_records.get(file_id)
+                if not file_record:
+                    logger.warning(f"File {file_id} not found in dataset {mapping.dataset_id}")
+                    counts["failed"] += 1
+                    continue
+                
+                # 检查是否应该覆盖DataMate的标注（使用文件级别的tags_updated_at）
+                dm_tags_updated_at: Optional[str] = None
+                if file_record.tags_updated_at:
+                    dm_tags_updated_at = file_record.tags_updated_at.isoformat()
+                
+                if not self._should_overwrite_dm(ls_updated_at, dm_tags_updated_at, overwrite):
+                    logger.debug(f"File {file_id}: DataMate has newer or equal annotations, skipping (overwrite={overwrite})")
+                    counts["skipped"] += 1
+                    continue
+                
+                try:
+                    tags_updated_datetime = datetime.fromisoformat(ls_updated_at.replace('Z', '+00:00'))
+                except (AttributeError, ValueError) as e:
+                    logger.error(f"Failed to update annotations for file {file_id}: {e}")
+                    counts["failed"] += 1
+                    continue
+                
+                # 如果存在冲突（两边都有标注且时间戳不同），记录为冲突解决
+                if file_record.tags and ls_updated_at:
+                    conflicts_resolved += 1
+                    logger.debug(f"File {file_id}: Resolved conflict, Label Studio annotation is newer")
+                
+                updates.append({
+                    "id": file_id,
+                    "tags": simplified_annotations,
+                    "tags_updated_at": tags_updated_datetime.replace(tzinfo=None)
+                })
+            
+            if updates:
+                # 按主键批量更新tags字段和tags_updated_at
+                await self.dm_client.db.execute(update(DatasetFiles), updates)
+                await self.dm_client.db.commit()
+            counts["synced"] += len(updates)
+            counts["conflicts_resolved"] += conflicts_resolved
+            logger.debug(f"Synced annotations for {len(updates)} files")
+        
+        except Exception as e:
+            logger.error(f"Failed to update annotations for {len(candidates)} files: {e}")
+            counts = counts_before_update
+            counts["failed"] += len(candidates)
+            await self.dm_client.db.rollback()
+        
+        return counts
+    
     async def sync_annotations_from_ls_to_dm(
         self,
         mapping: DatasetMappingResponse,
@@ -596,15 +736,27 @@ class SyncService:
         conflicts_resolved = 0
         
         try:
-            # 获取Label Studio中的所有任务
-            ls_tasks_result = await self.ls_client.get_project_tasks(
-                mapping.labeling_project_id,
-                page=None
-            )
-            
-            if not ls_tasks_result:
+            # 按页流式获取Label Studio中的任务，标注结果随任务内联返回
+            page_size = getattr(settings, 'ls_task_page_size', 1000)
+            total_tasks = 0
+            try:
+                async for tasks in self.ls_client.iter_project_tasks(
+                    mapping.labeling_project_id,
+                    page_size=page_size,
+                    include_annotations=True
+                ):
+                    total_tasks += len(tasks)
+                    logger.info(f"Processing {len(tasks)} tasks, {total_tasks} fetched so far")
+                    counts = await self._sync_task_page_to_dm(mapping, tasks, overwrite)
+                    synced_count += counts["synced"]
+                    skipped_count += counts["skipped"]
+                    failed_count += counts["failed"]
+                    conflicts_resolved += counts["conflicts_resolved"]
+            except httpx.HTTPError as e:
+                if total_tasks > 0:
+                    raise
                 token_display = settings.label_studio_user_token[:10] + "..." if settings.label_studio_user_token else "None"
-                error_msg = f"Failed to fetch tasks from Label Studio project {mapping.labeling_project_id}. Please check:\n" \
+                error_msg = f"Failed to fetch tasks from Label Studio project {mapping.labeling_project_id}: {e}. Please check:\n" \
                            f"1. Label Studio is running at {settings.label_studio_base_url}\n" \
                            f"2. Project ID {mapping.labeling_project_id} exists\n" \
                            f"3. API token is valid: {token_display}"
@@ -620,10 +772,7 @@ class SyncService:
                     message=f"Failed to connect to Label Studio at {settings.label_studio_base_url}"
                 )
             
-            all_tasks = ls_tasks_result.get("tasks", [])
-            logger.info(f"Found {len(all_tasks)} tasks in Label Studio project")
-            
-            if len(all_tasks) == 0:
+            if total_tasks == 0:
                 logger.warning(f"No tasks found in Label Studio project {mapping.labeling_project_id}")
                 return SyncAnnotationsResponse(
                     id=mapping.id,
@@ -636,90 +785,6 @@ class SyncService:
                     message="No tasks found in Label Studio project"
                 )
             
-            # 批量处理任务
-            for i in range(0, len(all_tasks), batch_size):
-                batch_tasks = all_tasks[i:i + batch_size]
-                logger.info(f"Processing batch {i // batch_size + 1}, {len(batch_tasks)} tasks")
-                
-                for task in batch_tasks:
-                    task_id = task.get("id")
-                    file_id = task.get("data", {}).get("file_id")
-                    
-                    if not file_id:
-                        logger.warning(f"Task {task_id} has no file_id, skipping")
-                        skipped_count += 1
-                        continue
-                    
-                    # 获取任务的标注结果
-                    annotations = await self.ls_client.get_task_annotations(task_id)
-                    
-                    if not annotations:
-                        logger.debug(f"No annotations for task {task_id}, skipping")
-                        skipped_count += 1
-                        continue
-                    
-                    # 简化标注结果（取最新的标注）
-                    latest_annotation = max(annotations, key=lambda a: a.get("updated_at") or a.get("created_at", ""))
-                    simplified_annotations, ls_updated_at = self._simplify_annotation_result(latest_annotation)
-                    
-                    if not simplified_annotations:
-                        logger.debug(f"Task {task_id} has no valid annotation results")
-                        skipped_count += 1
-                        continue
-                    
-                    # 更新数据库中的tags字段
-                    try:
-                        # 检查文件是否存在以及是否已有标注
-                        result = await self.dm_client.db.execute(
-                            select(DatasetFiles).where(
-                                DatasetFiles.id == file_id,
-                                DatasetFiles.dataset_id == mapping.dataset_id
-                            )
-                        )
-                        file_record = result.scalar_one_or_none()
-                        
-                        if not file_record:
-                            logger.warning(f"File {file_id} not found in dataset {mapping.dataset_id}")
-                            failed_count += 1
-                            continue
-                        
-                        # 检查是否应该覆盖DataMate的标注（使用文件级别的tags_updated_at）
-                        dm_tags_updated_at: Optional[str] = None
-                        if file_record.tags_updated_at:  # type: ignore
-                            dm_tags_updated_at = file_record.tags_updated_at.isoformat()  # type: ignore
-                        
-                        if not self._should_overwrite_dm(ls_updated_at, dm_tags_updated_at, overwrite):
-                            logger.debug(f"File {file_id}: DataMate has newer or equal annotations, skipping (overwrite={overwrite})")
-                            skipped_count += 1
-                            continue
-                        
-                        # 如果存在冲突（两边都有标注且时间戳不同），记录为冲突解决
-                        if file_record.tags and ls_updated_at:  # type: ignore
-                            conflicts_resolved += 1
-                            logger.debug(f"File {file_id}: Resolved conflict, Label Studio annotation is newer")
-                        
-                        # 更新tags字段和tags_updated_at
-                        from datetime import datetime
-                        tags_updated_datetime = datetime.fromisoformat(ls_updated_at.replace('Z', '+00:00'))
-                        
-                        await self.dm_client.db.execute(
-                            update(DatasetFiles)
-                            .where(DatasetFiles.id == file_id)
-                            .values(
-                                tags=simplified_annotations,
-                                tags_updated_at=tags_updated_datetime.replace(tzinfo=None)
-                            )
-                        )
-                        await self.dm_client.db.commit()
-                        
-                        synced_count += 1
-                        logger.debug(f"Synced annotations for file {file_id}: {len(simplified_annotations)} results")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to update annotations for file {file_id}: {e}")
-                        failed_count += 1
-                        await self.dm_client.db.rollback()
-            
             logger.info(f"Annotation sync completed: synced={synced_count}, skipped={skipped_count}, failed={failed_count}, conflicts_resolved={conflicts_resolved}")
             
             status = "success" if failed_count == 0 else ("partial" if synced_count > 0 else "error")
@@ -748,6 +813,123 @@ class SyncService:
                 message=f"Sync failed: {str(e)}"
             )
     
+    async def _get_ls_task_index(self, project_id: str) -> Dict[str, Tuple[int, Optional[int], str]]:
+        """
+        分页获取项目任务，构建 file_id 到 (任务ID, 最新标注ID, 最新标注更新时间) 的映射
+        
+        只保留同步所需的字段，不在内存中保存完整的任务与标注
+        """
+        page_size = getattr(settings, 'ls_task_page_size', 1000)
+        task_index: Dict[str, Tuple[int, Optional[int], str]] = {}
+        try:
+            async for tasks in self.ls_client.iter_project_tasks(
+                project_id,
+                page_size=page_size,
+                include_annotations=True
+            ):
+                tasks = [task for task in tasks if task.get("data", {}).get("file_id") is not None]
+                annotations_list = await self._get_tasks_annotations(tasks)
+                for task, annotations in zip(tasks, annotations_list):
+                    annotation_id = None
+                    ls_updated_at = ""
+                    if annotations:
+                        latest_annotation = self._latest_annotation(annotations)
+                        annotation_id = latest_annotation.get("id")
+                        ls_updated_at = latest_annotation.get("updated_at") or latest_annotation.get("created_at", "")
+                    task_index[str(task["data"]["file_id"])] = (task.get("id"), annotation_id, ls_updated_at)
+        except Exception as e:
+            logger.error(f"Error while fetching existing tasks: {e}")
+            return {}
+        return task_index
+    
+    async def _sync_file_to_ls(
+        self,
+        file_info: Any,
+        task_index: Dict[str, Tuple[int, Optional[int], str]],
+        overwrite_ls: bool
+    ) -> Tuple[str, bool]:
+        """
+        将单个文件的标注同步到Label Studio
+        
+        Returns:
+            (同步状态 synced/skipped/failed, 是否解决了冲突)
+        """
+        file_id = str(file_info.id)
+        
+        # 检查该文件是否在Label Studio中有对应的任务
+        task_entry = task_index.get(file_id)
+        if not task_entry or not task_entry[0]:
+            logger.debug(f"File {file_id} has no corresponding task in Label Studio, skipping")
+            return "skipped", False
+        task_id, latest_annotation_id, ls_updated_at = task_entry
+        has_ls_annotations = bool(ls_updated_at) or latest_annotation_id is not None
+        
+        # 获取DataMate中的标注
+        dm_tags: List[Dict[str, Any]] = file_info.tags if file_info.tags else []  # type: ignore
+        
+        if not dm_tags:
+            logger.debug(f"File {file_id} has no annotations in DataMate, skipping")
+            return "skipped", False
+        
+        # 获取DataMate中标注的更新时间
+        dm_tags_updated_at: Optional[str] = None
+        if file_info.tags_updated_at:  # type: ignore
+            dm_tags_updated_at = file_info.tags_updated_at.isoformat()  # type: ignore
+        
+        try:
+            # 检查是否应该覆盖Label Studio的标注
+            if not self._should_overwrite_ls(dm_tags_updated_at, ls_updated_at, overwrite_ls):
+                logger.debug(f"Task {task_id}: Label Studio has newer or equal annotations, skipping (overwrite_ls={overwrite_ls})")
+                return "skipped", False
+            
+            # 如果存在冲突，记录为冲突解决
+            conflict = has_ls_annotations
+            if conflict:
+                logger.debug(f"Task {task_id}: Resolved conflict, DataMate annotation is newer")
+            
+            # 将DataMate的标注转换为Label Studio格式
+            ls_result = []
+            for tag in dm_tags:
+                ls_result_item = {
+                    "from_name": tag.get("from_name", ""),
+                    "to_name": tag.get("to_name", ""),
+                    "type": tag.get("type", ""),
+                    "value": tag.get("values", {})
+                }
+                ls_result.append(ls_result_item)
+            
+            # 如果Label Studio已有标注，更新它；否则创建新标注
+            if has_ls_annotations:
+                # 更新最新的标注
+                if not latest_annotation_id:
+                    logger.error(f"Task {task_id} has no annotation ID")
+                    return "failed", conflict
+                
+                update_result = await self.ls_client.update_annotation(
+                    int(latest_annotation_id),
+                    ls_result
+                )
+                if update_result:
+                    logger.debug(f"Updated annotation for task {task_id}")
+                    return "synced", conflict
+                logger.error(f"Failed to update annotation for task {task_id}")
+                return "failed", conflict
+            
+            # 创建新标注
+            create_result = await self.ls_client.create_annotation(
+                task_id,
+                ls_result
+            )
+            if create_result:
+                logger.debug(f"Created annotation for task {task_id}")
+                return "synced", conflict
+            logger.error(f"Failed to create annotation for task {task_id}")
+            return "failed", conflict
+        
+        except Exception as e:
+            logger.error(f"Failed to sync annotations for file {file_id} (task {task_id}): {e}")
+            return "failed", False
+    
     async def sync_annotations_from_dm_to_ls(
         self,
         mapping: DatasetMappingResponse,
@@ -773,8 +955,8 @@ class SyncService:
         conflicts_resolved = 0
         
         try:
-            # 获取Label Studio中的文件ID到任务ID的映射
-            dm_file_to_task_mapping = await self.get_existing_dm_file_mapping(mapping.labeling_project_id)
+            # 获取Label Studio中的文件ID到任务及其最新标注的映射
+            dm_file_to_task_mapping = await self._get_ls_task_index(mapping.labeling_project_id)
             
             if not dm_file_to_task_mapping:
                 logger.warning(f"No task mapping found for project {mapping.labeling_project_id}")
@@ -791,9 +973,14 @@ class SyncService:
             
             logger.info(f"Found {len(dm_file_to_task_mapping)} task mappings")
             
+            semaphore = asyncio.Semaphore(max(settings.ls_sync_concurrency, 1))
+            
+            async def _sync_file(file_info: Any) -> Tuple[str, bool]:
+                async with semaphore:
+                    return await self._sync_file_to_ls(file_info, dm_file_to_task_mapping, overwrite_ls)
+            
             # 分页获取DataMate中的文件
             page = 0
-            processed_count = 0
             
             while True:
                 files_response = await self.dm_client.get_dataset_files(
@@ -808,100 +995,16 @@ class SyncService:
                 
                 logger.info(f"Processing page {page + 1}, {len(files_response.content)} files")
                 
-                for file_info in files_response.content:
-                    file_id = str(file_info.id)
-                    processed_count += 1
-                    
-                    # 检查该文件是否在Label Studio中有对应的任务
-                    task_id = dm_file_to_task_mapping.get(file_id)
-                    if not task_id:
-                        logger.debug(f"File {file_id} has no corresponding task in Label Studio, skipping")
-                        skipped_count += 1
-                        continue
-                    
-                    # 获取DataMate中的标注
-                    dm_tags: List[Dict[str, Any]] = file_info.tags if file_info.tags else []  # type: ignore
-                    
-                    if not dm_tags:
-                        logger.debug(f"File {file_id} has no annotations in DataMate, skipping")
+                results = await asyncio.gather(*(_sync_file(file_info) for file_info in files_response.content))
+                for status, conflict in results:
+                    if status == "synced":
+                        synced_count += 1
+                    elif status == "skipped":
                         skipped_count += 1
-                        continue
-                    
-                    # 获取DataMate中标注的更新时间
-                    dm_tags_updated_at: Optional[str] = None
-                    if file_info.tags_updated_at:  # type: ignore
-                        dm_tags_updated_at = file_info.tags_updated_at.isoformat()  # type: ignore
-                    
-                    try:
-                        # 获取Label Studio中该任务的现有标注
-                        ls_annotations = await self.ls_client.get_task_annotations(task_id)
-                        
-                        # 获取Label Studio标注的更新时间
-                        ls_updated_at = ""
-                        if ls_annotations:
-                            latest_ls_annotation = max(
-                                ls_annotations, 
-                                key=lambda a: a.get("updated_at") or a.get("created_at", "")
-                            )
-                            ls_updated_at = latest_ls_annotation.get("updated_at") or latest_ls_annotation.get("created_at", "")
-                        
-                        # 检查是否应该覆盖Label Studio的标注
-                        if not self._should_overwrite_ls(dm_tags_updated_at, ls_updated_at, overwrite_ls):
-                            logger.debug(f"Task {task_id}: Label Studio has newer or equal annotations, skipping (overwrite_ls={overwrite_ls})")
-                            skipped_count += 1
-                            continue
-                        
-                        # 如果存在冲突，记录为冲突解决
-                        if ls_annotations and dm_tags:
-                            conflicts_resolved += 1
-                            logger.debug(f"Task {task_id}: Resolved conflict, DataMate annotation is newer")
-                        
-                        # 将DataMate的标注转换为Label Studio格式
-                        ls_result = []
-                        for tag in dm_tags:
-                            ls_result_item = {
-                                "from_name": tag.get("from_name", ""),
-                                "to_name": tag.get("to_name", ""),
-                                "type": tag.get("type", ""),
-                                "value": tag.get("values", {})
-                            }
-                            ls_result.append(ls_result_item)
-                        
-                        # 如果Label Studio已有标注，更新它；否则创建新标注
-                        if ls_annotations:
-                            # 更新最新的标注
-                            latest_annotation_id = latest_ls_annotation.get("id")
-                            if not latest_annotation_id:
-                                logger.error(f"Task {task_id} has no annotation ID")
-                                failed_count += 1
-                                continue
-                            
-                            update_result = await self.ls_client.update_annotation(
-                                int(latest_annotation_id),
-                                ls_result
-                            )
-                            if update_result:
-                                synced_count += 1
-                                logger.debug(f"Updated annotation for task {task_id}")
-                            else:
-                                failed_count += 1
-                                logger.error(f"Failed to update annotation for task {task_id}")
-                        else:
-                            # 创建新标注
-                            create_result = await self.ls_client.create_annotation(
-                                task_id,
-                                ls_result
-                            )
-                            if create_result:
-                                synced_count += 1
-                                logger.debug(f"Created annotation for task {task_id}")
-                            else:
-                                failed_count += 1
-                                logger.error(f"Failed to create annotation for task {task_id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Failed to sync annotations for file {file_id} (task {task_id}): {e}")
+                    else:
                         failed_count += 1
+                    if conflict:
+                        conflicts_resolved += 1
                 
                 # 检查是否还有更多页面
                 if page >= files_response.totalPages - 1:
@@ -1026,7 +1129,7 @@ class SyncService:
         dataset_info = await self.dm_client.get_dataset(dataset_id)
         
         # 获取Label Studio项目任务数量
-        tasks_info = await self.ls_client.get_project_tasks(mapping.labeling_project_id)
+        tasks_info = await self.ls_client.get_project_tasks(mapping.labeling_project_id, page=1, page_size=1)
         
         return {
             "id": mapping.id,
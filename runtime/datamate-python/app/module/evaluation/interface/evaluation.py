@@ -17,12 +17,13 @@ from app.module.evaluation.schema.evaluation import (
     PagedEvaluationTaskResponse,
     EvaluationTaskDetailResponse,
     PagedEvaluationItemsResponse,
-    EvaluationItemResponse, PagedEvaluationFilesResponse, EvaluationFileResponse
+    EvaluationItemResponse, PagedEvaluationFilesResponse, EvaluationFileResponse,
+    EvaluationTaskStatsResponse
 )
 from app.module.evaluation.schema.prompt import get_prompt
 from app.module.evaluation.schema.prompt_template import PromptTemplateResponse
 from app.module.evaluation.service.prompt_template_service import PromptTemplateService
-from app.module.evaluation.service.evaluation import EvaluationTaskService
+from app.module.evaluation.service.evaluation import EvaluationTaskService, get_evaluation_stats
 from app.module.shared.schema.common import StandardResponse, TaskStatus
 from app.module.system.service.common_service import get_model_by_id
 
@@ -291,6 +292,41 @@ async def list_evaluation_items(
     )
 
 
+@router.get("/tasks/{task_id}/stats", response_model=StandardResponse[EvaluationTaskStatsResponse])
+async def get_evaluation_task_stats(
+    task_id: str,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    获取评估任务的吞吐与时延统计
+
+    统计信息保存在执行该任务的进程中，任务未在本进程执行时仅返回任务ID
+
+    Args:
+        task_id: 任务ID
+        db: 数据库会话
+
+    Returns:
+        StandardResponse[EvaluationTaskStatsResponse]: 评估任务执行统计
+    """
+    task = await db.get(EvaluationTask, task_id)
+    if not task:
+        raise BusinessError(ErrorCodes.EVALUATION_TASK_NOT_FOUND, data={"task_id": task_id})
+
+    stats = get_evaluation_stats(task_id) or {}
+    return SuccessResponse(data=EvaluationTaskStatsResponse(
+        taskId=task_id,
+        total=stats.get("total", 0),
+        completed=stats.get("completed", 0),
+        failed=stats.get("failed", 0),
+        elapsedSeconds=stats.get("elapsed_seconds", 0),
+        throughputPerSecond=stats.get("throughput_per_second", 0),
+        avgLatencySeconds=stats.get("avg_latency_seconds", 0),
+        maxLatencySeconds=stats.get("max_latency_seconds", 0),
+        finished=stats.get("finished", False),
+    ))
+
+
 @router.get("/tasks/{task_id}", response_model=StandardResponse[EvaluationTaskDetailResponse])
 async def get_evaluation_task(
     task_id: str,
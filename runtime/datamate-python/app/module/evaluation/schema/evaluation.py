@@ -80,6 +80,19 @@ class EvaluationFileResponse(BaseModel):
 
 
 
+class EvaluationTaskStatsResponse(BaseModel):
+    """评估任务执行统计响应"""
+    task_id: str = Field(..., alias="taskId", description="任务ID")
+    total: int = Field(0, description="总条目数")
+    completed: int = Field(0, description="评估成功条目数")
+    failed: int = Field(0, description="评估失败条目数")
+    elapsed_seconds: float = Field(0, alias="elapsedSeconds", description="已运行时长（秒）")
+    throughput_per_second: float = Field(0, alias="throughputPerSecond", description="每秒评估条目数")
+    avg_latency_seconds: float = Field(0, alias="avgLatencySeconds", description="单条平均耗时（秒）")
+    max_latency_seconds: float = Field(0, alias="maxLatencySeconds", description="单条最大耗时（秒）")
+    finished: bool = Field(False, description="是否已执行结束")
+
+
 class PagedEvaluationItemsResponse(BaseModel):
     """分页评估任务响应"""
     content: List[EvaluationItemResponse]
@@ -1,25 +1,109 @@
 import json
 import uuid
 import asyncio
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Any, Optional
 
-from sqlalchemy import select, func
+from sqlalchemy import select, func, insert, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.exception import ErrorCodes, BusinessError
 from app.core.logging import get_logger
 from app.db.models import EvaluationItem, EvaluationTask, DatasetFiles
 from app.db.models.data_evaluation import EvaluationFile
 from app.db.models.data_synthesis import DataSynthesisFileInstance, SynthesisData
-from app.db.session import AsyncSessionLocal
+from app.db.session import AsyncSessionLocal, get_audit_user
 from app.module.evaluation.schema.evaluation import SourceType
 from app.module.shared.schema import TaskStatus
-from app.module.shared.util.model_chat import call_openai_style_model, extract_json_substring
+from app.module.shared.util.model_chat import acall_openai_style_model, extract_json_substring
 from app.module.evaluation.schema.prompt import get_prompt
-from app.module.shared.util.structured_file import StructuredFileHandlerFactory
+from app.module.shared.util.structured_file import load_eval_items
 from app.module.system.service.common_service import get_model_by_id
 
 logger = get_logger(__name__)
 
+
+@dataclass
+class EvaluationStats:
+    """单个评估任务的吞吐与时延统计"""
+    total: int = 0
+    completed: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_latency: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+
+    def record(self, latency: float, success: bool) -> None:
+        if success:
+            self.completed += 1
+        else:
+            self.failed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def snapshot(self) -> dict[str, Any]:
+        done = self.completed + self.failed
+        elapsed = (self.finished_at or time.monotonic()) - self.started_at
+        return {
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "elapsed_seconds": round(elapsed, 3),
+            "throughput_per_second": round(done / elapsed, 3) if elapsed > 0 else 0.0,
+            "avg_latency_seconds": round(self.total_latency / done, 3) if done else 0.0,
+            "max_latency_seconds": round(self.max_latency, 3),
+            "finished": self.finished_at is not None,
+        }
+
+
+# 进程内各评估任务的统计信息
+_TASK_STATS: dict[str, EvaluationStats] = {}
+
+EVAL_ITEM_INSERT_BATCH_SIZE = 1000
+_parse_pool: ProcessPoolExecutor | None = None
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """评估条目解析为 CPU 密集操作，放到独立进程池中执行，避免阻塞事件循环。"""
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=max(settings.evaluation_parse_workers, 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def _reset_parse_pool() -> None:
+    global _parse_pool
+    if _parse_pool is not None:
+        _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def _evict_expired_stats() -> None:
+    """移除结束时间超过保留时长的任务统计，避免进程内统计信息无限增长"""
+    deadline = time.monotonic() - settings.evaluation_stats_ttl_seconds
+    expired = [task_id for task_id, stats in _TASK_STATS.items()
+               if stats.finished_at is not None and stats.finished_at < deadline]
+    for task_id in expired:
+        del _TASK_STATS[task_id]
+
+
+def get_evaluation_stats(task_id: str) -> Optional[dict[str, Any]]:
+    """获取评估任务在当前进程中的吞吐与时延统计，任务未在本进程执行或统计已过期时返回 None"""
+    _evict_expired_stats()
+    stats = _TASK_STATS.get(task_id)
+    return stats.snapshot() if stats else None
+
+
 class EvaluationExecutor:
     def __init__(self, db: AsyncSession, task: EvaluationTask):
         self.db = db
@@ -28,6 +112,24 @@ class EvaluationExecutor:
     async def save_eval_items(self):
         pass
 
+    async def _insert_items(self, file_id: str, items: list[tuple[str, str]]) -> None:
+        """以多行 INSERT ... VALUES 批量写入评估条目，items 为 (条目ID, 条目JSON) 列表"""
+        for i in range(0, len(items), EVAL_ITEM_INSERT_BATCH_SIZE):
+            await self.db.execute(insert(EvaluationItem), [
+                {
+                    "id": str(uuid.uuid4()),
+                    "task_id": self.task.id,
+                    "file_id": file_id,
+                    "item_id": item_id,
+                    "eval_content": eval_content,
+                    "eval_result": "{}",
+                    "status": TaskStatus.PENDING.value,
+                    "created_by": self.task.created_by,
+                    "updated_by": self.task.updated_by,
+                }
+                for item_id, eval_content in items[i:i + EVAL_ITEM_INSERT_BATCH_SIZE]
+            ])
+
     def get_eval_prompt(self, item: EvaluationItem) -> str:
         prompt_text = get_prompt(self.task.task_type, json.loads(self.task.eval_config).get("dimensions"))
         eval_content = json.loads(item.eval_content)
@@ -42,51 +144,126 @@ class EvaluationExecutor:
         return prompt_text
 
     async def execute(self):
+        """
+        以全局并发窗口调度整个任务的评估条目。
+
+        条目按流式读取放入工作队列，不受文件边界限制；评估结果攒批后批量写回，并记录任务的吞吐与时延统计。
+        """
         eval_config = json.loads(self.task.eval_config)
         models = await get_model_by_id(self.db, eval_config.get("modelId"))
-        semaphore = asyncio.Semaphore(10)
-        files = (await self.db.execute(
-            select(EvaluationFile).where(EvaluationFile.task_id == self.task.id)
-        )).scalars().all()
+        concurrency = max(settings.evaluation_concurrency, 1)
+        batch_size = max(settings.evaluation_result_batch_size, 1)
+
         query = select(EvaluationItem).where(EvaluationItem.task_id == self.task.id)
         count_query = select(func.count()).select_from(query.subquery())
         total = (await self.db.execute(count_query)).scalar_one()
+        stats = EvaluationStats(total=total)
+        _evict_expired_stats()
+        _TASK_STATS[self.task.id] = stats
+
+        # 重新执行时按本次评估的条目重新计数，避免已评估条数超过文件条目总数
+        await self.db.execute(
+            update(EvaluationFile)
+            .where(EvaluationFile.task_id == self.task.id)
+            .values(evaluated_count=0, updated_at=datetime.now(), updated_by=get_audit_user())
+        )
+        self.task.eval_process = 0
+        await self.db.commit()
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+        pending_results: list[dict] = []
+        pending_files: dict[str, int] = {}
+        flush_lock = asyncio.Lock()
         evaluated_count = 0
-        for file in files:
-            items = (await self.db.execute(query.where(EvaluationItem.file_id == file.file_id))).scalars().all()
-            tasks = [
-                self.evaluate_item(models, item, semaphore)
-                for item in items
-            ]
-            await asyncio.gather(*tasks, return_exceptions=True)
-            file.evaluated_count = len(items)
-            evaluated_count += file.evaluated_count
-            self.task.eval_process = evaluated_count / total
-            await self.db.commit()
-
-    async def evaluate_item(self, models, item: EvaluationItem, semaphore: asyncio.Semaphore):
-        async with semaphore:
-            max_try = 3
-            while max_try > 0:
-                prompt_text = self.get_eval_prompt(item)
-                resp_text = await asyncio.to_thread(
-                    call_openai_style_model, models.base_url, models.api_key, models.model_name,
-                    prompt_text,
+
+        async def flush() -> None:
+            nonlocal evaluated_count
+            async with flush_lock:
+                if not pending_results and not pending_files:
+                    return
+                results = pending_results.copy()
+                files = dict(pending_files)
+                pending_results.clear()
+                pending_files.clear()
+                # 批量 UPDATE 不经过 before_flush 审计钩子，显式写入更新时间与更新人
+                audit = {"updated_at": datetime.now(), "updated_by": get_audit_user()}
+                if results:
+                    await self.db.execute(update(EvaluationItem), [{**result, **audit} for result in results])
+                for file_id, count in files.items():
+                    await self.db.execute(
+                        update(EvaluationFile)
+                        .where(EvaluationFile.task_id == self.task.id, EvaluationFile.file_id == file_id)
+                        .values(evaluated_count=EvaluationFile.evaluated_count + count, **audit)
+                    )
+                    evaluated_count += count
+                self.task.eval_process = evaluated_count / total if total else 1
+                await self.db.commit()
+
+        async def produce() -> None:
+            # 使用独立会话流式读取条目，避免与结果写回的提交相互影响
+            async with AsyncSessionLocal() as session:
+                result = await session.stream(
+                    select(EvaluationItem.id, EvaluationItem.file_id, EvaluationItem.eval_content)
+                    .where(EvaluationItem.task_id == self.task.id)
+                    .execution_options(yield_per=batch_size)
                 )
-                resp_text = extract_json_substring(resp_text)
+                async for item in result:
+                    await queue.put(item)
+            for _ in range(concurrency):
+                await queue.put(None)
+
+        async def consume() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                start = time.monotonic()
                 try:
-                    json.loads(resp_text)
+                    resp_text = await self.evaluate_item(models, item)
                 except Exception as e:
-                    logger.error(
-                        f"Failed to parse LLM answer as JSON for task={self.task.id}, file={item.file_id}: {e}. Raw answer: {resp_text!r}"
-                    )
-                    max_try -= 1
-                    continue
-                item.eval_result = resp_text
-                item.status = TaskStatus.COMPLETED.value
-                await self.db.commit()
-                return
+                    logger.error(f"Failed to evaluate item {item.id} of task {self.task.id}: {e}")
+                    resp_text = None
+                stats.record(time.monotonic() - start, resp_text is not None)
+                if resp_text is not None:
+                    pending_results.append({
+                        "id": item.id,
+                        "eval_result": resp_text,
+                        "status": TaskStatus.COMPLETED.value,
+                    })
+                pending_files[item.file_id] = pending_files.get(item.file_id, 0) + 1
+                if len(pending_results) >= batch_size:
+                    await flush()
 
+        workers = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(concurrency)]
+        try:
+            await asyncio.gather(*workers)
+            await flush()
+        finally:
+            for worker in workers:
+                if not worker.done():
+                    worker.cancel()
+            stats.finished_at = time.monotonic()
+            logger.info(f"Evaluation task {self.task.id} finished: {stats.snapshot()}")
+
+    async def evaluate_item(self, models, item) -> Optional[str]:
+        """评估单个条目，返回模型给出的 JSON 结果，多次解析失败时返回 None"""
+        max_try = 3
+        while max_try > 0:
+            prompt_text = self.get_eval_prompt(item)
+            resp_text = await acall_openai_style_model(
+                models.base_url, models.api_key, models.model_name, prompt_text,
+            )
+            resp_text = extract_json_substring(resp_text)
+            try:
+                json.loads(resp_text)
+            except Exception as e:
+                logger.error(
+                    f"Failed to parse LLM answer as JSON for task={self.task.id}, file={item.file_id}: {e}. Raw answer: {resp_text!r}"
+                )
+                max_try -= 1
+                continue
+            return resp_text
+        return None
 
     def get_source_type(self) -> SourceType:
         pass
@@ -97,37 +274,42 @@ class DatasetEvaluationExecutor(EvaluationExecutor):
         super().__init__(db, task)
 
     async def save_eval_items(self):
-        dataset_files = ((await self.db.execute(select(DatasetFiles)
-                                               .where(DatasetFiles.dataset_id == self.task.source_id)))
-                         .scalars().all())
-        handler = StructuredFileHandlerFactory().get_handler(self.task.task_type)
-        for dataset_file in dataset_files:
-            if dataset_file.file_type.upper() != "JSON" and dataset_file.file_type.upper() != "JSONL":
-                continue
-            items = handler.get_items_from_file(dataset_file.file_path)
-            logger.info(f"parse {len(items)} items from file {dataset_file.file_name}")
-            for item in items:
-                self.db.add(EvaluationItem(
+        dataset_files = (await self.db.execute(
+            select(DatasetFiles.id, DatasetFiles.file_name, DatasetFiles.file_path, DatasetFiles.file_type)
+            .where(DatasetFiles.dataset_id == self.task.source_id)
+        )).all()
+        dataset_files = [
+            dataset_file for dataset_file in dataset_files
+            if dataset_file.file_type and dataset_file.file_type.upper() in ("JSON", "JSONL")
+        ]
+
+        # 文件解析与校验为 CPU 密集操作，按进程池大小分批并发解析
+        window = max(settings.evaluation_parse_workers, 1)
+        loop = asyncio.get_running_loop()
+        for i in range(0, len(dataset_files), window):
+            batch = dataset_files[i:i + window]
+            try:
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(_get_parse_pool(), load_eval_items, self.task.task_type, dataset_file.file_path)
+                    for dataset_file in batch
+                ))
+            except BrokenProcessPool:
+                _reset_parse_pool()
+                logger.error(f"Parse worker crashed when loading items for task {self.task.id}")
+                raise
+            for dataset_file, items in zip(batch, results):
+                logger.info(f"parse {len(items)} items from file {dataset_file.file_name}")
+                await self._insert_items(dataset_file.id, items)
+                self.db.add(EvaluationFile(
                     id=str(uuid.uuid4()),
                     task_id=self.task.id,
                     file_id=dataset_file.id,
-                    item_id=item.get("id") if item.get("id") else str(uuid.uuid4()),
-                    eval_content=json.dumps(item, ensure_ascii=False),
-                    eval_result="{}",
-                    status=TaskStatus.PENDING.value,
+                    file_name=dataset_file.file_name,
+                    total_count=len(items),
+                    evaluated_count=0,
                     created_by=self.task.created_by,
                     updated_by=self.task.updated_by,
                 ))
-            self.db.add(EvaluationFile(
-                id=str(uuid.uuid4()),
-                task_id=self.task.id,
-                file_id=dataset_file.id,
-                file_name=dataset_file.file_name,
-                total_count=len(items),
-                evaluated_count=0,
-                created_by=self.task.created_by,
-                updated_by=self.task.updated_by,
-            ))
 
     def get_source_type(self) -> SourceType:
         return SourceType.DATASET
@@ -138,37 +320,45 @@ class SynthesisEvaluationExecutor(EvaluationExecutor):
         super().__init__(db, task)
 
     async def save_eval_items(self):
-        synthesis_files = ((await self.db.execute(select(DataSynthesisFileInstance)
-                               .where(DataSynthesisFileInstance.synthesis_instance_id == self.task.source_id)))
-                           .scalars().all())
+        synthesis_files = (await self.db.execute(
+            select(DataSynthesisFileInstance.id, DataSynthesisFileInstance.file_name)
+            .where(DataSynthesisFileInstance.synthesis_instance_id == self.task.source_id)
+        )).all()
+        total_counts = {synthesis_file.id: 0 for synthesis_file in synthesis_files}
+
+        # 一次流式查询任务下所有文件的合成数据，使用独立会话避免与批量插入相互影响
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(
+                select(SynthesisData.id, SynthesisData.synthesis_file_instance_id, SynthesisData.data)
+                .join(
+                    DataSynthesisFileInstance,
+                    DataSynthesisFileInstance.id == SynthesisData.synthesis_file_instance_id,
+                )
+                .where(DataSynthesisFileInstance.synthesis_instance_id == self.task.source_id)
+                .execution_options(yield_per=EVAL_ITEM_INSERT_BATCH_SIZE)
+            )
+            async for rows in result.partitions():
+                items_by_file: dict[str, list[tuple[str, str]]] = {}
+                for row in rows:
+                    items_by_file.setdefault(row.synthesis_file_instance_id, []).append(
+                        (row.id, json.dumps(row.data))
+                    )
+                for file_id, items in items_by_file.items():
+                    await self._insert_items(file_id, items)
+                    total_counts[file_id] = total_counts.get(file_id, 0) + len(items)
+
         for synthesis_file in synthesis_files:
-            synthesis_datas = ((await self.db.execute(select(SynthesisData)
-                                                     .where(SynthesisData.synthesis_file_instance_id == synthesis_file.id)))
-                               .scalars().all())
-            logger.info(f"get {len(synthesis_datas)} items from file {synthesis_file.file_name}")
-            for synthesis_data in synthesis_datas:
-                self.db.add(EvaluationItem(
-                    id=str(uuid.uuid4()),
-                    task_id=self.task.id,
-                    file_id=synthesis_file.id,
-                    item_id=synthesis_data.id,
-                    eval_content=json.dumps(synthesis_data.data),
-                    eval_result="{}",
-                    status=TaskStatus.PENDING.value,
-                    created_by=self.task.created_by,
-                    updated_by=self.task.updated_by,
-                ))
+            logger.info(f"get {total_counts[synthesis_file.id]} items from file {synthesis_file.file_name}")
             self.db.add(EvaluationFile(
                 id=str(uuid.uuid4()),
                 task_id=self.task.id,
                 file_id=synthesis_file.id,
                 file_name=synthesis_file.file_name,
-                total_count=len(synthesis_datas),
+                total_count=total_counts[synthesis_file.id],
                 evaluated_count=0,
                 created_by=self.task.created_by,
                 updated_by=self.task.updated_by,
             ))
-        pass
 
     def get_source_type(self) -> SourceType:
         return SourceType.SYNTHESIS
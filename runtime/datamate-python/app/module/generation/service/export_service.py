@@ -1,12 +1,15 @@
+import asyncio
 import datetime
+import gzip
 import json
 import os
-import time
-from typing import Iterable, List, Sequence, cast
+import uuid
+from typing import BinaryIO, Optional, Sequence, Tuple, cast
 
-from sqlalchemy import select
+from sqlalchemy import Row, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.db.models.data_synthesis import (
     DataSynthInstance,
@@ -14,9 +17,16 @@ from app.db.models.data_synthesis import (
     SynthesisData,
 )
 from app.db.models.dataset_management import Dataset, DatasetFiles
+from app.db.session import AsyncSessionLocal
 
 logger = get_logger(__name__)
 
+# 服务端游标每次拉取的合成数据条数
+EXPORT_FETCH_SIZE = 1000
+WRITE_BUFFER_SIZE = 1024 * 1024
+# 压缩方式 -> 归档文件后缀
+_COMPRESSION_SUFFIXES = {"": "", "gzip": ".gz", "zstd": ".zst"}
+
 
 class SynthesisExportError(Exception):
     """Raised when exporting synthesis data to dataset fails."""
@@ -29,6 +39,7 @@ class SynthesisDatasetExporter:
     - Dimension: original file (DatasetFiles)
     - One JSONL file per original file
     - JSONL file name is exactly the same as the original file name
+      (with a .gz/.zst suffix when compressed)
     """
 
     def __init__(self, db: AsyncSession):
@@ -38,11 +49,25 @@ class SynthesisDatasetExporter:
         self,
         task_id: str,
         dataset_id: str,
+        compression: Optional[str] = None,
     ) -> Dataset:
         """Export the full synthesis data of the given task into an existing dataset.
 
-        Optimized to process one file at a time to reduce memory usage.
+        Synthesis data of each file is streamed from the database straight into
+        its JSONL file, and several files are exported concurrently.
+
+        Args:
+            task_id: synthesis task id
+            dataset_id: target dataset id
+            compression: None/"" for plain JSONL, or "gzip"/"zstd";
+                defaults to settings.synthesis_export_compression
         """
+        if compression is None:
+            compression = settings.synthesis_export_compression
+        compression = (compression or "").lower()
+        if compression not in _COMPRESSION_SUFFIXES:
+            raise SynthesisExportError(f"Unsupported export compression: {compression}")
+
         task = await self._db.get(DataSynthInstance, task_id)
         if not task:
             raise SynthesisExportError(f"Synthesis task {task_id} not found")
@@ -56,46 +81,44 @@ class SynthesisDatasetExporter:
             raise SynthesisExportError("No synthesis file instances found for task")
 
         base_path = self._ensure_dataset_path(dataset)
+        suffix = _COMPRESSION_SUFFIXES[compression]
+        semaphore = asyncio.Semaphore(max(settings.synthesis_export_concurrency, 1))
 
-        created_files: list[DatasetFiles] = []
-        total_size = 0
-
-        # 一个文件一个文件处理，避免一次性加载所有合成数据
-        for file_instance in file_instances:
-            records = await self._load_synthesis_data_for_file(file_instance.id)
-            if not records:
-                continue
-
+        async def _export(file_instance_id: str, file_name: Optional[str]) -> Optional[Tuple[str, str, int]]:
             # 归档文件名称：原始文件名称.xxx -> 原始文件名称.jsonl
-            original_name = file_instance.file_name or "unknown"
+            original_name = file_name or "unknown"
             base_name, _ = os.path.splitext(original_name)
-            archived_file_name = f"{base_name}.jsonl"
-
+            archived_file_name = f"{base_name}.jsonl{suffix}"
             file_path = os.path.join(base_path, archived_file_name)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            self._write_jsonl(file_path, records)
+            async with semaphore:
+                file_size = await self._export_file(file_instance_id, file_path, compression)
+            if file_size is None:
+                return None
+            return archived_file_name, file_path, file_size
 
-            # 计算文件大小
-            try:
-                file_size = os.path.getsize(file_path)
-            except OSError:
-                file_size = 0
+        # 多个文件并发导出，每个文件的合成数据边读边写，不在内存中整体保存
+        results = await asyncio.gather(*(_export(row.id, row.file_name) for row in file_instances))
 
-            df = DatasetFiles(
+        created_files = 0
+        total_size = 0
+        for result in results:
+            if result is None:
+                continue
+            archived_file_name, file_path, file_size = result
+            self._db.add(DatasetFiles(
                 dataset_id=dataset.id,
                 file_name=archived_file_name,
                 file_path=file_path,
                 file_type="jsonl",
                 file_size=file_size,
                 last_access_time=datetime.datetime.now(),
-            )
-            self._db.add(df)
-            created_files.append(df)
+            ))
+            created_files += 1
             total_size += file_size
 
         # 更新数据集的文件数、总大小和状态
         if created_files:
-            dataset.file_count = (dataset.file_count or 0) + len(created_files)
+            dataset.file_count = (dataset.file_count or 0) + created_files
             dataset.size_bytes = (dataset.size_bytes or 0) + total_size
             dataset.status = "ACTIVE"
 
@@ -105,46 +128,74 @@ class SynthesisDatasetExporter:
             "Exported synthesis task %s to dataset %s with %d files (total %d bytes)",
             task_id,
             dataset.id,
-            len(created_files),
+            created_files,
             total_size,
         )
 
         return dataset
 
-    async def _load_file_instances(self, task_id: str) -> Sequence[DataSynthesisFileInstance]:
+    async def _load_file_instances(self, task_id: str) -> Sequence[Row]:
         result = await self._db.execute(
-            select(DataSynthesisFileInstance).where(
+            select(DataSynthesisFileInstance.id, DataSynthesisFileInstance.file_name).where(
                 DataSynthesisFileInstance.synthesis_instance_id == task_id
             )
         )
-        return result.scalars().all()
+        return result.all()
 
-    async def _load_synthesis_data_for_file(
-        self, file_instance_id: str
-    ) -> List[dict]:
-        """Load all synthesis data records for a single file instance.
+    async def _export_file(self, file_instance_id: str, file_path: str, compression: str) -> Optional[int]:
+        """Stream synthesis data of a single file instance into a JSONL file.
 
-        Each returned item is a plain JSON-serialisable dict based on SynthesisData.data.
-        """
-        result = await self._db.execute(
-            select(SynthesisData).where(
-                SynthesisData.synthesis_file_instance_id == file_instance_id
-            )
-        )
-        rows: Sequence[SynthesisData] = result.scalars().all()
+        Rows are read through a server-side cursor in its own session, so that
+        several files can be exported concurrently. The file is written to a
+        temporary path and moved into place when complete.
 
-        records: List[dict] = []
-        for row in rows:
-            payload = row.data or {}
-            records.append(payload)
-        return records
+        Returns:
+            size of the written file, or None if the file instance has no data
+        """
+        tmp_path = f"{file_path}.{uuid.uuid4().hex}.tmp"
+        writer = None
+        try:
+            async with AsyncSessionLocal() as session:
+                result = await session.stream_scalars(
+                    select(SynthesisData.data)
+                    .where(SynthesisData.synthesis_file_instance_id == file_instance_id)
+                    .execution_options(yield_per=EXPORT_FETCH_SIZE)
+                )
+                async for records in result.partitions():
+                    chunk = "".join(
+                        json.dumps(record or {}, ensure_ascii=False) + "\n" for record in records
+                    ).encode("utf-8")
+                    if writer is None:
+                        writer = await asyncio.to_thread(self._open_writer, tmp_path, compression)
+                    await asyncio.to_thread(writer.write, chunk)
+            if writer is None:
+                return None
+            await asyncio.to_thread(writer.close)
+            writer = None
+            await asyncio.to_thread(os.replace, tmp_path, file_path)
+        finally:
+            if writer is not None:
+                await asyncio.to_thread(writer.close)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        try:
+            return os.path.getsize(file_path)
+        except OSError:
+            return 0
 
     @staticmethod
-    def _write_jsonl(path: str, records: Iterable[dict]) -> None:
-        with open(path, "w", encoding="utf-8") as f:
-            for record in records:
-                f.write(json.dumps(record, ensure_ascii=False))
-                f.write("\n")
+    def _open_writer(path: str, compression: str) -> BinaryIO:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if compression == "gzip":
+            return cast(BinaryIO, gzip.open(path, "wb"))
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise SynthesisExportError("zstd export requires the 'zstandard' package") from e
+            return cast(BinaryIO, zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True))
+        return open(path, "wb", buffering=WRITE_BUFFER_SIZE)
 
     @staticmethod
     def _ensure_dataset_path(dataset: Dataset) -> str:
@@ -1,13 +1,19 @@
 import asyncio
 import json
+import multiprocessing
 import random
 import re
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import AsyncIterator
 
 from langchain_core.language_models import BaseChatModel
-from sqlalchemy import select
+from sqlalchemy import Row, func, insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.db.models.base_entity import LineageNode, LineageEdge
 from app.db.models.data_synthesis import (
     DataSynthInstance,
@@ -16,7 +22,7 @@ from app.db.models.data_synthesis import (
     SynthesisData,
 )
 from app.db.models.dataset_management import DatasetFiles, Dataset
-from app.db.session import logger
+from app.db.session import AsyncSessionLocal, logger
 from app.module.generation.schema.generation import Config, SyntheConfig
 from app.module.generation.service.prompt import (
     QUESTION_GENERATOR_PROMPT,
@@ -30,6 +36,15 @@ from app.module.system.service.common_service import get_model_by_id
 from app.module.shared.common.lineage import LineageService
 from app.module.shared.schema import NodeType, EdgeType
 
+# 每批从 DB 读取并并发处理的 chunk 数，processed_chunks 按批更新
+CHUNK_BATCH_SIZE = 100
+# 每条多行 INSERT 写入的 chunk 数
+CHUNK_INSERT_BATCH_SIZE = 1000
+
+_split_pool: ProcessPoolExecutor | None = None
+# 进程级模型调用信号量：本进程内所有合成任务共享模型调用的并发额度
+_llm_semaphore: asyncio.Semaphore | None = None
+
 
 def _filter_docs(split_docs, chunk_size):
     """
@@ -49,15 +64,75 @@ def extract_img_urls(doc):
     img_urls = re.findall(pattern, doc)
     return img_urls
 
+
+def load_and_split(file_path: str, chunk_size: int, chunk_overlap: int) -> list[tuple[str, dict]]:
+    """使用 LangChain 加载文本并进行切片，返回 (chunk 内容, 元数据) 列表。
+
+    在切片进程池中执行，返回值需可序列化。
+    """
+    docs = load_documents(file_path)
+    split_docs = DocumentSplitter.auto_split(docs, chunk_size, chunk_overlap)
+    return [
+        (doc.page_content, dict(getattr(doc, "metadata", {}) or {}))
+        for doc in _filter_docs(split_docs, chunk_size)
+    ]
+
+
+def _get_split_pool() -> ProcessPoolExecutor:
+    """文档加载与切片为 CPU 密集操作，放到独立进程池中执行，避免阻塞事件循环。"""
+    global _split_pool
+    if _split_pool is None:
+        _split_pool = ProcessPoolExecutor(
+            max_workers=max(settings.synthesis_split_workers, 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _split_pool
+
+
+def _reset_split_pool() -> None:
+    global _split_pool
+    if _split_pool is not None:
+        _split_pool.shutdown(wait=False, cancel_futures=True)
+        _split_pool = None
+
+
+def _get_llm_semaphore() -> asyncio.Semaphore:
+    """同时运行的多个合成任务共用一个信号量，模型服务承受的并发不随任务数增长。"""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(max(settings.synthesis_llm_concurrency, 1))
+    return _llm_semaphore
+
+
+@dataclass
+class SynthesisContext:
+    """单个合成任务在处理期间共享的配置、模型 client 与 QA 计数。"""
+    task_id: str
+    config: Config
+    question_cfg: SyntheConfig
+    answer_cfg: SyntheConfig
+    question_chat: BaseChatModel
+    answer_chat: BaseChatModel
+    max_qa_pairs: int | None = None
+    qa_count: int = 0
+
+    def qa_limit_reached(self) -> bool:
+        return self.max_qa_pairs is not None and self.qa_count >= self.max_qa_pairs
+
+
 class GenerationService:
     def __init__(self, db: AsyncSession):
         self.db = db
-        # 全局并发信号量：保证任意时刻最多 10 次模型调用
-        self.question_semaphore = asyncio.Semaphore(20)
-        self.answer_semaphore = asyncio.Semaphore(100)
+        # 进程级并发信号量：所有任务的所有文件共享模型调用的并发额度
+        self.llm_semaphore = _get_llm_semaphore()
 
     async def process_task(self, task_id: str):
-        """处理数据合成任务入口：根据任务ID加载任务并逐个处理源文件。"""
+        """处理数据合成任务入口：根据任务ID加载任务，并发处理多个源文件。
+
+        - 文档加载与切片在进程池中执行，与其它文件的 QA 生成重叠；
+        - 最多 synthesis_file_concurrency 个文件同时生成 QA，每个文件使用独立的 DB 会话；
+        - 本进程所有任务的模型调用共享 llm_semaphore，保证模型服务持续有请求在处理且并发有上限。
+        """
         synth_task: DataSynthInstance | None = await self.db.get(DataSynthInstance, task_id)
         if not synth_task:
             logger.error(f"Synthesis task {task_id} not found, abort processing")
@@ -65,280 +140,235 @@ class GenerationService:
 
         logger.info(f"Start processing synthe task {task_id}")
 
-        # 从 synth_config 中读取 max_qa_pairs，全局控制 QA 总量上限；<=0 或异常则视为不限制
-        try:
-            cfg = Config(**(synth_task.synth_config or {}))
-            max_qa_pairs = cfg.max_qa_pairs if (cfg and cfg.max_qa_pairs and cfg.max_qa_pairs > 0) else None
-        except Exception:
-            max_qa_pairs = None
-
         # 获取任务关联的文件原始ID列表
-        file_ids = await self._get_file_ids_for_task(task_id)
+        file_ids = await self._get_file_ids_for_task(self.db, task_id)
         if not file_ids:
             logger.warning(f"No files associated with task {task_id}, abort processing")
             return
 
-        # 逐个文件处理
-        for file_id in file_ids:
+        context = await self._build_context(synth_task)
+        if context is None:
+            for file_id in file_ids:
+                await self._mark_file_failed(self.db, str(synth_task.id), file_id, "invalid_synth_config")
+            return
+
+        file_semaphore = asyncio.Semaphore(max(settings.synthesis_file_concurrency, 1))
+
+        async def run_file(file_id: str):
+            async with file_semaphore:
+                await self._run_single_file(context, file_id)
+
+        await asyncio.gather(*(run_file(file_id) for file_id in file_ids))
+
+        logger.info(f"Finished processing synthesis task {synth_task.id}")
+
+    async def _build_context(self, synth_task: DataSynthInstance) -> SynthesisContext | None:
+        """解析任务配置并构建模型 client，同一任务的所有文件复用。"""
+        try:
+            config = Config(**(synth_task.synth_config or {}))
+        except Exception as e:
+            logger.error(f"Invalid synth_config for task={synth_task.id}: {e}")
+            return None
+
+        question_cfg: SyntheConfig | None = config.question_synth_config
+        answer_cfg: SyntheConfig | None = config.answer_synth_config
+        if not config.text_split_config or not question_cfg or not answer_cfg:
+            logger.error(f"Split/Question/Answer synth config missing for task={synth_task.id}")
+            return None
+
+        question_model = await get_model_by_id(self.db, question_cfg.model_id)
+        answer_model = await get_model_by_id(self.db, answer_cfg.model_id)
+        context = SynthesisContext(
+            task_id=str(synth_task.id),
+            config=config,
+            question_cfg=question_cfg,
+            answer_cfg=answer_cfg,
+            question_chat=LLMFactory.create_chat(
+                question_model.model_name, question_model.base_url, question_model.api_key
+            ),
+            answer_chat=LLMFactory.create_chat(
+                answer_model.model_name, answer_model.base_url, answer_model.api_key
+            ),
+            # 从 synth_config 中读取 max_qa_pairs，全局控制 QA 总量上限；<=0 视为不限制
+            max_qa_pairs=config.max_qa_pairs if config.max_qa_pairs and config.max_qa_pairs > 0 else None,
+        )
+        if context.max_qa_pairs is not None:
+            # 统计当前整个任务下已生成的 QA 总数，之后在内存中累加
+            context.qa_count = await self._count_task_qa_pairs(self.db, context.task_id)
+        return context
+
+    async def _run_single_file(self, context: SynthesisContext, file_id: str) -> None:
+        """在独立的 DB 会话中处理单个文件，成功后原子递增任务的 processed_files。"""
+        async with AsyncSessionLocal() as db:
             try:
-                success = await self._process_single_file(synth_task, file_id, max_qa_pairs=max_qa_pairs)
+                success = await self._process_single_file(db, context, file_id)
             except Exception as e:
-                logger.exception(f"Unexpected error when processing file {file_id} for task {task_id}: {e}")
+                logger.exception(f"Unexpected error when processing file {file_id} for task {context.task_id}: {e}")
+                await db.rollback()
                 # 确保对应文件任务状态标记为失败
-                await self._mark_file_failed(str(synth_task.id), file_id, str(e))
+                await self._mark_file_failed(db, context.task_id, file_id, str(e))
                 success = False
 
             if success:
-                # 每处理完一个文件，简单增加 processed_files 计数
-                synth_task.processed_files = (synth_task.processed_files or 0) + 1
-                await self.db.commit()
-                await self.db.refresh(synth_task)
-
-        logger.info(f"Finished processing synthesis task {synth_task.id}")
+                await db.execute(
+                    update(DataSynthInstance)
+                    .where(DataSynthInstance.id == context.task_id)
+                    .values(processed_files=func.coalesce(DataSynthInstance.processed_files, 0) + 1)
+                )
+                await db.commit()
 
     # ==================== 高层文件处理流程 ====================
     async def _process_single_file(
         self,
-        synth_task: DataSynthInstance,
+        db: AsyncSession,
+        context: SynthesisContext,
         file_id: str,
-        max_qa_pairs: int | None = None,
     ) -> bool:
         """按 chunk 批量流式处理单个源文件。
 
         流程：
-        1. 切片并将所有 chunk 持久化到 DB 后释放内存；
-        2. 从 DB 按 chunk_index 升序批量读取 chunk；
-        3. 对批次中的每个 chunk：先生成指定数量的问题，再基于这些问题生成答案；
-        4. 每成功处理完一个 chunk（即该 chunk 至少生成一条 QA）就更新一次 processed_chunks；
+        1. 在进程池中切片，并将所有 chunk 持久化到 DB 后释放内存；
+        2. 从 DB 按 chunk_index 键集分页流式读取 chunk，内存中只保留一批；
+        3. 批次内的 chunk 并发生成问题与答案，模型调用受全局信号量限流；
+        4. 每批的 QA 记录与 processed_chunks 增量在一次提交中写入；
         5. 全部完成后将文件实例标记为 completed。
         """
         # 解析文件路径与配置
-        file_path = await self._resolve_file_path(file_id)
+        file_path = await self._resolve_file_path(db, file_id)
         if not file_path:
             logger.warning(f"File path not found for file_id={file_id}, skip")
-            await self._mark_file_failed(str(synth_task.id), file_id, "file_path_not_found")
+            await self._mark_file_failed(db, context.task_id, file_id, "file_path_not_found")
             return False
 
         logger.info(f"Processing file_id={file_id}, path={file_path}")
 
-        try:
-            config = Config(**(synth_task.synth_config or {}))
-        except Exception as e:
-            logger.error(f"Invalid synth_config for task={synth_task.id}: {e}")
-            await self._mark_file_failed(str(synth_task.id), file_id, "invalid_synth_config")
-            return False
-
         # 1. 加载并切片（仅在此处占用内存）
-        chunks = self._load_and_split(
+        chunks = await self._load_and_split(
             file_path,
-            config.text_split_config.chunk_size,
-            config.text_split_config.chunk_overlap,
+            context.config.text_split_config.chunk_size,
+            context.config.text_split_config.chunk_overlap,
         )
         if not chunks:
             logger.warning(f"No chunks generated for file_id={file_id}")
-            await self._mark_file_failed(str(synth_task.id), file_id, "no_chunks_generated")
+            await self._mark_file_failed(db, context.task_id, file_id, "no_chunks_generated")
             return False
 
         logger.info(f"File {file_id} split into {len(chunks)} chunks by LangChain")
 
         # 2. 获取文件实例并持久化 chunk 记录
         file_task = await self._get_or_create_file_instance(
-            synthesis_task_id=str(synth_task.id),
+            db,
+            synthesis_task_id=context.task_id,
             source_file_id=file_id,
         )
         if not file_task:
             logger.error(
-                f"DataSynthesisFileInstance not found for task={synth_task.id}, file_id={file_id}"
+                f"DataSynthesisFileInstance not found for task={context.task_id}, file_id={file_id}"
             )
-            await self._mark_file_failed(str(synth_task.id), file_id, "file_instance_not_found")
+            await self._mark_file_failed(db, context.task_id, file_id, "file_instance_not_found")
             return False
 
-        await self._persist_chunks(synth_task, file_task, file_id, chunks)
+        await self._persist_chunks(db, context.task_id, file_task, file_id, chunks)
         total_chunks = len(chunks)
         # 释放内存中的切片
         del chunks
 
-        # 3. 读取问答配置
-        question_cfg: SyntheConfig | None = config.question_synth_config
-        answer_cfg: SyntheConfig | None = config.answer_synth_config
-        if not question_cfg or not answer_cfg:
-            logger.error(
-                f"Question/Answer synth config missing for task={synth_task.id}, file={file_id}"
-            )
-            await self._mark_file_failed(str(synth_task.id), file_id, "qa_config_missing")
-            return False
-
         logger.info(
-            f"Start QA generation for task={synth_task.id}, file={file_id}, total_chunks={total_chunks}"
-        )
-
-        # 为本文件构建模型 client
-        question_model = await get_model_by_id(self.db, question_cfg.model_id)
-        answer_model = await get_model_by_id(self.db, answer_cfg.model_id)
-        question_chat = LLMFactory.create_chat(
-            question_model.model_name, question_model.base_url, question_model.api_key
-        )
-        answer_chat = LLMFactory.create_chat(
-            answer_model.model_name, answer_model.base_url, answer_model.api_key
+            f"Start QA generation for task={context.task_id}, file={file_id}, total_chunks={total_chunks}"
         )
 
-        # 分批次从 DB 读取并处理 chunk
-        batch_size = 100
-        current_index = 1
-
-        while current_index <= total_chunks:
-            end_index = min(current_index + batch_size - 1, total_chunks)
-            chunk_batch = await self._load_chunk_batch(
-                file_task_id=file_task.id,
-                start_index=current_index,
-                end_index=end_index,
-            )
-            if not chunk_batch:
-                logger.warning(
-                    f"Empty chunk batch loaded for file={file_id}, range=[{current_index}, {end_index}]"
-                )
-                current_index = end_index + 1
-                continue
-
-            # 对本批中的每个 chunk 并发处理（内部受 semaphore 限流）
-            async def process_one(chunk: DataSynthesisChunkInstance) -> bool:
-                return await self._process_single_chunk_qa(
-                    file_task=file_task,
-                    chunk=chunk,
-                    question_cfg=question_cfg,
-                    answer_cfg=answer_cfg,
-                    question_chat=question_chat,
-                    answer_chat=answer_chat,
-                    synth_task_id=str(synth_task.id),
-                    max_qa_pairs=max_qa_pairs,
+        # 3. 按 chunk_index 键集分页流式读取并处理 chunk
+        async for chunk_batch in self._iter_chunk_batches(db, file_task.id, CHUNK_BATCH_SIZE):
+            if context.qa_limit_reached():
+                logger.info(
+                    f"max_qa_pairs reached: current={context.qa_count}, max={context.max_qa_pairs}, "
+                    f"task_id={context.task_id}, file_task_id={file_task.id}, skip remaining chunks."
                 )
+                # 认为剩余 chunk 均已处理；与按批累加一样以 UPDATE 写入，不经 ORM 属性
+                await self._complete_processed_chunks(db, file_task.id)
+                break
 
-            tasks = [process_one(chunk) for chunk in chunk_batch]
-            await asyncio.gather(*tasks, return_exceptions=True)
+            results = await asyncio.gather(
+                *(self._process_single_chunk_qa(context, file_task.id, chunk) for chunk in chunk_batch),
+                return_exceptions=True,
+            )
+            records = []
+            for chunk, result in zip(chunk_batch, results):
+                if isinstance(result, BaseException):
+                    logger.error(
+                        f"QA generation failed for file_task={file_task.id}, chunk_index={chunk.chunk_index}: {result}"
+                    )
+                    continue
+                records.extend(result)
 
-            current_index = end_index + 1
+            # 无论 chunk 处理是否成功，都计入 processed_chunks，避免任务长时间卡住
+            db.add_all(records)
+            await self._increment_processed_chunks(db, file_task.id, len(chunk_batch))
+            await db.commit()
 
         # 全部完成
         file_task.status = "completed"
-        await self.db.commit()
-        await self.db.refresh(file_task)
+        await db.commit()
         return True
 
     async def _process_single_chunk_qa(
         self,
-        file_task: DataSynthesisFileInstance,
-        chunk: DataSynthesisChunkInstance,
-        question_cfg: SyntheConfig,
-        answer_cfg: SyntheConfig,
-        question_chat: BaseChatModel,
-        answer_chat: BaseChatModel,
-        synth_task_id: str,
-        max_qa_pairs: int | None = None,
-    ) -> bool:
-        """处理单个 chunk：生成问题列表，然后为每个问题生成答案并落库。
-
-        为了全局控制 QA 总量：在本方法开始处，根据 synth_task_id 查询当前已落盘的
-        SynthesisData 条数，如果 >= max_qa_pairs，则不再对当前 chunk 做任何 QA 生成，
-        并将当前文件任务标记为 completed，processed_chunks = total_chunks。
+        context: SynthesisContext,
+        file_task_id: str,
+        chunk: Row,
+    ) -> list[SynthesisData]:
+        """处理单个 chunk：生成问题列表，然后为每个问题生成答案。
 
-        已经进入后续流程的任务（例如其它协程正在生成答案）允许自然执行完。
+        返回待落库的 SynthesisData 记录，由调用方按批统一提交。QA 总量上限在 chunk 开始处
+        检查，已经进入后续流程的 chunk 允许自然执行完。
         """
         # 随机决定是否对当前 chunk 进行 QA 生成
-        if random.random() > question_cfg.temperature:
+        if random.random() > context.question_cfg.temperature:
             logger.info(
-                f"Skip QA generation for chunk_index={chunk.chunk_index} in file_task={file_task.id} due to random decision."
+                f"Skip QA generation for chunk_index={chunk.chunk_index} in file_task={file_task_id} due to random decision."
             )
-            # 更新文件任务的 processed_chunks 计数
-            await self._increment_processed_chunks(file_task.id, 1)
-            return False
+            return []
 
-        # 如果没有全局上限配置，维持原有行为
-        if max_qa_pairs is not None and max_qa_pairs > 0:
-            from sqlalchemy import func
-
-            # 统计当前整个任务下已生成的 QA 总数
-            result = await self.db.execute(
-                select(func.count(SynthesisData.id)).where(
-                    SynthesisData.synthesis_file_instance_id.in_(
-                        select(DataSynthesisFileInstance.id).where(
-                            DataSynthesisFileInstance.synthesis_instance_id == synth_task_id
-                        )
-                    )
-                )
-            )
-            current_qa_count = int(result.scalar() or 0)
+        if context.qa_limit_reached():
+            return []
 
-            if current_qa_count >= max_qa_pairs:
-                logger.info(
-                    "max_qa_pairs reached: current=%s, max=%s, task_id=%s, file_task_id=%s, skip new QA generation for this chunk.",
-                    current_qa_count,
-                    max_qa_pairs,
-                    synth_task_id,
-                    file_task.id,
-                )
-                # 将文件任务标记为已完成，并认为所有 chunk 均已处理
-                file_task.status = "completed"
-                if file_task.total_chunks is not None:
-                    file_task.processed_chunks = file_task.total_chunks
-                await self.db.commit()
-                await self.db.refresh(file_task)
-                return False
-
-        # ---- 下面保持原有逻辑不变 ----
         chunk_index = chunk.chunk_index
         chunk_text = chunk.chunk_content or ""
         if not chunk_text.strip():
             logger.warning(
-                f"Empty chunk text for file_task={file_task.id}, chunk_index={chunk_index}"
+                f"Empty chunk text for file_task={file_task_id}, chunk_index={chunk_index}"
             )
-            # 无论成功或失败，均视为该 chunk 已处理完成
-            try:
-                await self._increment_processed_chunks(file_task.id, 1)
-            except Exception as e:
-                logger.exception(
-                    f"Failed to increment processed_chunks for file_task={file_task.id}, chunk_index={chunk_index}: {e}"
-                )
-            return False
-
-        success_any = False
+            return []
 
         # 1. 生成问题
         try:
             questions = await self._generate_questions_for_one_chunk(
                 chunk_text=chunk_text,
-                question_cfg=question_cfg,
-                question_chat=question_chat,
+                question_cfg=context.question_cfg,
+                question_chat=context.question_chat,
             )
         except Exception as e:
             logger.error(
-                f"Generate questions failed for file_task={file_task.id}, chunk_index={chunk_index}: {e}"
+                f"Generate questions failed for file_task={file_task_id}, chunk_index={chunk_index}: {e}"
             )
             questions = []
 
         if not questions:
             logger.info(
-                f"No questions generated for file_task={file_task.id}, chunk_index={chunk_index}"
-            )
-        else:
-            # 2. 针对每个问题生成答案并入库
-            qa_success = await self._generate_answers_for_one_chunk(
-                file_task=file_task,
-                chunk=chunk,
-                questions=questions,
-                answer_cfg=answer_cfg,
-                answer_chat=answer_chat,
-            )
-            success_any = bool(qa_success)
-
-        # 无论本 chunk 处理是否成功，都增加 processed_chunks 计数，避免任务长时间卡住
-        try:
-            await self._increment_processed_chunks(file_task.id, 1)
-        except Exception as e:
-            logger.exception(
-                f"Failed to increment processed_chunks for file_task={file_task.id}, chunk_index={chunk_index}: {e}"
+                f"No questions generated for file_task={file_task_id}, chunk_index={chunk_index}"
             )
+            return []
 
-        return success_any
+        # 2. 针对每个问题生成答案
+        records = await self._generate_answers_for_one_chunk(
+            file_task_id=file_task_id,
+            chunk=chunk,
+            questions=questions,
+            answer_cfg=context.answer_cfg,
+            answer_chat=context.answer_chat,
+        )
+        context.qa_count += len(records)
+        return records
 
     async def _generate_questions_for_one_chunk(
         self,
@@ -360,14 +390,8 @@ class GenerationService:
             .replace("{textLength}", str(len(chunk_text)))
         )
 
-        async with self.question_semaphore:
-            loop = asyncio.get_running_loop()
-            raw_answer = await loop.run_in_executor(
-                None,
-                LLMFactory.invoke_sync,
-                question_chat,
-                prompt,
-            )
+        async with self.llm_semaphore:
+            raw_answer = await LLMFactory.ainvoke(question_chat, prompt)
 
         # 解析为问题列表
         questions = self._parse_questions_from_answer(
@@ -377,41 +401,30 @@ class GenerationService:
 
     async def _generate_answers_for_one_chunk(
         self,
-        file_task: DataSynthesisFileInstance,
-        chunk: DataSynthesisChunkInstance,
+        file_task_id: str,
+        chunk: Row,
         questions: list[str],
         answer_cfg: SyntheConfig,
         answer_chat: BaseChatModel,
-    ) -> bool:
-        """为一个 chunk 的所有问题生成答案并写入 SynthesisData。
-
-        返回：是否至少成功写入一条 QA。
-        """
+    ) -> list[SynthesisData]:
+        """为一个 chunk 的所有问题生成答案，返回待写入的 SynthesisData 记录。"""
         if not questions:
-            return False
+            return []
 
         chunk_text = chunk.chunk_content or ""
         template = getattr(answer_cfg, "prompt_template", ANSWER_GENERATOR_PROMPT)
         template = template if (template is not None and template.strip() != "") else ANSWER_GENERATOR_PROMPT
         extra_vars = getattr(answer_cfg, "extra_prompt_vars", {}) or {}
+        # 提取图片URL
+        img_urls = extract_img_urls(chunk_text)
 
-        success_flags: list[bool] = []
-
-        async def process_single_question(question: str):
+        async def process_single_question(question: str) -> SynthesisData:
             prompt = template.replace("{text}", chunk_text).replace("{question}", question)
             for k, v in extra_vars.items():
-                prompt.replace(f"{{{{{k}}}}}", str(v))
-            else:
-                prompt_local = prompt
-
-            async with self.answer_semaphore:
-                loop = asyncio.get_running_loop()
-                answer = await loop.run_in_executor(
-                    None,
-                    LLMFactory.invoke_sync,
-                    answer_chat,
-                    prompt_local,
-                )
+                prompt = prompt.replace(f"{{{{{k}}}}}", str(v))
+
+            async with self.llm_semaphore:
+                answer = await LLMFactory.ainvoke(answer_chat, prompt)
 
             # 默认结构：与 ANSWER_GENERATOR_PROMPT 一致，并补充 instruction 字段
             base_obj: dict[str, object] = {
@@ -424,11 +437,11 @@ class GenerationService:
             if isinstance(answer, str):
                 cleaned = extract_json_substring(answer)
                 try:
-                  parsed = json.loads(cleaned)
-                  if isinstance(parsed, dict):
-                      parsed_obj = parsed
+                    parsed = json.loads(cleaned)
+                    if isinstance(parsed, dict):
+                        parsed_obj = parsed
                 except Exception:
-                  parsed_obj = None
+                    parsed_obj = None
 
             if parsed_obj is not None:
                 parsed_obj["instruction"] = question
@@ -437,27 +450,28 @@ class GenerationService:
                 base_obj["instruction"] = question
                 data_obj = base_obj
 
-            # 提取图片URL
-            img_urls = extract_img_urls(chunk_text)
             if img_urls:
                 data_obj["img_urls"] = img_urls
 
-            record = SynthesisData(
+            return SynthesisData(
                 id=str(uuid.uuid4()),
                 data=data_obj,
-                synthesis_file_instance_id=file_task.id,
+                synthesis_file_instance_id=file_task_id,
                 chunk_instance_id=chunk.id,
             )
-            self.db.add(record)
-            success_flags.append(True)
 
-        tasks = [process_single_question(q) for q in questions]
-        await asyncio.gather(*tasks, return_exceptions=True)
-
-        if success_flags:
-            await self.db.commit()
-            return True
-        return False
+        results = await asyncio.gather(
+            *(process_single_question(q) for q in questions), return_exceptions=True
+        )
+        records = []
+        for result in results:
+            if isinstance(result, BaseException):
+                logger.error(
+                    f"Generate answer failed for file_task={file_task_id}, chunk_index={chunk.chunk_index}: {result}"
+                )
+                continue
+            records.append(result)
+        return records
 
     @staticmethod
     def _parse_questions_from_answer(
@@ -485,9 +499,10 @@ class GenerationService:
 
 
     # ==================== 原有辅助方法（文件路径/切片/持久化等） ====================
-    async def _resolve_file_path(self, file_id: str) -> str | None:
+    @staticmethod
+    async def _resolve_file_path(db: AsyncSession, file_id: str) -> str | None:
         """根据文件ID查询 t_dm_dataset_files 并返回 file_path（仅 ACTIVE 文件）。"""
-        result = await self.db.execute(
+        result = await db.execute(
             select(DatasetFiles).where(DatasetFiles.id == file_id)
         )
         file_obj = result.scalar_one_or_none()
@@ -496,57 +511,71 @@ class GenerationService:
         return file_obj.file_path
 
     @staticmethod
-    def _load_and_split(file_path: str, chunk_size: int, chunk_overlap: int):
-        """使用 LangChain 加载文本并进行切片，直接返回 Document 列表。
+    async def _load_and_split(file_path: str, chunk_size: int, chunk_overlap: int) -> list[tuple[str, dict]]:
+        """在切片进程池中加载文本并切片。
         Args:
             file_path: 待切片的文件路径
             chunk_size: 切片大小
             chunk_overlap: 切片重叠大小
         """
+        loop = asyncio.get_running_loop()
         try:
-            docs = load_documents(file_path)
-            split_docs = DocumentSplitter.auto_split(docs, chunk_size, chunk_overlap)
-            return _filter_docs(split_docs, chunk_size)
+            return await loop.run_in_executor(
+                _get_split_pool(), load_and_split, file_path, chunk_size, chunk_overlap
+            )
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，重建后由下一个文件继续使用
+            _reset_split_pool()
+            logger.error(f"Split worker crashed when loading file {file_path}")
+            raise
         except Exception as e:
             logger.error(f"Error loading or splitting file {file_path}: {e}")
             raise
 
+    @staticmethod
     async def _persist_chunks(
-        self,
-        synthesis_task: DataSynthInstance,
+        db: AsyncSession,
+        synthesis_task_id: str,
         file_task: DataSynthesisFileInstance,
         file_id: str,
-        chunks,
+        chunks: list[tuple[str, dict]],
     ) -> None:
-        """将切片结果保存到 t_data_synthesis_chunk_instances，并更新文件级分块计数。"""
-        for idx, doc in enumerate(chunks, start=1):
+        """将切片结果批量写入 t_data_synthesis_chunk_instances，并更新文件级分块计数。
+
+        使用多行 INSERT 分批写入，不为每个 chunk 创建 ORM 对象。
+        """
+        rows = []
+        for idx, (page_content, metadata) in enumerate(chunks, start=1):
             # 先复制原始 Document.metadata，再在其上追加任务相关字段，避免覆盖原有元数据
-            base_metadata = dict(getattr(doc, "metadata", {}) or {})
+            base_metadata = dict(metadata)
             base_metadata.update(
                 {
-                    "task_id": str(synthesis_task.id),
+                    "task_id": synthesis_task_id,
                     "file_id": file_id
                 }
             )
-
-            chunk_record = DataSynthesisChunkInstance(
-                id=str(uuid.uuid4()),
-                synthesis_file_instance_id=file_task.id,
-                chunk_index=idx,
-                chunk_content=doc.page_content,
-                chunk_metadata=base_metadata,
-            )
-            self.db.add(chunk_record)
+            rows.append({
+                "id": str(uuid.uuid4()),
+                "synthesis_file_instance_id": file_task.id,
+                "chunk_index": idx,
+                "chunk_content": page_content,
+                "chunk_metadata": base_metadata,
+            })
+            if len(rows) >= CHUNK_INSERT_BATCH_SIZE:
+                await db.execute(insert(DataSynthesisChunkInstance), rows)
+                rows = []
+        if rows:
+            await db.execute(insert(DataSynthesisChunkInstance), rows)
 
         # 更新文件任务的分块数量
         file_task.total_chunks = len(chunks)
         file_task.status = "processing"
 
-        await self.db.commit()
-        await self.db.refresh(file_task)
+        await db.commit()
 
+    @staticmethod
     async def _get_or_create_file_instance(
-        self,
+        db: AsyncSession,
         synthesis_task_id: str,
         source_file_id: str,
     ) -> DataSynthesisFileInstance:
@@ -557,7 +586,7 @@ class GenerationService:
           target_file_location 先复用任务的 result_data_location。
         """
         # 尝试查询已有文件任务记录
-        result = await self.db.execute(
+        result = await db.execute(
             select(DataSynthesisFileInstance).where(
                 DataSynthesisFileInstance.synthesis_instance_id == synthesis_task_id,
                 DataSynthesisFileInstance.source_file_id == source_file_id,
@@ -566,7 +595,8 @@ class GenerationService:
         file_task = result.scalar_one_or_none()
         return file_task
 
-    async def _mark_file_failed(self, synth_task_id: str, file_id: str, reason: str | None = None) -> None:
+    @staticmethod
+    async def _mark_file_failed(db: AsyncSession, synth_task_id: str, file_id: str, reason: str | None = None) -> None:
         """将指定任务下的单个文件任务标记为失败状态，兜底错误处理。
 
         - 如果找到对应的 DataSynthesisFileInstance，则更新其 status="failed"。
@@ -574,7 +604,7 @@ class GenerationService:
         - reason 参数仅用于日志记录，方便排查。
         """
         try:
-            result = await self.db.execute(
+            result = await db.execute(
                 select(DataSynthesisFileInstance).where(
                     DataSynthesisFileInstance.synthesis_instance_id == synth_task_id,
                     DataSynthesisFileInstance.source_file_id == file_id,
@@ -588,8 +618,7 @@ class GenerationService:
                 return
 
             file_task.status = "failed"
-            await self.db.commit()
-            await self.db.refresh(file_task)
+            await db.commit()
             logger.info(
                 f"Marked file task as failed for task={synth_task_id}, file_id={file_id}, reason={reason}"
             )
@@ -599,67 +628,94 @@ class GenerationService:
                 f"Unexpected error when marking file failed for task={synth_task_id}, file_id={file_id}, original_reason={reason}, error={e}"
             )
 
-    async def _get_file_ids_for_task(self, synth_task_id: str):
+    @staticmethod
+    async def _get_file_ids_for_task(db: AsyncSession, synth_task_id: str):
         """根据任务ID查询关联的文件原始ID列表"""
-        result = await self.db.execute(
+        result = await db.execute(
             select(DataSynthesisFileInstance.source_file_id)
             .where(DataSynthesisFileInstance.synthesis_instance_id == synth_task_id)
         )
         file_ids = result.scalars().all()
         return file_ids
 
-    # ========== 新增：chunk 计数与批量加载、processed_chunks 安全更新辅助方法 ==========
-    async def _count_chunks_for_file(self, synth_file_instance_id: str) -> int:
-        """统计指定任务与文件下的 chunk 总数。"""
-        from sqlalchemy import func
+    # ========== chunk 计数与批量加载、processed_chunks 批量更新辅助方法 ==========
+    @staticmethod
+    async def _count_task_qa_pairs(db: AsyncSession, synth_task_id: str) -> int:
+        """统计指定任务下已生成的 QA 总数。"""
+        result = await db.execute(
+            select(func.count(SynthesisData.id)).where(
+                SynthesisData.synthesis_file_instance_id.in_(
+                    select(DataSynthesisFileInstance.id).where(
+                        DataSynthesisFileInstance.synthesis_instance_id == synth_task_id
+                    )
+                )
+            )
+        )
+        return int(result.scalar() or 0)
 
-        result = await self.db.execute(
+    @staticmethod
+    async def _count_chunks_for_file(db: AsyncSession, synth_file_instance_id: str) -> int:
+        """统计指定任务与文件下的 chunk 总数。"""
+        result = await db.execute(
             select(func.count(DataSynthesisChunkInstance.id)).where(
                 DataSynthesisChunkInstance.synthesis_file_instance_id == synth_file_instance_id
             )
         )
         return int(result.scalar() or 0)
 
-    async def _load_chunk_batch(
-        self,
+    @staticmethod
+    async def _iter_chunk_batches(
+        db: AsyncSession,
         file_task_id: str,
-        start_index: int,
-        end_index: int,
-    ) -> list[DataSynthesisChunkInstance]:
-        """按索引范围加载指定文件任务下的一批 chunk 记录（含边界）。"""
-        result = await self.db.execute(
-            select(DataSynthesisChunkInstance)
-            .where(
-                DataSynthesisChunkInstance.synthesis_file_instance_id == file_task_id,
-                DataSynthesisChunkInstance.chunk_index >= start_index,
-                DataSynthesisChunkInstance.chunk_index <= end_index,
-            )
-            .order_by(DataSynthesisChunkInstance.chunk_index.asc())
-        )
-        return list(result.scalars().all())
+        batch_size: int,
+    ) -> AsyncIterator[list[Row]]:
+        """按 (synthesis_file_instance_id, chunk_index) 键集分页，流式返回指定文件任务下的 chunk。
 
-    async def _increment_processed_chunks(self, file_task_id: str, delta: int) -> None:
-        result = await self.db.execute(
-            select(DataSynthesisFileInstance).where(
-                DataSynthesisFileInstance.id == file_task_id,
+        只查询生成 QA 所需的列，不加载 ORM 对象，内存占用与 chunk 总数无关。
+        """
+        last_index = 0
+        while True:
+            result = await db.execute(
+                select(
+                    DataSynthesisChunkInstance.id,
+                    DataSynthesisChunkInstance.chunk_index,
+                    DataSynthesisChunkInstance.chunk_content,
+                )
+                .where(
+                    DataSynthesisChunkInstance.synthesis_file_instance_id == file_task_id,
+                    DataSynthesisChunkInstance.chunk_index > last_index,
+                )
+                .order_by(DataSynthesisChunkInstance.chunk_index.asc())
+                .limit(batch_size)
             )
-        )
-        file_task = result.scalar_one_or_none()
-        if not file_task:
-            logger.error(f"Failed to increment processed_chunks: file_task {file_task_id} not found")
-            return
-
-        # 原始自增
-        new_value = (file_task.processed_chunks or 0) + int(delta)
+            chunk_batch = list(result.all())
+            if not chunk_batch:
+                return
+            yield chunk_batch
+            if len(chunk_batch) < batch_size:
+                return
+            last_index = chunk_batch[-1].chunk_index
 
-        # 如果存在 total_chunks，上限为 total_chunks，避免超过
-        total = file_task.total_chunks
-        if isinstance(total, int) and total >= 0:
-            new_value = min(new_value, total)
+    @staticmethod
+    async def _increment_processed_chunks(db: AsyncSession, file_task_id: str, delta: int) -> None:
+        """以一条 UPDATE 累加 processed_chunks，上限为 total_chunks；由调用方提交。"""
+        new_value = func.coalesce(DataSynthesisFileInstance.processed_chunks, 0) + int(delta)
+        await db.execute(
+            update(DataSynthesisFileInstance)
+            .where(DataSynthesisFileInstance.id == file_task_id)
+            .values(processed_chunks=func.least(new_value, DataSynthesisFileInstance.total_chunks))
+            .execution_options(synchronize_session=False)
+        )
 
-        file_task.processed_chunks = new_value
-        await self.db.commit()
-        await self.db.refresh(file_task)
+    @staticmethod
+    async def _complete_processed_chunks(db: AsyncSession, file_task_id: str) -> None:
+        """以一条 UPDATE 将 processed_chunks 置为 total_chunks；由调用方提交。"""
+        await db.execute(
+            update(DataSynthesisFileInstance)
+            .where(DataSynthesisFileInstance.id == file_task_id)
+            .values(processed_chunks=DataSynthesisFileInstance.total_chunks)
+            .execution_options(synchronize_session=False)
+        )
 
     async def add_synthesis_to_graph(self, db: AsyncSession, task_id: str, dest_dataset_id: str) -> None:
         """记录数据合成血缘关系：源数据集 -> 合成数据集 via DATA_SYNTHESIS"""
@@ -3,9 +3,10 @@ import asyncio
 from typing import Optional, Sequence
 
 from fastapi import Depends
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.db.models.dataset_management import DatasetFiles
 from app.db.models.knowledge_gen import RagFile, RagKnowledgeBase
@@ -32,6 +33,8 @@ class RAGService:
         self.db = db
         self.background_tasks = None
         self.rag = None
+        # 并发的入库任务共用同一个会话，状态更新需串行
+        self._status_lock = asyncio.Lock()
 
     async def get_unprocessed_files(self, knowledge_base_id: str) -> Sequence[RagFile]:
         result = await self.db.execute(
@@ -80,42 +83,83 @@ class RAGService:
             await service._process_pending_files(knowledge_base_id)
 
     async def _process_pending_files(self, knowledge_base_id: str):
+        """批量入库知识库中未处理的文件。
+
+        - 文件在线程池中并发加载，加载完成的文件按页数攒批；
+        - 每批多个文件的页面通过一次 ainsert 提交，并发的 ainsert 调用数受限；
+        - 文件状态按批批量更新。
+        """
         rag_files = await self.get_unprocessed_files(knowledge_base_id)
         if not rag_files:
             logger.info(f"No pending files to process for knowledge base {knowledge_base_id}")
             return
 
-        for rag_file in rag_files:
-            await self._process_single_file(rag_file)
-
-    async def _process_single_file(self, rag_file: RagFile):
-        try:
-            await self._mark_file_status(rag_file, "PROCESSING")
-            dataset_file = await self._get_dataset_file(rag_file.file_id)
-            documents = load_documents(dataset_file.file_path)
-            for doc in documents:
-                logger.info(f"Processing document {doc.page_content}")
-                await self.rag.ainsert(input=doc.page_content, file_paths=[dataset_file.file_path])
-        except Exception:  # noqa: BLE001
-            logger.exception("Failed to process rag file %s", rag_file.id)
-            await self._mark_file_status(rag_file, "PROCESS_FAILED")
-            return
-        await self._mark_file_status(rag_file, "PROCESSED")
-
-    async def _get_dataset_file(self, file_id: str) -> DatasetFiles:
+        await self._update_files_status([rag_file.id for rag_file in rag_files], "PROCESSING")
+        file_paths = await self._get_dataset_file_paths([rag_file.file_id for rag_file in rag_files])
+
+        load_semaphore = asyncio.Semaphore(max(settings.rag_load_concurrency, 1))
+        insert_semaphore = asyncio.Semaphore(max(settings.rag_insert_concurrency, 1))
+        batch_size = max(settings.rag_insert_batch_size, 1)
+
+        async def load(rag_file: RagFile):
+            try:
+                file_path = file_paths.get(rag_file.file_id)
+                if not file_path:
+                    raise ValueError(f"Dataset file with ID {rag_file.file_id} not found.")
+                async with load_semaphore:
+                    documents = await asyncio.to_thread(load_documents, file_path)
+                return rag_file, file_path, [doc.page_content for doc in documents], None
+            except Exception as e:  # noqa: BLE001
+                return rag_file, None, [], e
+
+        async def insert(file_ids: list[str], pages: list[str], paths: list[str]):
+            async with insert_semaphore:
+                try:
+                    await self.rag.ainsert(input=pages, file_paths=paths)
+                    status = "PROCESSED"
+                except Exception:  # noqa: BLE001
+                    logger.exception("Failed to insert %d pages of rag files %s", len(pages), file_ids)
+                    status = "PROCESS_FAILED"
+            await self._update_files_status(file_ids, status)
+
+        insert_tasks = []
+        batch_file_ids, batch_pages, batch_paths = [], [], []
+        for future in asyncio.as_completed([load(rag_file) for rag_file in rag_files]):
+            rag_file, file_path, pages, error = await future
+            if error is not None:
+                logger.error("Failed to load rag file %s: %s", rag_file.id, error)
+                await self._update_files_status([rag_file.id], "PROCESS_FAILED")
+                continue
+            if not pages:
+                await self._update_files_status([rag_file.id], "PROCESSED")
+                continue
+
+            logger.info(f"Loaded rag file {rag_file.id} with {len(pages)} documents")
+            # 同一文件的页面总在同一批中提交，便于按批回写文件状态
+            batch_file_ids.append(rag_file.id)
+            batch_pages.extend(pages)
+            batch_paths.extend([file_path] * len(pages))
+            if len(batch_pages) >= batch_size:
+                insert_tasks.append(asyncio.create_task(insert(batch_file_ids, batch_pages, batch_paths)))
+                batch_file_ids, batch_pages, batch_paths = [], [], []
+
+        if batch_pages:
+            insert_tasks.append(asyncio.create_task(insert(batch_file_ids, batch_pages, batch_paths)))
+        await asyncio.gather(*insert_tasks)
+        logger.info(f"Finished processing {len(rag_files)} files for knowledge base {knowledge_base_id}")
+
+    async def _get_dataset_file_paths(self, file_ids: list[str]) -> dict[str, str]:
         result = await self.db.execute(
-            select(DatasetFiles).where(DatasetFiles.id == file_id)
+            select(DatasetFiles.id, DatasetFiles.file_path).where(DatasetFiles.id.in_(file_ids))
         )
-        dataset_file = result.scalars().first()
-        if not dataset_file:
-            raise ValueError(f"Dataset file with ID {file_id} not found.")
-        return dataset_file
-
-    async def _mark_file_status(self, rag_file: RagFile, status: str):
-        rag_file.status = status
-        self.db.add(rag_file)
-        await self.db.commit()
-        await self.db.refresh(rag_file)
+        return {str(file_id): file_path for file_id, file_path in result.all()}
+
+    async def _update_files_status(self, rag_file_ids: list[str], status: str):
+        async with self._status_lock:
+            await self.db.execute(
+                update(RagFile).where(RagFile.id.in_(rag_file_ids)).values(status=status)
+            )
+            await self.db.commit()
 
     async def _get_knowledge_base(self, knowledge_base_id: str):
         result = await self.db.execute(
@@ -1,26 +1,83 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-import random
 import json
 import os
 import shutil
 import asyncio
 
-from sqlalchemy import select
+from sqlalchemy import false, func, insert, or_, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
 from app.core.logging import get_logger
 from app.db.models.base_entity import LineageNode, LineageEdge
 from app.db.models.ratio_task import RatioInstance, RatioRelation
 from app.db.models import Dataset, DatasetFiles
 from app.db.session import AsyncSessionLocal
-from app.module.dataset.schema.dataset_file import DatasetFileTag
 from app.module.shared.common.lineage import LineageService
 from app.module.shared.schema import TaskStatus, NodeType, EdgeType
 from app.module.ratio.schema.ratio_task import FilterCondition
 
 logger = get_logger(__name__)
 
+# 标签结构与 DatasetFileTag 一致：[{"from_name": 标签名, "type": 类型, "values": {类型: [标签值] | 标签值}}]
+# label 为空时匹配任意标签名，value 为空时匹配该标签名下的任意标签值
+_PG_TAG_LABEL_PREDICATE = text("""
+    EXISTS (
+        SELECT 1
+        FROM jsonb_array_elements(
+            CASE WHEN jsonb_typeof(t_dm_dataset_files.tags::jsonb) = 'array'
+                 THEN t_dm_dataset_files.tags::jsonb ELSE '[]'::jsonb END
+        ) AS tag
+        WHERE COALESCE(tag->>'from_name', '') <> ''
+          AND (:label = '' OR tag->>'from_name' = :label)
+          AND CASE jsonb_typeof(tag->'values'->(tag->>'type'))
+                WHEN 'array' THEN
+                    CASE WHEN :value = ''
+                         THEN jsonb_path_exists(tag->'values'->(tag->>'type'), '$[*] ? (@.type() == "string")')
+                         ELSE (tag->'values'->(tag->>'type')) @> jsonb_build_array(CAST(:value AS text))
+                    END
+                WHEN 'string' THEN :value = '' OR tag->'values'->>(tag->>'type') = :value
+                ELSE false
+              END
+    )
+""")
+
+# MySQL 8.0+ 下与 _PG_TAG_LABEL_PREDICATE 语义一致的标签过滤条件
+_MYSQL_TAG_LABEL_PREDICATE = text("""
+    EXISTS (
+        SELECT 1
+        FROM JSON_TABLE(
+            CASE WHEN JSON_TYPE(t_dm_dataset_files.tags) = 'ARRAY'
+                 THEN t_dm_dataset_files.tags ELSE JSON_ARRAY() END,
+            '$[*]' COLUMNS (
+                from_name VARCHAR(255) PATH '$.from_name',
+                tag_type VARCHAR(255) PATH '$.type',
+                tag_values JSON PATH '$.values'
+            )
+        ) AS tag
+        WHERE COALESCE(tag.from_name, '') <> ''
+          AND (:label = '' OR tag.from_name = :label)
+          AND CASE JSON_TYPE(JSON_EXTRACT(tag.tag_values, CONCAT('$."', tag.tag_type, '"')))
+                WHEN 'ARRAY' THEN
+                    CASE WHEN :value = ''
+                         THEN JSON_SEARCH(JSON_EXTRACT(tag.tag_values, CONCAT('$."', tag.tag_type, '"')),
+                                          'one', '%') IS NOT NULL
+                         ELSE JSON_CONTAINS(JSON_EXTRACT(tag.tag_values, CONCAT('$."', tag.tag_type, '"')),
+                                            JSON_QUOTE(:value))
+                    END
+                WHEN 'STRING' THEN :value = ''
+                    OR JSON_UNQUOTE(JSON_EXTRACT(tag.tag_values, CONCAT('$."', tag.tag_type, '"'))) = :value
+                ELSE false
+              END
+    )
+""")
+
+_TAG_LABEL_PREDICATES = {
+    "postgresql": _PG_TAG_LABEL_PREDICATE,
+    "mysql": _MYSQL_TAG_LABEL_PREDICATE,
+}
+
 
 class RatioTaskService:
     """Service for Ratio Task DB operations."""
@@ -163,53 +220,95 @@ class RatioTaskService:
             if not rel.source_dataset_id or not rel.counts or rel.counts <= 0:
                 continue
 
+            # Filtering and random sampling are done in the database
             files = await RatioTaskService.get_files(rel, session)
 
-            if not files:
-                continue
-
-            pick_n = min(rel.counts or 0, len(files))
-            chosen = random.sample(files, pick_n) if pick_n < len(files) else files
-
-            # Copy into target dataset with de-dup by target path
-            for file in chosen:
+            chosen = []
+            for file in files:
                 if file.file_path in source_paths:
                     continue
-                await RatioTaskService.handle_selected_file(existing_paths, file, session, target_ds)
                 source_paths.add(file.file_path)
-                added_count += 1
-                added_size += int(file.file_size or 0)
+                chosen.append(file)
+            if not chosen:
+                continue
+
+            records = await RatioTaskService.copy_selected_files(existing_paths, chosen, target_ds)
+            await RatioTaskService.bulk_insert_files(session, records)
+            added_count += len(records)
+            added_size += sum(int(record.get("file_size") or 0) for record in records)
 
             # Periodically flush to avoid huge transactions
             await session.flush()
         return added_count, added_size
 
     @staticmethod
-    async def handle_selected_file(existing_paths: set[Any], f, session, target_ds: Dataset):
-        src_path = f.file_path
+    async def copy_selected_files(existing_paths: set[Any], files: list[Any], target_ds: Dataset) -> list[dict]:
+        """Copy selected files into the target dataset with bounded concurrency.
+
+        Target names are resolved up front so that the copies can run in parallel.
+        Returns the DatasetFiles records to insert.
+        """
         dst_prefix = f"/dataset/{target_ds.id}/"
-        file_name = RatioTaskService.get_new_file_name(dst_prefix, existing_paths, f)
+        plans = []
+        for f in files:
+            file_name = RatioTaskService.get_new_file_name(dst_prefix, existing_paths, f)
+            new_path = dst_prefix + file_name
+            existing_paths.add(new_path)
+            plans.append((f, file_name, new_path))
+
+        for dst_dir in {os.path.dirname(new_path) for _, _, new_path in plans}:
+            await asyncio.to_thread(os.makedirs, dst_dir, exist_ok=True)
+
+        semaphore = asyncio.Semaphore(max(settings.ratio_copy_concurrency, 1))
+
+        async def _copy(src_path: str, new_path: str) -> None:
+            async with semaphore:
+                await asyncio.to_thread(RatioTaskService._link_or_copy, src_path, new_path)
+
+        await asyncio.gather(*(_copy(f.file_path, new_path) for f, _, new_path in plans))
+
+        now = datetime.now()
+        records = []
+        for f, file_name, new_path in plans:
+            file_data = {
+                "dataset_id": target_ds.id,  # type: ignore
+                "file_name": file_name,
+                "file_path": new_path,
+                "file_type": f.file_type,
+                "file_size": f.file_size or 0,
+                "check_sum": f.check_sum,
+                "tags": f.tags,
+                "tags_updated_at": now,
+                "dataset_filemetadata": f.dataset_filemetadata,
+                "status": "ACTIVE",
+            }
+            records.append(file_data)
+        return records
 
-        new_path = dst_prefix + file_name
-        dst_dir = os.path.dirname(new_path)
-        await asyncio.to_thread(os.makedirs, dst_dir, exist_ok=True)
-        await asyncio.to_thread(shutil.copy2, src_path, new_path)
-
-        file_data = {
-            "dataset_id": target_ds.id,  # type: ignore
-            "file_name": file_name,
-            "file_path": new_path,
-            "file_type": f.file_type,
-            "file_size": f.file_size,
-            "check_sum": f.check_sum,
-            "tags": f.tags,
-            "tags_updated_at": datetime.now(),
-            "dataset_filemetadata": f.dataset_filemetadata,
-            "status": "ACTIVE",
-        }
-        file_record = {k: v for k, v in file_data.items() if v is not None}
-        session.add(DatasetFiles(**file_record))
-        existing_paths.add(new_path)
+    @staticmethod
+    def _link_or_copy(src_path: str, dst_path: str) -> None:
+        """Copy the file, or hard-link it when ratio_link_files is enabled and both sides share a filesystem."""
+        if settings.ratio_link_files:
+            try:
+                os.link(src_path, dst_path)
+                return
+            except FileExistsError:
+                os.remove(dst_path)
+                try:
+                    os.link(src_path, dst_path)
+                    return
+                except OSError:
+                    pass
+            except OSError:
+                # EXDEV (different filesystem) or links not supported
+                pass
+        shutil.copy2(src_path, dst_path)
+
+    @staticmethod
+    async def bulk_insert_files(session: AsyncSession, records: list[dict]) -> None:
+        batch_size = max(settings.ratio_insert_batch_size, 1)
+        for i in range(0, len(records), batch_size):
+            await session.execute(insert(DatasetFiles), records[i:i + batch_size])
 
     @staticmethod
     def get_new_file_name(dst_prefix: str, existing_paths: set[Any], f) -> str:
@@ -232,20 +331,29 @@ class RatioTaskService:
 
     @staticmethod
     async def get_files(rel: RatioRelation, session) -> list[Any]:
-        # Fetch all files for the source dataset (ACTIVE only)
-        files_res = await session.execute(
-            select(DatasetFiles).where(
-                DatasetFiles.dataset_id == rel.source_dataset_id,
-                DatasetFiles.status == "ACTIVE",
-            )
+        """Randomly pick at most rel.counts ACTIVE files of the source dataset matching the filter conditions."""
+        dialect = session.bind.dialect.name
+        query = select(
+            DatasetFiles.file_name,
+            DatasetFiles.file_path,
+            DatasetFiles.file_type,
+            DatasetFiles.file_size,
+            DatasetFiles.check_sum,
+            DatasetFiles.tags,
+            DatasetFiles.dataset_filemetadata,
+        ).where(
+            DatasetFiles.dataset_id == rel.source_dataset_id,
+            DatasetFiles.status == "ACTIVE",
         )
-        files = list(files_res.scalars().all())
 
         # TAG mode: filter by tags according to relation.filter_conditions
         conditions = RatioTaskService._parse_conditions(rel.filter_conditions)
         if conditions:
-            files = [f for f in files if RatioTaskService._filter_file(f, conditions)]
-        return files
+            query = query.where(*RatioTaskService._build_filter_clauses(conditions, dialect))
+
+        random_order = func.rand() if dialect == "mysql" else func.random()
+        files_res = await session.execute(query.order_by(random_order).limit(rel.counts))
+        return list(files_res.all())
 
     # ------------------------- helpers for TAG filtering ------------------------- #
 
@@ -272,67 +380,32 @@ class RatioTaskService:
             return None
 
     @staticmethod
-    def _filter_file(file: DatasetFiles, conditions: FilterCondition) -> bool:
-        if not conditions:
-            return True
-        logger.info(f"start filter file: {file}, conditions: {conditions}")
+    def _build_filter_clauses(conditions: FilterCondition, dialect: str = "postgresql") -> list[Any]:
+        """Translate filter conditions into SQL predicates on t_dm_dataset_files for the given SQL dialect."""
+        clauses = []
 
         # Check data range condition if provided
         if conditions.date_range and len(conditions.date_range) == 2:
             try:
-                from datetime import datetime, timedelta
                 start_at = datetime.fromisoformat(conditions.date_range[0])
                 end_at = datetime.fromisoformat(conditions.date_range[1])
-                if file.tags_updated_at and (file.tags_updated_at < start_at or file.tags_updated_at > end_at):
-                    return False
-            except (ValueError, TypeError) as e:
-                logger.warning(f"Invalid data_range value: {conditions.date_range}", e)
-                return False
+                clauses.append(or_(
+                    DatasetFiles.tags_updated_at.is_(None),
+                    DatasetFiles.tags_updated_at.between(start_at, end_at),
+                ))
+            except (ValueError, TypeError):
+                logger.warning(f"Invalid data_range value: {conditions.date_range}")
+                clauses.append(false())
 
         # Check label condition if provided
         if conditions.label:
-            tags = file.tags
-            if not tags:
-                return False
-            try:
-                # tags could be a list of strings or list of objects with 'name'
-                all_tags = RatioTaskService.get_all_tags(tags)
-                for tag in all_tags:
-                    if conditions.label.label and tag.get("label") != conditions.label.label:
-                        continue
-                    if conditions.label.value is None or len(conditions.label.value) == 0:
-                        return True
-                    if tag.get("value") == conditions.label.value:
-                        return True
-                return False
-            except Exception as e:
-                logger.exception(f"Failed to get tags for {file}", e)
-                return False
-
-        return True
-
-    @staticmethod
-    def get_all_tags(tags) -> list[dict]:
-        """获取所有处理后的标签字符串列表"""
-        all_tags = list()
-        if not tags:
-            return all_tags
-
-        file_tags = []
-        for tag_data in tags:
-            # 处理可能的命名风格转换（下划线转驼峰）
-            processed_data = {}
-            for key, value in tag_data.items():
-                # 将驼峰转为下划线以匹配 Pydantic 模型字段
-                processed_data[key] = value
-            # 创建 DatasetFileTag 对象
-            file_tag = DatasetFileTag(**processed_data)
-            file_tags.append(file_tag)
-
-        for file_tag in file_tags:
-            for tag_data in file_tag.get_tags():
-                all_tags.append(tag_data)
-        return all_tags
+            if dialect not in _TAG_LABEL_PREDICATES:
+                raise ValueError(f"Tag filtering is not supported on database dialect: {dialect}")
+            clauses.append(_TAG_LABEL_PREDICATES[dialect].bindparams(
+                label=conditions.label.label or "",
+                value=conditions.label.value or "",
+            ))
+        return clauses
 
     @staticmethod
     async def _add_task_to_graph(
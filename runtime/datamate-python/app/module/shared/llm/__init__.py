@@ -2,6 +2,7 @@
 """
 LangChain 模型工厂：统一创建 Chat、Embedding 及健康检查，便于各模块复用。
 """
+from .client_registry import ModelClient, OpenAIClientRegistry
 from .factory import LLMFactory
 
-__all__ = ["LLMFactory"]
+__all__ = ["LLMFactory", "ModelClient", "OpenAIClientRegistry"]
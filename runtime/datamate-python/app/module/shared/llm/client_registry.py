@@ -0,0 +1,188 @@
+# app/module/shared/llm/client_registry.py
+"""
+OpenAI 兼容客户端注册表：按 (base_url, api_key, model) 在进程内复用客户端与 HTTP 连接池，
+并对每个模型做并发/速率限制与调用指标统计。
+模型配置更新、删除或健康检查失败后由模型配置服务调用 evict 移除并关闭不再使用的客户端。
+"""
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class ModelMetrics:
+    """单个模型的调用指标"""
+    in_flight: int = 0
+    total: int = 0
+    failed: int = 0
+    total_latency: float = 0.0
+    max_in_flight: int = 0
+
+    def snapshot(self) -> dict[str, Any]:
+        completed = self.total - self.in_flight
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "total": self.total,
+            "failed": self.failed,
+            "avg_latency": self.total_latency / completed if completed > 0 else 0.0,
+        }
+
+
+class ModelClient:
+    """单个模型的客户端：共享 HTTP 连接池，并限制并发数与每分钟请求数。"""
+
+    def __init__(self, base_url: str | None, api_key: str | None, model_name: str):
+        self.base_url = base_url or None
+        self.api_key = api_key or ""
+        self.model_name = model_name
+        self.metrics = ModelMetrics()
+        self._semaphore = asyncio.Semaphore(max(settings.llm_model_concurrency, 1))
+        # 每分钟请求数限制：相邻请求的最小间隔，<=0 表示不限制
+        self._min_interval = 60.0 / settings.llm_model_rpm if settings.llm_model_rpm > 0 else 0.0
+        self._next_slot = 0.0
+        self._rate_lock = asyncio.Lock()
+        self._http_async_client: httpx.AsyncClient | None = None
+        self._http_client: httpx.Client | None = None
+        self._async_client: AsyncOpenAI | None = None
+        self._sync_client: OpenAI | None = None
+        self._sync_lock = threading.Lock()
+
+    @staticmethod
+    def _limits() -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.llm_max_connections,
+            max_keepalive_connections=settings.llm_max_keepalive_connections,
+            keepalive_expiry=settings.llm_keepalive_expiry,
+        )
+
+    @property
+    def http_async_client(self) -> httpx.AsyncClient:
+        if self._http_async_client is None:
+            self._http_async_client = httpx.AsyncClient(
+                limits=self._limits(), timeout=settings.llm_request_timeout
+            )
+        return self._http_async_client
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._sync_lock:
+            if self._http_client is None:
+                self._http_client = httpx.Client(limits=self._limits(), timeout=settings.llm_request_timeout)
+            return self._http_client
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(
+                base_url=self.base_url, api_key=self.api_key, http_client=self.http_async_client
+            )
+        return self._async_client
+
+    @property
+    def sync_client(self) -> OpenAI:
+        http_client = self.http_client
+        with self._sync_lock:
+            if self._sync_client is None:
+                self._sync_client = OpenAI(base_url=self.base_url, api_key=self.api_key, http_client=http_client)
+            return self._sync_client
+
+    async def _wait_rate_limit(self) -> None:
+        if self._min_interval <= 0:
+            return
+        async with self._rate_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self._min_interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """获取一次调用额度，并记录调用指标"""
+        async with self._semaphore:
+            await self._wait_rate_limit()
+            self.metrics.in_flight += 1
+            self.metrics.total += 1
+            self.metrics.max_in_flight = max(self.metrics.max_in_flight, self.metrics.in_flight)
+            start = time.monotonic()
+            try:
+                yield
+            except Exception:
+                self.metrics.failed += 1
+                raise
+            finally:
+                self.metrics.in_flight -= 1
+                self.metrics.total_latency += time.monotonic() - start
+
+    async def chat(self, prompt: str, **kwargs) -> str:
+        """异步调用 chat.completions 并返回 content"""
+        async with self.slot():
+            response = await self.async_client.chat.completions.create(
+                model=self.model_name,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs
+            )
+        return response.choices[0].message.content
+
+    async def aclose(self) -> None:
+        if self._http_async_client is not None:
+            await self._http_async_client.aclose()
+        if self._http_client is not None:
+            self._http_client.close()
+
+
+class OpenAIClientRegistry:
+    """进程级 OpenAI 兼容客户端注册表"""
+
+    _clients: dict[tuple[str | None, str | None, str], ModelClient] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, base_url: str | None, api_key: str | None, model_name: str) -> ModelClient:
+        key = (base_url or None, api_key or None, model_name)
+        client = cls._clients.get(key)
+        if client is not None:
+            return client
+        with cls._lock:
+            if key not in cls._clients:
+                cls._clients[key] = ModelClient(base_url, api_key, model_name)
+                logger.info(f"Created pooled LLM client for model={model_name}, base_url={base_url}")
+            return cls._clients[key]
+
+    @classmethod
+    def metrics(cls) -> dict[str, dict[str, Any]]:
+        """按 "model@base_url" 汇总各模型的调用指标"""
+        return {
+            f"{client.model_name}@{client.base_url}": client.metrics.snapshot()
+            for client in list(cls._clients.values())
+        }
+
+    @classmethod
+    async def evict(cls, base_url: str | None, api_key: str | None, model_name: str) -> None:
+        """移除并关闭指定配置的客户端，之后的调用会按需重新创建"""
+        key = (base_url or None, api_key or None, model_name)
+        with cls._lock:
+            client = cls._clients.pop(key, None)
+        if client is not None:
+            await client.aclose()
+            logger.info(f"Evicted pooled LLM client for model={model_name}, base_url={base_url}")
+
+    @classmethod
+    async def aclose(cls) -> None:
+        with cls._lock:
+            clients = list(cls._clients.values())
+            cls._clients.clear()
+        for client in clients:
+            await client.aclose()
@@ -10,6 +10,8 @@ from langchain_core.embeddings import Embeddings
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 from pydantic import SecretStr
 
+from .client_registry import OpenAIClientRegistry
+
 
 class LLMFactory:
     """基于 LangChain 的 Chat / Embedding 工厂，面向 OpenAI 兼容 API。"""
@@ -20,11 +22,17 @@ class LLMFactory:
         base_url: str,
         api_key: str | None = None,
     ) -> BaseChatModel:
-        """创建对话模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。"""
+        """创建对话模型，兼容 OpenAI 及任意 base_url 的 OpenAI 兼容服务。
+
+        同一 (base_url, api_key, model) 的模型共享注册表中的 HTTP 连接池。
+        """
+        client = OpenAIClientRegistry.get(base_url, api_key, model_name)
         return ChatOpenAI(
             model=model_name,
             base_url=base_url or None,
             api_key=SecretStr(api_key or ""),
+            http_client=client.http_client,
+            http_async_client=client.http_async_client,
         )
 
     @staticmethod
@@ -69,3 +77,19 @@ class LLMFactory:
     def invoke_sync(chat_model: BaseChatModel, prompt: str) -> str:
         """同步调用对话模型并返回 content，供 run_in_executor 等场景使用。"""
         return chat_model.invoke(prompt).content
+
+    @staticmethod
+    async def ainvoke(chat_model: BaseChatModel, prompt: str) -> str:
+        """异步调用对话模型并返回 content，不占用线程池；OpenAI 兼容模型受注册表的并发与速率限制。"""
+        model_name = getattr(chat_model, "model_name", None)
+        if not model_name:
+            return (await chat_model.ainvoke(prompt)).content
+
+        api_key = getattr(chat_model, "openai_api_key", None)
+        client = OpenAIClientRegistry.get(
+            getattr(chat_model, "openai_api_base", None),
+            api_key.get_secret_value() if api_key is not None else None,
+            model_name,
+        )
+        async with client.slot():
+            return (await chat_model.ainvoke(prompt)).content
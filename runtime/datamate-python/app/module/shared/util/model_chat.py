@@ -1,11 +1,9 @@
-from openai import OpenAI
+from app.module.shared.llm.client_registry import OpenAIClientRegistry
 
 
 def call_openai_style_model(base_url, api_key, model_name, prompt, **kwargs):
-    client = OpenAI(
-        base_url=base_url,
-        api_key=api_key
-    )
+    """同步调用，复用注册表中的客户端与连接池。"""
+    client = OpenAIClientRegistry.get(base_url, api_key, model_name).sync_client
 
     response = client.chat.completions.create(
         model=model_name,
@@ -15,6 +13,12 @@ def call_openai_style_model(base_url, api_key, model_name, prompt, **kwargs):
     return response.choices[0].message.content
 
 
+async def acall_openai_style_model(base_url, api_key, model_name, prompt, **kwargs):
+    """异步调用，直接 await AsyncOpenAI，不占用线程，受单模型并发与速率限制。"""
+    client = OpenAIClientRegistry.get(base_url, api_key, model_name)
+    return await client.chat(prompt, **kwargs)
+
+
 def extract_json_substring(raw: str) -> str:
     """从 LLM 的原始回答中提取最可能的 JSON 字符串片段。
 
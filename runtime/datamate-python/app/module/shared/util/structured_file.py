@@ -1,13 +1,99 @@
 import json
+import uuid
 
 from enum import Enum
-from jsonschema import validate
+from typing import Any, Iterator, TextIO
+
+from jsonschema.validators import validator_for
 
 class ItemTypes(Enum):
     QA = "QA"
     COT = "COT"
 
 
+# 流式解析 JSON 文件时每次读取的字符数
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def iter_json_values(f: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Any]:
+    """增量解析 JSON 文件。
+
+    顶层为数组时逐个返回数组元素，内存中只保留当前元素所在的读取块；否则整体解析并返回顶层值。
+    数组中缺少元素的逗号（如 [1,,2]、[,1]、[1,]）或数组后多余的内容会抛出 ValueError。
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    # 前导空白可能跨越多个读取块，读到第一个非空白字符后再判断顶层是否为数组
+    while pos >= len(buf) and not eof:
+        buf = f.read(chunk_size)
+        eof = not buf
+        pos = _skip_whitespace(buf, 0)
+    if pos >= len(buf) or buf[pos] != "[":
+        yield json.loads(buf[pos:] + f.read())
+        return
+
+    pos += 1
+    # 下一个非空白字符应为元素；为 False 时应为逗号或数组结束符
+    expect_value = True
+    empty = True
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos >= len(buf):
+            if eof:
+                raise ValueError("Unexpected end of JSON array")
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = more, 0
+            continue
+        if buf[pos] == "]" and (empty or not expect_value):
+            _ensure_trailing_whitespace(f, buf, pos + 1, chunk_size)
+            return
+        if not expect_value:
+            # 元素后的字符已校验为逗号或数组结束符
+            pos += 1
+            expect_value = True
+            continue
+        if buf[pos] in ",]":
+            raise ValueError(f"Expecting JSON array element at position {pos}, got {buf[pos]!r}")
+
+        try:
+            value, end = decoder.raw_decode(buf, pos)
+            end = _skip_whitespace(buf, end)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            value, end = None, len(buf)
+        # 元素后必须是逗号或数组结束符，否则元素被读取块截断（如数字），读取更多内容后重新解析
+        if end >= len(buf) or buf[end] not in ",]":
+            if eof:
+                raise ValueError(f"Invalid JSON array element at position {pos}")
+            more = f.read(chunk_size)
+            eof = not more
+            buf, pos = buf[pos:] + more, 0
+            continue
+        yield value
+        pos = end
+        expect_value = False
+        empty = False
+
+
+def _skip_whitespace(buf: str, pos: int) -> int:
+    while pos < len(buf) and buf[pos] in " \t\r\n":
+        pos += 1
+    return pos
+
+
+def _ensure_trailing_whitespace(f: TextIO, buf: str, pos: int, chunk_size: int) -> None:
+    """顶层数组结束后只允许出现空白字符"""
+    while True:
+        pos = _skip_whitespace(buf, pos)
+        if pos < len(buf):
+            raise ValueError(f"Extra data after JSON array at position {pos}")
+        buf, pos = f.read(chunk_size), 0
+        if not buf:
+            return
+
+
 class StructuredFileItemHandler:
     def __init__(self):
         pass
@@ -15,26 +101,34 @@ class StructuredFileItemHandler:
     def get_item_type(self) -> ItemTypes:
         pass
 
-    def validate_json(self, data):
+    def is_valid_item(self, data) -> bool:
         pass
 
-    def get_items_from_file(self, file_path: str) -> list[dict]:
+    def validate_json(self, data):
+        if isinstance(data, list):
+            return all(self.is_valid_item(item) for item in data)
+        return self.is_valid_item(data)
+
+    def iter_items_from_file(self, file_path: str) -> Iterator[dict]:
+        """流式读取文件中的条目，逐条校验并跳过不符合格式的条目"""
         file_type = file_path.split(".")[-1].upper()
-        items = []
         if file_type == "JSON":
             with open(file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if not self.validate_json(data):
-                    return items
-                items = data
+                for data in iter_json_values(f):
+                    if self.is_valid_item(data):
+                        yield data
         elif file_type == "JSONL":
             with open(file_path, "r", encoding="utf-8") as f:
                 for line in f:
-                    data = json.loads(line)
-                    if not self.validate_json(data):
+                    if not line.strip():
                         continue
-                    items.append(data)
-        return items
+                    data = json.loads(line)
+                    for item in (data if isinstance(data, list) else [data]):
+                        if self.is_valid_item(item):
+                            yield item
+
+    def get_items_from_file(self, file_path: str) -> list[dict]:
+        return list(self.iter_items_from_file(file_path))
 
 class QAItemHandler(StructuredFileItemHandler):
     def __init__(self):
@@ -47,25 +141,15 @@ class QAItemHandler(StructuredFileItemHandler):
             },
             "required": ["instruction", "output"],
         }
-        self.schema_alpaca_list = {
-            "type": "array",
-            "items": self.schema_alpaca,
-        }
+        # 预编译校验器，避免每个条目重新解析 schema
+        self._validator = validator_for(self.schema_alpaca)(self.schema_alpaca)
         super().__init__()
 
     def get_item_type(self):
         return ItemTypes.QA
 
-    def validate_json(self, data):
-        try:
-            validate(instance=data, schema=self.schema_alpaca)
-            return True
-        except Exception as e:
-            try:
-                validate(instance=data, schema=self.schema_alpaca_list)
-                return True
-            except Exception as e:
-                return False
+    def is_valid_item(self, data) -> bool:
+        return self._validator.is_valid(data)
 
 
 class COTItemHandler(StructuredFileItemHandler):
@@ -79,25 +163,15 @@ class COTItemHandler(StructuredFileItemHandler):
             },
             "required": ["question", "instruction", "output"],
         }
-        self.schema_list = {
-            "type": "array",
-            "items": self.schema,
-        }
+        # 预编译校验器，避免每个条目重新解析 schema
+        self._validator = validator_for(self.schema)(self.schema)
         super().__init__()
 
     def get_item_type(self):
         return ItemTypes.COT
 
-    def validate_json(self, data):
-        try:
-            validate(instance=data, schema=self.schema)
-            return True
-        except Exception as e:
-            try:
-                validate(instance=data, schema=self.schema_list)
-                return True
-            except Exception as e:
-                return False
+    def is_valid_item(self, data) -> bool:
+        return self._validator.is_valid(data)
 
 
 class StructuredFileHandlerFactory:
@@ -111,3 +185,15 @@ class StructuredFileHandlerFactory:
             if handler.get_item_type().value == item_type:
                 return handler
         raise ValueError(f"Unsupported item type: {item_type}")
+
+
+def load_eval_items(item_type: str, file_path: str) -> list[tuple[str, str]]:
+    """解析文件中的评估条目，返回 (条目ID, 条目JSON) 列表。
+
+    在进程池中执行，返回值需可序列化。
+    """
+    handler = StructuredFileHandlerFactory().get_handler(item_type)
+    return [
+        (item.get("id") if item.get("id") else str(uuid.uuid4()), json.dumps(item, ensure_ascii=False))
+        for item in handler.iter_items_from_file(file_path)
+    ]
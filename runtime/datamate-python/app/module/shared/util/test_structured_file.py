@@ -0,0 +1,49 @@
+"""
+Unit tests for iter_json_values
+
+Run with: pytest app/module/shared/util/test_structured_file.py -v
+"""
+
+import io
+import json
+
+import pytest
+from .structured_file import iter_json_values
+
+
+def parse(text, chunk_size):
+    return list(iter_json_values(io.StringIO(text), chunk_size=chunk_size))
+
+
+ARRAY_TEXT = json.dumps(
+    [{"instruction": "问题", "output": "回答" * 20}, 12345, -1.5e3, "a,]b", [1, [2]], {}, True, None],
+    ensure_ascii=False,
+    indent=2,
+)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1024 * 1024])
+def test_array_elements_across_chunk_boundaries(chunk_size):
+    """Elements split by any chunk boundary are parsed as a whole"""
+    assert parse(ARRAY_TEXT, chunk_size) == json.loads(ARRAY_TEXT)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 64])
+def test_leading_whitespace_spans_chunks(chunk_size):
+    """Leading whitespace longer than a chunk is skipped before detecting the top-level array"""
+    assert parse("  \n\t [ ] ", chunk_size) == []
+    assert parse("      [1, 2]", chunk_size) == [1, 2]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4, 1024])
+def test_non_array_top_level_value(chunk_size):
+    """A top-level object is returned as a single value"""
+    assert parse('   {"a": [1, 2]}  ', chunk_size) == [{"a": [1, 2]}]
+
+
+@pytest.mark.parametrize("text", ["[1,,2]", "[,1]", "[1,]", "[ , ]", "[1 2]", "[1]x", "[1", "[1,", ""])
+@pytest.mark.parametrize("chunk_size", [1, 2, 1024])
+def test_malformed_array_raises(text, chunk_size):
+    """Missing elements, missing commas, truncated arrays and trailing data are rejected"""
+    with pytest.raises(ValueError):
+        parse(text, chunk_size)
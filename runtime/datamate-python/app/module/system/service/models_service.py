@@ -6,7 +6,7 @@ from fastapi import Depends, HTTPException
 from sqlalchemy import select, func, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.module.shared.llm import LLMFactory
+from app.module.shared.llm import LLMFactory, OpenAIClientRegistry
 from app.core.logging import get_logger
 from app.db.datascope import DataScopeHandle, SYSTEM_USER
 from app.db.models.models import Models
@@ -104,6 +104,21 @@ class ModelsService:
             raise HTTPException(status_code=404, detail="模型配置不存在")
         return _orm_to_response(r)
 
+    async def _release_client(self, base_url: str | None, api_key: str | None, model_name: str) -> None:
+        """没有未删除的模型配置使用该 (base_url, api_key, model) 时，从客户端注册表中移除并关闭对应客户端。"""
+        in_use = (
+            await self.db.execute(
+                select(func.count()).select_from(Models).where(
+                    (Models.is_deleted == False) | (Models.is_deleted.is_(None)),
+                    Models.model_name == model_name,
+                    func.coalesce(Models.base_url, "") == (base_url or ""),
+                    func.coalesce(Models.api_key, "") == (api_key or ""),
+                )
+            )
+        ).scalar_one()
+        if not in_use:
+            await OpenAIClientRegistry.evict(base_url, api_key, model_name)
+
     async def create_model(self, req: CreateModelRequest) -> ModelsResponse:
         """创建模型：健康检查后 saveAndSetDefault；isEnabled 恒为 True。
         若 uk_model_provider 已存在且 is_deleted=True，则恢复并更新相关字段。"""
@@ -111,6 +126,7 @@ class ModelsService:
             LLMFactory.check_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
         except Exception as e:
             logger.error("Model health check failed: model=%s type=%s err=%s", req.modelName, req.type, e)
+            await self._release_client(req.baseUrl, req.apiKey, req.modelName)
             raise HTTPException(status_code=400, detail="模型健康检查失败") from e
 
         # 检查 uk_model_provider (model_name, provider, created_by) 是否存在且已删除
@@ -209,8 +225,10 @@ class ModelsService:
             LLMFactory.check_health(req.modelName, req.baseUrl, req.apiKey, req.type.value)
         except Exception as e:
             logger.error("Model health check failed: model=%s type=%s err=%s", req.modelName, req.type, e)
+            await self._release_client(req.baseUrl, req.apiKey, req.modelName)
             raise HTTPException(status_code=400, detail="模型健康检查失败") from e
 
+        old_client_key = (entity.base_url, entity.api_key, entity.model_name)
         entity.model_name = req.modelName
         entity.provider = req.provider
         entity.base_url = req.baseUrl
@@ -230,6 +248,8 @@ class ModelsService:
 
         await self.db.commit()
         await self.db.refresh(entity)
+        if old_client_key != (entity.base_url, entity.api_key, entity.model_name):
+            await self._release_client(*old_client_key)
         return _orm_to_response(entity)
 
     async def delete_model(self, model_id: str) -> None:
@@ -247,3 +267,4 @@ class ModelsService:
         entity.updated_at = datetime.now(timezone.utc).replace(tzinfo=None)
         await self.db.commit()
         await self.db.refresh(entity)
+        await self._release_client(entity.base_url, entity.api_key, entity.model_name)
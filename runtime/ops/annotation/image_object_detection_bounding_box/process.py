@@ -8,7 +8,7 @@ Create: 2025/12/17
 import os
 import json
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 import cv2
 import numpy as np
 from loguru import logger
@@ -94,32 +94,55 @@ class ImageObjectDetectionBoundingBox(Mapper):
                    f"target_classes: {self._target_classes}")
 
     @staticmethod
-    def _get_color_by_class_id(class_id: int):
-        """根据 class_id 生成稳定颜色（BGR，OpenCV 用）"""
-        np.random.seed(class_id)
-        color = np.random.randint(0, 255, size=3).tolist()
-        return tuple(color)
-
-    def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
-        """执行目标检测"""
-        start = time.time()
-        
-        # 读取图像文件
-        image_path = sample.get(self.image_key)
+    def load_image(image_path: str) -> Optional[np.ndarray]:
+        """读取并解码图像，文件不存在或无法解码时返回 None"""
         if not image_path or not os.path.exists(image_path):
             logger.warning(f"Image file not found: {image_path}")
-            return sample
-        
-        # 读取图像
+            return None
         img = cv2.imread(image_path)
         if img is None:
             logger.warning(f"Failed to read image: {image_path}")
-            return sample
-        
-        # 执行目标检测
-        results = self.model(img, conf=self._conf_threshold)
-        r = results[0]
-        
+        return img
+
+    def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """执行目标检测"""
+        image_path = sample.get(self.image_key)
+        return self.detect_batch([sample], [self.load_image(image_path)])[0]
+
+    def execute_batch(self, samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量执行目标检测，一次模型调用处理整批图像"""
+        images = [self.load_image(sample.get(self.image_key)) for sample in samples]
+        return self.detect_batch(samples, images)
+
+    def detect_batch(self, samples: List[Dict[str, Any]], images: List[Optional[np.ndarray]]) -> List[Dict[str, Any]]:
+        """
+        对已解码的图像执行批量目标检测
+
+        Args:
+            samples: 样本列表
+            images: 与样本一一对应的已解码图像，解码失败的位置为 None
+        Returns:
+            与输入一一对应的样本列表，解码失败的样本原样返回
+        """
+        start = time.time()
+        valid = [i for i, img in enumerate(images) if img is not None]
+        if not valid:
+            return samples
+
+        # 执行目标检测，整批图像一次送入模型
+        results = self.model([images[i] for i in valid], conf=self._conf_threshold)
+        for i, r in zip(valid, results):
+            self._save_annotations(samples[i], images[i], r)
+
+        logger.info(f"Batch of {len(samples)} images, "
+                    f"Detections: {sum(samples[i].get('detection_count', 0) for i in valid)}, "
+                    f"Time: {(time.time() - start):.4f}s")
+        return samples
+
+    def _save_annotations(self, sample: Dict[str, Any], img: np.ndarray, r) -> None:
+        """根据单张图像的检测结果生成并保存标注 JSON"""
+        image_path = sample.get(self.image_key)
+
         # 准备标注数据
         h, w = img.shape[:2]
         annotations = {
@@ -153,26 +176,6 @@ class ImageObjectDetectionBoundingBox(Mapper):
                     "bbox_xyxy": [x1, y1, x2, y2],
                     "bbox_xywh": [x1, y1, x2 - x1, y2 - y1]
                 })
-                
-                # 在图像上绘制
-                color = self._get_color_by_class_id(cls_id)
-                cv2.rectangle(
-                    img,
-                    (int(x1), int(y1)),
-                    (int(x2), int(y2)),
-                    color,
-                    2
-                )
-                
-                cv2.putText(
-                    img,
-                    f"{label} {conf:.2f}",
-                    (int(x1), max(int(y1) - 5, 10)),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.5,
-                    color,
-                    1
-                )
         
         # 确定输出目录
         if self._output_dir and os.path.exists(self._output_dir):
@@ -200,9 +203,3 @@ class ImageObjectDetectionBoundingBox(Mapper):
         sample["output_image"] = image_path
         sample["annotations_file"] = json_path
         sample["annotations"] = annotations
-        
-        logger.info(f"Image: {os.path.basename(image_path)}, "
-                   f"Detections: {len(annotations['detections'])}, "
-                   f"Time: {(time.time() - start):.4f}s")
-        
-        return sample
@@ -6,7 +6,10 @@ Description:
     2.感知哈希算法则是从图像的整体结构和特征维度来计算图片的相似度。
     3.ORB算法可以用来对图像中的关键点快速创建特征向量，这些特征向量可以用来识别图像中的对象。通过比较两张图片的特征向量计算相似度。
     4.感知哈希算法和ORB算法计算相似度高于0.75，则选择二者较大值；若低于0.75，则选择二者最小值作为相似度
-    5.将文件特征数据存到数据库。根据任务uuid获取历史文件特征，遍历特征并进行去重比较
+    5.将文件特征数据存到数据库，同一任务的图片特征同时保存在共享的相似图片索引中。
+    6.通过向量化的汉明距离计算筛选pHash最相似的候选图片，仅对候选图片计算ORB相似度；
+      pHash差异大但ORB相似的图片可能不在候选图片中，候选图片数量设为0时与全部历史图片比较
+    7.候选图片查询与新图片加入在共享索引中原子完成，并发处理的相似图片不会同时被保留
 Create: 2025/1/7
 """
 import json
@@ -17,14 +20,17 @@ from typing import List, Dict, Any
 
 import cv2
 import numpy as np
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 from loguru import logger
 
 from datamate.sql_manager.sql_manager import SQLManager
 from datamate.common.utils import get_now_time
 from datamate.common.utils import bytes_to_numpy
+from datamate.common.utils.shared_actor import SharedActor
 from datamate.core.base_op import Filter
 
+from .similarity_index import ImageSimilarityIndex, decode_des_matrix, pack_p_hash
+
 MAX_RETRIES = 5
 BASE_DELAY = 1
 MAX_DELAY = 30  # 最大延时设置为30秒
@@ -52,19 +58,22 @@ class ImgSimilarImagesCleaner(Filter):
     DEFAULT_ORB_RATIO = 0.8  # 默认特征点距离比率
     DEFAULT_MIX_SIMILARITY = 0.75  # 默认相似度算法阈值
     DEFAULT_IMG_RESIZE = 200  # 默认图片压缩尺寸
-    DEFAULT_PAGE_SIZE = 500  # 默认每页数据量
+    DEFAULT_CANDIDATE_NUM = 32  # 默认参与ORB比较的候选图片数量
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.similar_threshold = kwargs.get("similarThreshold", self.DEFAULT_SIMILAR_THRESHOLD)  # 默认相似度阈值为0.8
         # task_uuid为标识该数据集的唯一标志
         self.task_uuid = kwargs.get("uuid", "")
+        # 任务实例ID，共享索引的名称按任务实例区分
+        self.instance_id = None
         self.orb_ratio = self.DEFAULT_ORB_RATIO  # 特征点距离的比率，该数值为经验值
         self.mix_similarity = self.DEFAULT_MIX_SIMILARITY  # 选择相似度算法的阈值，该数值为经验值
         self.img_resize = self.DEFAULT_IMG_RESIZE  # 图片压缩尺寸
-        self.conn = None  # 数据库连接
-        self.trans = None  # 数据库事务
-        self.page_size = self.DEFAULT_PAGE_SIZE  # 每页数据量
+        # 按pHash相似度筛选出的候选图片数量，不大于0时与全部历史图片比较
+        self.candidate_num = int(kwargs.get("candidateNum", self.DEFAULT_CANDIDATE_NUM))
+        self.matcher = cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False)  # 复用ORB特征匹配器
+        self.similarity_index = None  # 任务共享的相似图片索引
         # 获取数据库sql
         self.sql_dict = self.load_sql_dict()
 
@@ -126,8 +135,7 @@ class ImgSimilarImagesCleaner(Filter):
 
         try:
             # knn筛选结果
-            matches = (cv2.BFMatcher(cv2.NORM_HAMMING, crossCheck=False).
-                       knnMatch(query_matrix, trainDescriptors=train_matrix, k=2))
+            matches = self.matcher.knnMatch(query_matrix, trainDescriptors=train_matrix, k=2)
             if not matches:
                 return 0.0
             # 遍历每一对特征点，筛选距离更近的特征点
@@ -142,83 +150,88 @@ class ImgSimilarImagesCleaner(Filter):
                              f"{file_name} and {file_name_history}: {e}")
             return 0.0
 
+    def get_similarity_index(self) -> SharedActor:
+        """获取该任务共享的相似图片索引"""
+        if self.similarity_index is None:
+            self.similarity_index = SharedActor.for_task(self.instance_id, ImageSimilarityIndex,
+                                                         f"img_similarity_{self.task_uuid}",
+                                                         self.task_uuid, self.sql_dict)
+        return self.similarity_index
+
+    def load_des_matrices(self, candidates: List) -> List:
+        """从数据库中补齐索引未缓存的候选图片ORB描述符矩阵"""
+        missing = {file_name.encode("utf-8").hex() for file_name, _, des_matrix in candidates if des_matrix is None}
+        if not missing:
+            return candidates
+        query_sql = text(str(self.sql_dict.get("query_des_matrix_sql"))).bindparams(
+            bindparam("file_names", expanding=True))
+        with SQLManager.create_connect() as connection:
+            rows = connection.execute(query_sql, {"task_uuid": self.task_uuid, "file_names": list(missing)})
+            des_matrices = {file_name_hex: decode_des_matrix(des_matrix_binary, matrix_shape)
+                            for des_matrix_binary, matrix_shape, file_name_hex in rows}
+        return [(file_name, phash_similarity,
+                 des_matrix if des_matrix is not None
+                 else des_matrices.get(file_name.encode("utf-8").hex(), np.array([])))
+                for file_name, phash_similarity, des_matrix in candidates]
+
     def execute_sql(self, p_hash: str, des_matrix: np.ndarray, file_name: str,
                     img: np.ndarray) -> np.ndarray:
-        des_matrix_binary = zlib.compress(des_matrix.tobytes())  # 使用 zlib 进行压缩数组
+        """从相似图片索引中获取候选图片、比较相似度，插入新的文件特征"""
         timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', file_name,
                                  "ImgSimilarCleaner")
-        query_task_uuid_sql = str(self.sql_dict.get("query_task_uuid_sql"))
-        insert_sql = str(self.sql_dict.get("insert_sql"))
-        create_tables_sql = str(self.sql_dict.get("create_tables_sql"))
+        if p_hash:
+            packed_p_hash = pack_p_hash(p_hash)
+            checked = 0
+            while True:
+                try:
+                    # 查询与加入在共享索引中原子完成，期间新加入的候选图片会在下一轮返回
+                    candidates, checked = self.get_similarity_index().call(
+                        "query_and_insert", file_name, packed_p_hash, des_matrix, self.candidate_num, checked)
+                    candidates = self.load_des_matrices(candidates)
+                except Exception as e:
+                    logger.error(f"fileName: {file_name}, query image similarity index failed: {str(e)}")
+                    raise RuntimeError(82000, str(e)) from None
+                if not candidates:
+                    break
+                if self.determine_similar_images(candidates, des_matrix, file_name):
+                    return np.array([])
 
-        db_manager = SQLManager()
+        insert_data = {
+            "task_uuid": self.task_uuid,
+            "p_hash": p_hash,
+            "des_matrix": zlib.compress(des_matrix.tobytes()),  # 使用 zlib 进行压缩数组
+            "matrix_shape": str(des_matrix.shape),
+            "file_name": file_name.encode("utf-8").hex(),
+            "timestamp": timestamp
+        }
         try:
-            self.conn = db_manager.create_connect()
+            with SQLManager.create_connect() as connection:
+                connection.execute(text(str(self.sql_dict.get("insert_sql"))), insert_data)
         except Exception as e:
             logger.error(f"fileName: {file_name}, database connection failed: {str(e)}")
             raise RuntimeError(82000, str(e)) from None
-
-        with self.conn as connection:
-            """从数据库中获取文件特征、比较相似度，插入新的文件特征"""
-            connection.execute(text(create_tables_sql))
-            result = connection.execute(text(query_task_uuid_sql), {"task_uuid": self.task_uuid}).fetchall()
-            total_count = len(result)
-            if self.has_similar_images(connection, des_matrix, file_name, p_hash, total_count):
-                    return np.array([])
-
-            insert_data = {
-                "task_uuid": self.task_uuid,
-                "p_hash": p_hash,
-                "des_matrix": des_matrix_binary,
-                "matrix_shape": str(des_matrix.shape),
-                "file_name": file_name.encode("utf-8").hex(),
-                "timestamp": timestamp
-            }
-            connection.execute(text(insert_sql),insert_data)
         return img
 
-    def has_similar_images(self, connection, des_matrix, file_name, p_hash, total_count):
-        for i in range(0, total_count, self.page_size):
-            query_sql = self.sql_dict.get("query_sql")
-            rows = connection.execute(text(query_sql), {"task_uuid": self.task_uuid, "ge": self.page_size, "le": i}).fetchall()
-            # 对应任务uuid，最后一页没有数据，跳出循环
-            if not rows:
-                break            # 对两张图片进行相似度比较
-            if self.determine_similar_images(rows, p_hash, des_matrix, file_name):
-                return True
-        return False
-
-    def determine_similar_images(self, file_features: List, p_hash: str, des_matrix: np.ndarray,
-                                 file_name: str) -> bool:
-        """根据文件特征，判断两张图片相似度是否超过指定阈值"""
-        for signature in file_features:
-            pash_feature, orb_feature, matrix_shape, file_name_history = signature[2], signature[3], signature[4], \
-                signature[5]
-            if not pash_feature:
-                # 若图片为空，p_hash、des_matrix为空，跳过比对
-                continue
-            # 解压缩数据
-            decompressed_data = zlib.decompress(orb_feature)
-            # 将字节流转换回矩阵
-            des_matrix_history = np.frombuffer(decompressed_data, dtype=np.uint8).reshape(eval(matrix_shape))
-            # 移除转义字符 '\' 并将十六进制字符串转换为字节序列
-            bytes_data = bytes.fromhex(file_name_history)
-            # 解码字节序列为 UTF-8 编码的字符串
-            file_name_decoded = bytes_data.decode('utf-8')
-
-            phash_similarity = self.get_phash_similarity(p_hash, pash_feature)
-            orb_similarity = self.get_orb_similarity(des_matrix, des_matrix_history, file_name, file_name_decoded)
-            max_similarity = max(phash_similarity, orb_similarity)
-            min_similarity = min(phash_similarity, orb_similarity)
-            if max_similarity >= self.mix_similarity:
-                result = max_similarity
+    def determine_similar_images(self, candidates: List, des_matrix: np.ndarray, file_name: str) -> bool:
+        """根据候选图片的pHash相似度与ORB相似度，判断两张图片相似度是否超过指定阈值"""
+        for file_name_history, phash_similarity, des_matrix_history in candidates:
+            # pHash相似度已超过阈值时，无需再计算ORB相似度
+            if phash_similarity >= self.mix_similarity and round(phash_similarity, 2) >= self.similar_threshold:
+                similarity = round(phash_similarity, 2)
             else:
-                result = min_similarity
-            similarity = round(result, 2)
+                orb_similarity = self.get_orb_similarity(des_matrix, des_matrix_history, file_name,
+                                                         file_name_history)
+                max_similarity = max(phash_similarity, orb_similarity)
+                min_similarity = min(phash_similarity, orb_similarity)
+                if max_similarity >= self.mix_similarity:
+                    result = max_similarity
+                else:
+                    result = min_similarity
+                similarity = round(result, 2)
             if similarity >= self.similar_threshold:
                 logger.info(
                     f"fileName: {file_name}, method: ImgSimilarCleaner, dataset: {self.task_uuid}. "
-                    f"This picture is similar to {file_name_decoded}, "
+                    f"This picture is similar to {file_name_history}, "
                     f"and the similarity is {similarity:.4f}. The picture is filtered."
                 )
                 return True
@@ -230,7 +243,8 @@ class ImgSimilarImagesCleaner(Filter):
         self.read_file_first(sample)
         file_name = sample[self.filename_key]
         img_bytes = sample[self.data_key]
-        self.task_uuid = sample.get("instance_id") if not self.task_uuid else self.task_uuid
+        self.instance_id = sample.get("instance_id")
+        self.task_uuid = self.instance_id if not self.task_uuid else self.task_uuid
         data = bytes_to_numpy(img_bytes) if img_bytes else np.array([])
         similar_images = self.filter_similar_images(data, file_name)
         # 若相似图片，sample[self.data_key]设为空
@@ -0,0 +1,120 @@
+# -- encoding: utf-8 --
+
+"""
+Description:
+    任务级相似图片索引。
+    1.pHash以64位整数的形式保存在NumPy数组中，一次向量化的异或与popcount即可得到与全部历史图片的汉明距离。
+    2.按pHash相似度排序筛选候选图片，仅对候选图片返回ORB描述符矩阵，供算子计算ORB相似度；
+      候选图片数量不大于0时按序号分页返回全部历史图片，与逐张比较的结果一致。
+    3.索引只缓存最近加入图片的ORB描述符矩阵，更早图片的描述符矩阵由算子按需从数据库读取。
+Create: 2025/12/01
+"""
+import re
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import text
+
+from datamate.sql_manager.sql_manager import SQLManager
+
+P_HASH_BITS = 64
+INITIAL_CAPACITY = 1024
+# 预热时每次从数据库拉取的行数
+FETCH_SIZE = 1000
+# 索引中缓存ORB描述符矩阵的图片数量上限，单张图片的描述符矩阵约6KB
+MAX_CACHED_DESCRIPTORS = 10000
+# 全量比较时每次返回的历史图片数量
+SCAN_PAGE_SIZE = 256
+
+
+def pack_p_hash(p_hash: str) -> int:
+    """'0'/'1'字符串形式的pHash转为64位整数"""
+    return int(p_hash, 2)
+
+
+def decode_des_matrix(des_matrix_binary: bytes, matrix_shape: str) -> np.ndarray:
+    """解压数据库中保存的ORB描述符矩阵"""
+    shape = tuple(int(dim) for dim in re.findall(r"\d+", matrix_shape))
+    return np.frombuffer(zlib.decompress(des_matrix_binary), dtype=np.uint8).reshape(shape)
+
+
+class ImageSimilarityIndex:
+    """相似图片索引
+
+    同一任务的所有算子实例共享一个索引，索引创建时从数据库恢复该任务已保存的图片特征。
+    ORB描述符矩阵只缓存最近加入的MAX_CACHED_DESCRIPTORS张图片，查询结果中未缓存的描述符矩阵为None。
+    """
+
+    def __init__(self, task_uuid: str, sql_dict: Dict[str, str]):
+        self.task_uuid = task_uuid
+        self.p_hashes = np.empty(INITIAL_CAPACITY, dtype=np.uint64)
+        # 图片在索引中的序号 -> ORB描述符矩阵
+        self.des_matrices: Dict[int, np.ndarray] = {}
+        self.file_names: List[str] = []
+        self.load_features(sql_dict)
+
+    def load_features(self, sql_dict: Dict[str, str]):
+        """从数据库中恢复该任务已保存的图片特征"""
+        with SQLManager.create_connect() as connection:
+            connection.execute(text(sql_dict.get("create_tables_sql")))
+            connection.execute(text(sql_dict.get("create_index_sql")))
+            connection.execute(text(sql_dict.get("create_file_name_index_sql")))
+            result = connection.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(
+                text(sql_dict.get("query_sql")), {"task_uuid": self.task_uuid})
+            for p_hash, des_matrix_binary, matrix_shape, file_name_hex in result:
+                # 若图片为空，p_hash、des_matrix为空，不加入索引
+                if not p_hash:
+                    continue
+                self.add(bytes.fromhex(file_name_hex).decode('utf-8'), pack_p_hash(p_hash),
+                         decode_des_matrix(des_matrix_binary, matrix_shape))
+        logger.info(f"taskId: {self.task_uuid}, image similarity index loaded {self.size()} image features.")
+
+    def add(self, file_name: str, p_hash: int, des_matrix: np.ndarray):
+        count = self.size()
+        if count == len(self.p_hashes):
+            self.p_hashes = np.concatenate([self.p_hashes, np.empty(count, dtype=np.uint64)])
+        self.p_hashes[count] = np.uint64(p_hash)
+        self.des_matrices[count] = des_matrix
+        self.des_matrices.pop(count - MAX_CACHED_DESCRIPTORS, None)
+        self.file_names.append(file_name)
+
+    def query(self, p_hash: int, top_k: int, start: int = 0,
+              end: Optional[int] = None) -> List[Tuple[str, float, Optional[np.ndarray]]]:
+        """返回序号在[start, end)内的历史图片中pHash相似度最高的top_k张，top_k不大于0时返回其中全部图片
+
+        Returns:
+            [(历史文件名, pHash相似度, ORB描述符矩阵), ...]，按pHash相似度降序排列，未缓存的描述符矩阵为None
+        """
+        end = self.size() if end is None else min(end, self.size())
+        if start >= end:
+            return []
+        distances = np.bitwise_count(self.p_hashes[start:end] ^ np.uint64(p_hash))
+        if 0 < top_k < end - start:
+            candidates = np.argpartition(distances, top_k - 1)[:top_k]
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+        else:
+            candidates = np.argsort(distances, kind="stable")
+        return [(self.file_names[start + i], 1 - int(distances[i]) / P_HASH_BITS, self.des_matrices.get(start + i))
+                for i in candidates]
+
+    def query_and_insert(self, file_name: str, p_hash: int, des_matrix: np.ndarray, top_k: int,
+                         checked: int = 0) -> Tuple[List[Tuple[str, float, Optional[np.ndarray]]], int]:
+        """原子地查询候选图片并在没有未比较的候选图片时加入当前图片
+
+        调用方比较完返回的候选图片且均不相似时，以返回的序号作为checked再次调用，
+        只会返回这期间新加入的候选图片，直至没有新的候选图片时当前图片被加入索引。
+        top_k不大于0时每次返回checked之后的SCAN_PAGE_SIZE张图片，逐页比较全部历史图片。
+
+        Returns:
+            (序号不小于checked的候选图片, 已比较到的序号)，候选图片为空表示当前图片已加入索引
+        """
+        end = self.size() if top_k > 0 else min(checked + SCAN_PAGE_SIZE, self.size())
+        candidates = self.query(p_hash, top_k, checked, end)
+        if not candidates:
+            self.add(file_name, p_hash, des_matrix)
+        return candidates, end
+
+    def size(self) -> int:
+        return len(self.file_names)
@@ -0,0 +1,129 @@
+#!/user/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+Description: 任务级MinHash LSH索引，按band分桶召回候选文档后再精确比较签名
+Create: 2025/12/01
+"""
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from loguru import logger
+from sqlalchemy import text
+
+from datamate.sql_manager.sql_manager import SQLManager
+
+NUM_PERM = 128
+# 选择分桶参数时，假阳性与假阴性概率的权重
+FALSE_POSITIVE_WEIGHT = 0.5
+FALSE_NEGATIVE_WEIGHT = 0.5
+# 预热时每次从数据库拉取的行数
+FETCH_SIZE = 5000
+
+
+def signature_to_bytes(hashvalues: np.ndarray) -> bytes:
+    """MinHash签名序列化为二进制"""
+    return np.asarray(hashvalues, dtype=np.uint64).tobytes()
+
+
+def bytes_to_signature(file_signature: Optional[bytes], file_feature: Optional[str]) -> Optional[np.ndarray]:
+    """从数据库行中解析MinHash签名，兼容旧版本以字符串形式保存的签名"""
+    if file_signature:
+        return np.frombuffer(bytes(file_signature), dtype=np.uint64)
+    if file_feature:
+        return np.fromstring(file_feature.strip('[]'), dtype=np.uint64, sep=' ')
+    return None
+
+
+def _integrate(func, lower: float, upper: float, steps: int = 100) -> float:
+    xs = np.linspace(lower, upper, steps + 1)
+    ys = func(xs)
+    return float(np.sum((ys[1:] + ys[:-1]) * (xs[1:] - xs[:-1])) / 2)
+
+
+def optimal_bands(threshold: float, num_perm: int) -> Tuple[int, int]:
+    """根据相似度阈值选择band数量b与每个band的行数r，使加权的假阳性与假阴性概率之和最小"""
+    best_error, best_param = float("inf"), (num_perm, 1)
+    for bands in range(1, num_perm + 1):
+        max_rows = num_perm // bands
+        for rows in range(1, max_rows + 1):
+            false_positive = _integrate(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+            false_negative = _integrate(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+            error = FALSE_POSITIVE_WEIGHT * false_positive + FALSE_NEGATIVE_WEIGHT * false_negative
+            if error < best_error:
+                best_error, best_param = error, (bands, rows)
+    return best_param
+
+
+class MinHashLSHIndex:
+    """相似文档LSH索引
+
+    同一任务的所有算子实例共享一个索引，查询与插入在同一次调用中完成，避免并发插入相似文档。
+    """
+
+    def __init__(self, task_uuid: str, threshold: float, sql_dict: Dict[str, str], num_perm: int = NUM_PERM):
+        self.task_uuid = task_uuid
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self.buckets: List[Dict[bytes, List[str]]] = [defaultdict(list) for _ in range(self.bands)]
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.load_signatures(sql_dict)
+
+    def load_signatures(self, sql_dict: Dict[str, str]):
+        """从数据库中恢复该任务已保存的文件特征"""
+        with SQLManager.create_connect() as connection:
+            connection.execute(text(sql_dict.get("create_tables_sql")))
+            connection.execute(text(sql_dict.get("alter_tables_sql")))
+            connection.execute(text(sql_dict.get("create_index_sql")))
+            result = connection.execution_options(stream_results=True, yield_per=FETCH_SIZE).execute(
+                text(sql_dict.get("query_sql")), {"task_uuid": self.task_uuid})
+            for file_signature, file_feature, file_name_hex in result:
+                hashvalues = bytes_to_signature(file_signature, file_feature)
+                if hashvalues is None or len(hashvalues) != self.num_perm:
+                    continue
+                self.insert(bytes.fromhex(file_name_hex).decode('utf-8'), hashvalues)
+        logger.info(f"taskId: {self.task_uuid}, MinHash LSH index loaded {len(self.signatures)} file features.")
+
+    def insert(self, key: str, hashvalues: np.ndarray):
+        if key in self.signatures:
+            return
+        self.signatures[key] = hashvalues
+        for band, band_key in enumerate(self.band_keys(hashvalues)):
+            self.buckets[band][band_key].append(key)
+
+    def band_keys(self, hashvalues: np.ndarray) -> List[bytes]:
+        return [hashvalues[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def candidates(self, hashvalues: np.ndarray) -> set:
+        """召回至少一个band完全相同的历史文件"""
+        result = set()
+        for band, band_key in enumerate(self.band_keys(hashvalues)):
+            result.update(self.buckets[band].get(band_key, ()))
+        return result
+
+    def query(self, key: str, hashvalues: np.ndarray) -> Tuple[Optional[str], float]:
+        """返回与输入签名相似度最高且不低于阈值的历史文件"""
+        best_key, best_similarity = None, 0.0
+        hashvalues = np.asarray(hashvalues, dtype=np.uint64)
+        candidates = self.signatures.keys() if self.threshold <= 0 else self.candidates(hashvalues)
+        for candidate in candidates:
+            if candidate == key:
+                continue
+            similarity = float(np.count_nonzero(self.signatures[candidate] == hashvalues)) / self.num_perm
+            if similarity >= self.threshold and (best_key is None or similarity > best_similarity):
+                best_key, best_similarity = candidate, similarity
+        return best_key, best_similarity
+
+    def query_and_insert(self, key: str, hashvalues: np.ndarray) -> Tuple[Optional[str], float]:
+        """查询相似文件，不存在相似文件时将当前签名加入索引"""
+        hashvalues = np.asarray(hashvalues, dtype=np.uint64)
+        similar_key, similarity = self.query(key, hashvalues)
+        if similar_key is None:
+            self.insert(key, hashvalues)
+        return similar_key, similarity
+
+    def size(self) -> int:
+        return len(self.signatures)
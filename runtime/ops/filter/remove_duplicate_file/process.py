@@ -10,22 +10,25 @@ import json
 import re
 import time
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import Dict, Any
 
-import numpy as np
 from datasketch import MinHash
 from sqlalchemy import text
 from loguru import logger
 
 from datamate.sql_manager.sql_manager import SQLManager
 from datamate.common.utils import get_now_time
+from datamate.common.utils.shared_actor import SharedActor
 from datamate.core.base_op import Filter
 
+from .minhash_lsh import MinHashLSHIndex, signature_to_bytes
+
 
 class DuplicateFilesFilter(Filter):
     """相似文档去除插件
 
     基于MinHash计算当前文档与数据集中其它文档相似性，相似性高于设定阈值则返回空。
+    同一任务的文档特征保存在共享的LSH索引中，按band分桶召回候选文档，避免与全部历史文档逐一比较。
     """
 
     def __init__(self, *args, **kwargs):
@@ -36,12 +39,10 @@ class DuplicateFilesFilter(Filter):
         self.duplicate_th = kwargs.get("fileDuplicateThreshold", 0.5)
         # task_uuid为标识该数据集的唯一标志
         self.task_uuid = kwargs.get("uuid", "")
-        # 数据库连接
-        self.conn = None
-        # 数据库事务
-        self.trans = None
-        # 每页数据量
-        self.page_size = 500
+        # 任务实例ID，共享索引的名称按任务实例区分
+        self.instance_id = None
+        # 任务共享的MinHash LSH索引
+        self.lsh_index = None
         # 获取数据库sql
         self.sql_dict = self.load_sql_dict()
 
@@ -82,77 +83,49 @@ class DuplicateFilesFilter(Filter):
         text_minhash = self.get_minhash(input_text)
         return self.execute_sql(text_minhash, file_name, input_text)
 
+    def get_lsh_index(self) -> SharedActor:
+        """获取该任务共享的MinHash LSH索引"""
+        if self.lsh_index is None:
+            self.lsh_index = SharedActor.for_task(self.instance_id, MinHashLSHIndex, f"minhash_lsh_{self.task_uuid}",
+                                                  self.task_uuid, self.duplicate_th, self.sql_dict)
+        return self.lsh_index
+
     def execute_sql(self, text_minhash: MinHash, file_name: str,
                     input_text: str) -> str:
-        """从数据库中获取文件特征、比较相似度，插入新的文件特征"""
+        """通过LSH索引比较相似度，插入新的文件特征"""
         timestamp = get_now_time('Asia/Shanghai', '%Y-%m-%d %H:%M:%S', file_name,
                                  "DuplicateFilesFilter")
         minhash_values = text_minhash.hashvalues
-        # 将 NumPy 数组转换为字符串
-        minhash_values_string = np.array2string(minhash_values)
-        query_task_uuid_sql = self.sql_dict.get("query_task_uuid_sql")
-        insert_sql = self.sql_dict.get("insert_sql")
-        create_tables_sql = self.sql_dict.get("create_tables_sql")
-        db_manager = SQLManager()
         try:
-            self.conn = db_manager.create_connect()
+            similar_file, similarity = self.get_lsh_index().call("query_and_insert", file_name, minhash_values)
+        except Exception as e:
+            logger.error(f"fileName: {file_name}, query MinHash LSH index failed: {str(e)}")
+            raise RuntimeError(82000, str(e)) from None
+        if similar_file is not None:
+            logger.info(f"taskId: {self.task_uuid}, fileName: {file_name} is similar to {similar_file}, "
+                        f"and the similarity is {similarity:4f}")
+            return ""
+
+        insert_data = {
+            "task_uuid": self.task_uuid,
+            "file_signature": signature_to_bytes(minhash_values),
+            "file_name": file_name.encode("utf-8").hex(),
+            "timestamp": timestamp
+        }
+        try:
+            with SQLManager.create_connect() as connection:
+                connection.execute(text(self.sql_dict.get("insert_sql")), insert_data)
         except Exception as e:
             logger.error(f"fileName: {file_name}, database connection failed: {str(e)}")
             raise RuntimeError(82000, str(e)) from None
-        with self.conn as connection:
-            connection.execute(text(create_tables_sql))
-            result = connection.execute(text(query_task_uuid_sql), {"task_uuid": self.task_uuid}).fetchall()
-            total_count = len(result)
-            if self.has_similar_text(connection, file_name, text_minhash, total_count):
-                return ""
-            insert_data = {
-                "task_uuid": self.task_uuid,
-                "file_feature": minhash_values_string,
-                "file_name": file_name.encode("utf-8").hex(),
-                "timestamp": timestamp
-            }
-            connection.execute(text(insert_sql), insert_data)
         return input_text
 
-    def has_similar_text(self, connection, file_name, text_minhash, total_count) -> bool:
-        query_sql = self.sql_dict.get("query_sql")
-        for i in range(0, total_count, self.page_size):
-            rows = connection.execute(
-                text(query_sql), {"task_uuid": self.task_uuid, "file_name": file_name, "ge": self.page_size, "le": i}).fetchall()
-            # 对应任务uuid，最后一页没有数据，跳出循环
-            if not rows:
-                break
-            # 对两个文本进行相似度比较
-            if self.determine_similar_text(rows, text_minhash, file_name):
-                return True
-        return False
-
-    def determine_similar_text(self, file_features: List, text_minhash: MinHash, file_name: str) -> bool:
-        for signature in file_features:
-            # 历史文件特征和历史文件名称
-            file_feature, file_name_history = signature[2], signature[3]
-            if not file_feature:
-                continue
-            minhash_obj = MinHash(num_perm=128)
-            minhash_obj.hashvalues = np.fromstring(file_feature.strip('[]'), dtype=np.uint64, sep=' ')
-            similarity = text_minhash.jaccard(minhash_obj)
-
-            # 移除转义字符 '\' 并将十六进制字符串转换为字节序列
-            bytes_data = bytes.fromhex(file_name_history)
-            # 解码字节序列为 UTF-8 编码的字符串
-            file_name_decoded = bytes_data.decode('utf-8')
-
-            if similarity >= self.duplicate_th:
-                logger.info(f"taskId: {self.task_uuid}, fileName: {file_name} is similar to {file_name_decoded}, "
-                            f"and the similarity is {similarity:4f}")
-                return True
-        return False
-
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
         self.read_file_first(sample)
         file_name = sample[self.filename_key]
-        self.task_uuid = sample.get("instance_id") if not self.task_uuid else self.task_uuid
+        self.instance_id = sample.get("instance_id")
+        self.task_uuid = self.instance_id if not self.task_uuid else self.task_uuid
         sample[self.text_key] = self.deduplicate_files(sample, file_name)
         logger.info(f"taskId: {self.task_uuid} fileName: {file_name}, "
                     f"method: DuplicateFilesFilter costs {(time.time() - start):6f} s")
@@ -5,7 +5,6 @@
 Description: 过滤语言概率太低的文档（支持自定义阈值）
 Create: 2023/12/7 15:43
 """
-import sys
 import time
 from pathlib import Path
 from typing import Dict, Any
@@ -13,53 +12,7 @@ from typing import Dict, Any
 from loguru import logger
 
 from datamate.core.base_op import Filter
-from datamate.common.utils.aho_corasick import build_trie, add_fail_pointer
-
-sys.setrecursionlimit(5000)
-
-
-class AhoCorasic:
-    """AC自动机算法进行目标字符串搜索"""
-
-    def __init__(self, words):
-        self._root = add_fail_pointer(build_trie(words))
-
-    def search_and_count(self, text: str, special_symbols: set):
-        """
-        匹配敏感词，统计敏感词字数。
-
-        Args:
-            text: 文本
-            special_symbols: 特殊字符（需跳过）
-        Returns:
-            统计敏感词字数
-        """
-        target_count = 0
-        node = self._root
-
-        valid_len = 0  # 当前遍历的有效长度
-        for _, s in enumerate(text):
-            if s in special_symbols:  # 跳过特殊字符
-                continue
-
-            matched = True
-            while s not in node.child:  # 当node.child没有字符s
-                if node == self._root:  # 当node为root（无node.fail），有效长度归0且跳出
-                    valid_len = 0
-                    matched = False
-                    break
-                elif node.fail == self._root:  # node.fail为root场景，有效长度归0，但可继续
-                    valid_len = 0
-                node = node.fail  # 移动到失败指针节点
-            if not matched:
-                continue
-
-            node = node.child.get(s)
-            valid_len += 1
-            if node.word:  # node是单词尾字母
-                target_count += valid_len
-                valid_len = 0
-        return target_count
+from datamate.common.utils.aho_corasick import CompiledAhoCorasick
 
 
 class FileWithManySensitiveWordsFilter(Filter):
@@ -79,7 +32,7 @@ class FileWithManySensitiveWordsFilter(Filter):
         self.special_symbols = self.load_words_list(special_symbols_path)
         self.symbols = self.special_symbols | {"\n", "\t", "\r"}  # 符号，不纳入文本字数统计
         self.words = self.violent_words | self.sexual_words | self.political_words
-        self.ac_automaton = AhoCorasic(self.words)
+        self.ac_automaton = CompiledAhoCorasick.get_or_build(self.words, self.special_symbols)
 
     @staticmethod
     def load_words_list(path):
@@ -107,7 +60,7 @@ class FileWithManySensitiveWordsFilter(Filter):
             return input_data
 
         # 敏感词率 = 敏感词字数 / 总字数，符号不纳入统计
-        sensitive_rate = self.ac_automaton.search_and_count(input_data, self.special_symbols) / total_count
+        sensitive_rate = self.ac_automaton.count(input_data) / total_count
         if sensitive_rate >= self._file_sensitive_words_rate:
             logger.info(f"This document contains too many sensitive words. "
                         f"The proportion of sensitive words is {sensitive_rate}. "
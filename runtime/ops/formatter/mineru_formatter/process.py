@@ -9,10 +9,11 @@ import asyncio
 import glob
 import os
 import shutil
+import threading
 import time
 import uuid
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 
 from datamate.core.base_op import Mapper, FileExporter
 from datamate.sql_manager.persistence_atction import TaskInfoPersistence
@@ -21,10 +22,17 @@ from mineru.cli.common import aio_do_parse, read_fn
 from mineru.cli.fast_api import get_infer_result
 from pypdf import PdfReader
 
+# 每次请求 MinerU 解析的页数
+PAGE_WINDOW_SIZE = 10
+
 
 class MineruFormatter(Mapper):
     """基于外部API，抽取PDF中的文本"""
 
+    # 进程内共享的事件循环，在后台线程中常驻，避免每个文件都新建事件循环
+    _loop: Optional[asyncio.AbstractEventLoop] = None
+    _loop_lock = threading.Lock()
+
     def __init__(self, *args, **kwargs):
         super(MineruFormatter, self).__init__(*args, **kwargs)
         self.server_url = kwargs.get("mineruApi", "http://datamate-mineru:8000")
@@ -32,6 +40,17 @@ class MineruFormatter(Mapper):
         self.output_dir = "/dataset/outputs"
         self.max_retries = 3
         self.target_type = kwargs.get("exportType", "md")
+        self.concurrency = max(int(kwargs.get("concurrency", 4)), 1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @classmethod
+    def _get_loop(cls) -> asyncio.AbstractEventLoop:
+        with cls._loop_lock:
+            if cls._loop is None or cls._loop.is_closed():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="mineru-event-loop", daemon=True).start()
+                cls._loop = loop
+            return cls._loop
 
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
@@ -39,7 +58,8 @@ class MineruFormatter(Mapper):
         if not filename.lower().endswith((".png", ".jpeg", ".jpg", ".webp", ".gif", ".pdf")):
             return sample
         try:
-            sample[self.text_key] = asyncio.run(self.async_process_file(sample))
+            future = asyncio.run_coroutine_threadsafe(self.async_process_file(sample), self._get_loop())
+            sample[self.text_key] = future.result()
             sample[self.target_type_key] = self.target_type
             logger.info(
                 f"fileName: {filename}, method: MineruFormatter costs {(time.time() - start):6f} s")
@@ -49,31 +69,64 @@ class MineruFormatter(Mapper):
         return sample
 
     async def async_process_file(self, sample):
+        """按页窗口并发解析，结果按页序拼接，图片在全部窗口完成后统一登记"""
         filename = sample[self.filename_key]
         filename_without_ext = os.path.splitext(filename)[0]
         filepath = sample[self.filepath_key]
-        parse_dir = os.path.join(self.output_dir, filename_without_ext, "vlm")
+        # 每个文件使用独立的工作目录，各页窗口再分别输出到子目录，避免并发时互相覆盖
+        work_dir = os.path.join(self.output_dir, f"{filename_without_ext}_{uuid.uuid4().hex}")
         pdf_bytes = read_fn(filepath)
         total_page = len(PdfReader(filepath).pages)
-        content = ""
-        for page in range(0, total_page, 10):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+
+        tasks = [
+            asyncio.create_task(self.parse_window(filename, pdf_bytes, work_dir, page, total_page))
+            for page in range(0, total_page, PAGE_WINDOW_SIZE)
+        ]
+        try:
+            if tasks:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+                for task in done:
+                    # 任一窗口失败时抛出其异常，其余窗口在finally中取消
+                    task.result()
+            results = [task.result() for task in tasks]
+            content = "".join(window_content for window_content, _ in results)
+            image_paths = [image_path for _, window_images in results for image_path in window_images]
+            if image_paths:
+                export_path = os.path.abspath(sample[self.export_path_key]) + "/images"
+                await asyncio.to_thread(self.save_images, image_paths, sample["dataset_id"], export_path)
+        finally:
+            # 取消尚未完成的窗口并等待其退出，再删除工作目录，避免删除时仍有窗口在写入
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await asyncio.to_thread(shutil.rmtree, work_dir, True)
+        return content
+
+    async def parse_window(self, filename, pdf_bytes, work_dir, page, total_page) -> Tuple[str, List[str]]:
+        """解析单个页窗口，返回该窗口的文本与抽取出的图片路径"""
+        filename_without_ext = os.path.splitext(filename)[0]
+        end_page = min(page + PAGE_WINDOW_SIZE - 1, total_page - 1)
+        window_dir = os.path.join(work_dir, str(page))
+        async with self._semaphore:
             logger.info(f"fileName: {filename}, total_page: {total_page}, page: {page}.")
             for attempt in range(self.max_retries):
                 try:
                     await aio_do_parse(
-                        output_dir=self.output_dir,
+                        output_dir=window_dir,
                         pdf_file_names=[filename_without_ext],
                         pdf_bytes_list=[pdf_bytes],
                         p_lang_list=["ch"],
                         backend=self.backend,
                         server_url=self.server_url,
                         start_page_id=page,
-                        end_page_id=min(page + 9, total_page - 1),
+                        end_page_id=end_page,
                     )
                     break  # 成功则跳出重试循环
                 except Exception as e:
                     logger.warning(
-                        f"Extract {filename} [{page}-{page + 9}] failed (attempt {attempt + 1}/{self.max_retries}). "
+                        f"Extract {filename} [{page}-{end_page}] failed (attempt {attempt + 1}/{self.max_retries}). "
                         f"Error: {e}. Retrying in 5s..."
                     )
                     if attempt < self.max_retries - 1:
@@ -81,18 +134,20 @@ class MineruFormatter(Mapper):
                     else:
                         logger.error(f"aio_do_parse failed after {self.max_retries} attempts.")
                         raise  # 耗尽次数后抛出异常，交给上层 execute 处理
-            if os.path.exists(parse_dir):
-                content += get_infer_result(".md", filename_without_ext, parse_dir)
-                self.save_images(parse_dir, sample["dataset_id"], os.path.abspath(sample[self.export_path_key]) + "/images")
-                shutil.rmtree(parse_dir)
-        return content
+        parse_dir = os.path.join(window_dir, filename_without_ext, "vlm")
+        if not os.path.exists(parse_dir):
+            return "", []
+        content = await asyncio.to_thread(get_infer_result, ".md", filename_without_ext, parse_dir)
+        image_paths = glob.glob(os.path.join(glob.escape(os.path.join(parse_dir, "images")), "*.jpg"))
+        return content or "", image_paths
 
-    def save_images(self, parse_dir, dataset_id, export_path):
+    def save_images(self, image_paths: List[str], dataset_id, export_path):
+        """复制抽取出的图片并批量登记到数据集，同名图片（内容哈希相同）只处理一次"""
         Path(export_path).mkdir(parents=True, exist_ok=True)
 
-        images_dir = os.path.join(parse_dir, "images")
-        image_paths = glob.glob(os.path.join(glob.escape(images_dir), "*.jpg"))
-        for image_path in image_paths:
+        persistence = TaskInfoPersistence()
+        file_records = []
+        for image_path in {Path(path).name: path for path in image_paths}.values():
             shutil.copy(image_path, export_path)
             image_sample = {}
             image = Path(image_path)
@@ -102,4 +157,5 @@ class MineruFormatter(Mapper):
             image_sample[self.filesize_key] = image.stat().st_size
             image_sample["dataset_id"] = dataset_id
             image_sample[self.filepath_key] = export_path + "/" + image_name
-            TaskInfoPersistence().update_file_result(image_sample, str(uuid.uuid4()))
\ No newline at end of file
+            file_records.append(persistence.build_file_result(image_sample, str(uuid.uuid4())))
+        persistence.batch_insert_files(file_records)
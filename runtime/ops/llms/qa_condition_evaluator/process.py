@@ -59,12 +59,11 @@ class QAConditionEvaluator(LLM):
     def execute(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         start = time.time()
         qas = json.loads(sample[self.text_key])
+        results = self._evaluate_qas(qas, retry=2)
         single_content_res = []
-        for qa in qas:
-            single_qa_res = []
-            for dimension, prompt in self.prompts.items():
-                local_result = self._llm_call_parse(qa, prompt, retry=2)
-                single_qa_res.append({"dimension": dimension, "result": local_result})
+        for qa_index, qa in enumerate(qas):
+            single_qa_res = [{"dimension": dimension, "result": results[(qa_index, dimension)]}
+                             for dimension in self.prompts]
             qa_response = {"qaId": qa["qaId"], "result": single_qa_res}
             single_content_res.append(qa_response)
 
@@ -86,13 +85,22 @@ class QAConditionEvaluator(LLM):
             prompts_dict[name] = dimension_prompt
         return prompts_dict
 
-    def _llm_call_parse(self, data: Dict, prompt: str, retry: int = 2):
-        try:
-            for _ in range(retry):
-                response = self.llm(prompt.format(question=data["question"], answer=data["answer"]))
+    def _evaluate_qas(self, qas: List[Dict], retry: int = 2) -> Dict:
+        """所有QA对与评估维度的请求并发发出，未解析出结果的请求重新发起，最多发起retry轮"""
+        results = {}
+        pending = {}
+        for qa_index, qa in enumerate(qas):
+            for dimension, prompt in self.prompts.items():
+                results[(qa_index, dimension)] = False
+                pending[(qa_index, dimension)] = prompt.format(question=qa["question"], answer=qa["answer"])
+        for _ in range(retry):
+            if not pending:
+                break
+            keys = list(pending)
+            responses = self.llm.batch_call([pending[key] for key in keys], retry=0)
+            for key, response in zip(keys, responses):
                 result = re.findall(self.pattern, response)
                 if result:
-                    return "Y" in result[0]
-        except RuntimeError as e:
-            logger.error(f"method: QAConditionEvaluator execution error, cause by {e}")
-        return False
+                    results[key] = "Y" in result[0]
+                    pending.pop(key)
+        return results
@@ -6,8 +6,6 @@ Create: 2025/3/14 11:00
 """
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import partial
 from typing import Dict, Any
 
 from loguru import logger
@@ -48,30 +46,25 @@ class TextQualityEvaluation(LLM):
         self.text_list = []
         return sample
 
-    def _evaluate_concurrently_text(self, text_res, max_workers: int = 5):
+    def _evaluate_concurrently_text(self, text_res, retry: int = 2):
         for eval_dimension in EVAL_DIMENSION_MAP + BUSINESS_EVAL_DIMENSION_MAP:
             text_res[eval_dimension["score_name"]] = 0
         self.total_scores = [0, 0, 0, 0, 0, 0]
         self.total_length = 0
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            # 使用 partial 绑定多参数
-            future_to_params = {
-                executor.submit(
-                    partial(self.get_current_score_concurrently, text)): text
-                for text in self.text_list
-            }
-            for future in as_completed(future_to_params):
-                self.parse_execute_result(future, future_to_params)
+        prompts = [self.build_prompt(text) for text in self.text_list]
+        # 所有分块的请求复用同一连接池并发发出，失败的请求返回空字符串
+        responses = self.llm.batch_call(prompts, retry=retry)
+        for text, response in zip(self.text_list, responses):
+            self.accumulate_scores(text, response)
         for _, eval_dimension in enumerate(EVAL_DIMENSION_MAP + BUSINESS_EVAL_DIMENSION_MAP):
             total_score = self.total_scores[_]
             text_res[eval_dimension["score_name"]] = 0
             if self.total_length > 0:
                 text_res[eval_dimension["score_name"]] = total_score / self.total_length
 
-    def parse_execute_result(self, future, future_to_params):
-        text = future_to_params[future]
+    def accumulate_scores(self, text, response):
         try:
-            scores = future.result()
+            scores = self.get_scores(response)
             if scores and len(scores) == len(self.total_scores):
                 self.total_length += len(text)
                 for _, score in enumerate(scores):
@@ -79,28 +72,18 @@ class TextQualityEvaluation(LLM):
         except Exception as e:
             logger.error(f"Evaluate error, error details: {e}")
 
-    def get_current_score_concurrently(self, text, retry: int = 2):
+    @staticmethod
+    def build_prompt(text):
         dimension_list = []
         for eval_dimension in EVAL_DIMENSION_MAP + BUSINESS_EVAL_DIMENSION_MAP:
             dimension = eval_dimension["dimension"] + ":" + eval_dimension["description"]
             dimension_list.append(dimension)
-        prompt = TEXT_QUALITY_EVALUATE_TEMPLATE.format(context=text, dimension0=dimension_list[0],
-                                                       dimension1=dimension_list[1], dimension2=dimension_list[2],
-                                                       dimension3=dimension_list[3], dimension4=dimension_list[4],
-                                                       dimension5=dimension_list[5])
-        retry_time = 0
-        while True:
-            try:
-                return self.get_scores(prompt)
-            except RuntimeError as e:
-                if retry_time < retry:
-                    retry_time += 1
-                else:
-                    logger.warning(f"Request LLM error, details: {e}")
-                    return []
+        return TEXT_QUALITY_EVALUATE_TEMPLATE.format(context=text, dimension0=dimension_list[0],
+                                                     dimension1=dimension_list[1], dimension2=dimension_list[2],
+                                                     dimension3=dimension_list[3], dimension4=dimension_list[4],
+                                                     dimension5=dimension_list[5])
 
-    def get_scores(self, prompt):
-        response = self.llm(prompt)
+    def get_scores(self, response):
         scores_str_list = response.split(",")
         scores = []
         for scores_str in scores_str_list:
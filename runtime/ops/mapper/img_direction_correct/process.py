@@ -12,13 +12,14 @@ import cv2
 import numpy as np
 from loguru import logger
 
-from datamate.common.utils import bytes_transform
 from datamate.core.base_op import Mapper
 
 from .base_model import BaseModel
 
 
 class ImgDirectionCorrect(Mapper):
+    support_image_frame = True
+
     def __init__(self, *args, **kwargs):
         super(ImgDirectionCorrect, self).__init__(*args, **kwargs)
         self.img_resize = 1000
@@ -101,12 +102,11 @@ class ImgDirectionCorrect(Mapper):
         start = time.time()
         self.read_file_first(sample)
         file_name = sample[self.filename_key]
-        file_type = "." + sample[self.filetype_key]
         img_bytes = sample[self.data_key]
         if img_bytes:
-            data = bytes_transform.bytes_to_numpy(img_bytes)
+            data = self.load_image(sample)
             correct_data = self._img_direction_correct(data, file_name, self.model)
-            sample[self.data_key] = bytes_transform.numpy_to_bytes(correct_data, file_type)
+            self.update_image(sample, correct_data)
             logger.info(f"fileName: {file_name}, method: ImgDirectionCorrect costs {time.time() - start:6f} s")
         return sample
 
@@ -13,13 +13,13 @@ import numpy as np
 import cv2
 from loguru import logger
 
-from datamate.common.utils import bytes_transform
 
 from datamate.core.base_op import Mapper
 
 
 class ImgBrightness(Mapper):
     """图片亮度自适应增强"""
+    support_image_frame = True
 
     def __init__(self, *args, **kwargs):
         super(ImgBrightness, self).__init__(*args, **kwargs)
@@ -91,11 +91,10 @@ class ImgBrightness(Mapper):
         self.read_file_first(sample)
         img_bytes = sample[self.data_key]
         file_name = sample[self.filename_key]
-        file_type = "." + sample[self.filetype_key]
         if img_bytes:
             # 进行图片增强
-            img_data = bytes_transform.bytes_to_numpy(img_bytes)
+            img_data = self.load_image(sample)
             img_data = self.enhance_brightness(img_data, file_name)
-            sample[self.data_key] = bytes_transform.numpy_to_bytes(img_data, file_type)
+            self.update_image(sample, img_data)
         logger.info(f"fileName: {file_name}, method: ImgBrightness costs {time.time() - start:6f} s")
         return sample
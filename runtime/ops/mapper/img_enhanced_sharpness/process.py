@@ -14,12 +14,12 @@ import cv2
 import numpy as np
 from loguru import logger
 
-from datamate.common.utils import bytes_transform
 from datamate.core.base_op import Mapper
 
 
 class ImgSharpness(Mapper):
     """图片锐度自适应增强"""
+    support_image_frame = True
 
     def __init__(self, *args, **kwargs):
         super(ImgSharpness, self).__init__(*args, **kwargs)
@@ -60,11 +60,10 @@ class ImgSharpness(Mapper):
         self.read_file_first(sample)
         img_bytes = sample[self.data_key]
         file_name = sample[self.filename_key]
-        file_type = "." + sample[self.filetype_key]
         if img_bytes:
             # 进行图片增强
-            img_data = bytes_transform.bytes_to_numpy(img_bytes)
+            img_data = self.load_image(sample)
             img_data = self.enhance_sharpness(img_data, file_name)
-            sample[self.data_key] = bytes_transform.numpy_to_bytes(img_data, file_type)
+            self.update_image(sample, img_data)
         logger.info(f"fileName: {file_name}, method: ImgSharpness costs {time.time() - start:6f} s")
         return sample
@@ -12,12 +12,12 @@ import cv2
 import numpy as np
 from loguru import logger
 
-from datamate.common.utils import bytes_transform
 from datamate.core.base_op import Mapper
 
 
 class ImgPerspectiveTransformation(Mapper):
     """图片透视变换插件"""
+    support_image_frame = True
 
     def __init__(self, *args, **kwargs):
         super(ImgPerspectiveTransformation, self).__init__(*args, **kwargs)
@@ -28,11 +28,10 @@ class ImgPerspectiveTransformation(Mapper):
         self.read_file_first(sample)
         img_bytes = sample[self.data_key]
         file_name = sample[self.filename_key]
-        file_type = "." + sample[self.filetype_key]
         if img_bytes:
-            img_data = bytes_transform.bytes_to_numpy(img_bytes)
+            img_data = self.load_image(sample)
             transform_img = self._transform_img(img_data, file_name)
-            sample[self.data_key] = bytes_transform.numpy_to_bytes(transform_img, file_type)
+            self.update_image(sample, transform_img)
         logger.info(f"fileName: {file_name}, method: ImgPerspectiveTransformation costs {time.time() - start:6f} s")
         return sample
 
@@ -9,11 +9,12 @@ import time
 
 from loguru import logger
 
-from datamate.common.utils import bytes_transform
 from datamate.core.base_op import Mapper
 
 
 class ImgTypeUnify(Mapper):
+    support_image_frame = True
+
     def __init__(self, *args, **kwargs):
         super(ImgTypeUnify, self).__init__(*args, **kwargs)
         """勾选图片编码格式统一，未输入参数时，默认设置为jpg格式"""
@@ -31,9 +32,9 @@ class ImgTypeUnify(Mapper):
         # 读取图片
         img_bytes = sample[self.data_key]
         if img_bytes:
-            origin_data = bytes_transform.bytes_to_numpy(img_bytes)
-            # 按指定编码格式转字节
-            sample[self.data_key] = bytes_transform.numpy_to_bytes(origin_data, "." + self._setting_type)
+            origin_data = self.load_image(sample)
+            # 按指定编码格式转字节，编码推迟到图片帧写回时按新的文件类型进行
+            self.update_image(sample, origin_data)
             # 修改meta数据
             sample[self.filetype_key] = self._setting_type
             sample[self.filename_key] = re.sub(self._setting_type + "$", self._setting_type, file_name)
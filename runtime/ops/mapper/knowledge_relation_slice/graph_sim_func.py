@@ -3,8 +3,11 @@
 
 
 import math
+from collections import Counter
 from multiprocessing import Pool, cpu_count
 
+import numpy as np
+
 from six import iteritems
 from six.moves import range
 from loguru import logger
@@ -106,3 +109,107 @@ class SimilarityAlgBM25(object):
         eps = EPSILON * self.average_idf
         for word in negative_idfs_list:
             self.idf_dict[word] = eps
+
+
+class BM25Index(object):
+    """
+    BM25 over a fixed corpus tokenized once, stored as a sparse term-document
+    inverted index. Scores are computed against an active candidate subset whose
+    document frequencies, size and average length are maintained incrementally,
+    giving the same results as SimilarityAlgBM25 built over that subset.
+    """
+
+    def __init__(self, corpus_docs):
+        vocab = {}
+        doc_ptr = [0]
+        doc_terms = []
+        doc_tfs = []
+        for document_file in corpus_docs:
+            for word, freq in iteritems(Counter(document_file)):
+                doc_terms.append(vocab.setdefault(word, len(vocab)))
+                doc_tfs.append(freq)
+            doc_ptr.append(len(doc_terms))
+
+        self.vocab = vocab
+        self.corpus_files_size = len(doc_ptr) - 1
+        self.doc_len = np.array([len(document_file) for document_file in corpus_docs], dtype=np.float64)
+        # document -> terms (CSR rows), also used as query vectors
+        self.doc_ptr = np.array(doc_ptr, dtype=np.int64)
+        self.doc_terms = np.array(doc_terms, dtype=np.int64)
+        self.doc_tfs = np.array(doc_tfs, dtype=np.float64)
+        # term -> postings (CSC columns)
+        order = np.argsort(self.doc_terms, kind="stable")
+        self.post_docs = np.repeat(np.arange(self.corpus_files_size), np.diff(self.doc_ptr))[order]
+        self.post_tfs = self.doc_tfs[order]
+        self.term_ptr = np.concatenate(([0], np.cumsum(np.bincount(self.doc_terms, minlength=len(vocab)))))
+
+        self.candidates = np.zeros(self.corpus_files_size, dtype=bool)
+        self.df = np.zeros(len(vocab), dtype=np.float64)
+        self.candidate_len_sum = 0.0
+
+    def _doc_slice(self, index):
+        return slice(self.doc_ptr[index], self.doc_ptr[index + 1])
+
+    def set_candidates(self, indices):
+        """Reset the candidate subset to the given document indices."""
+        self.candidates[:] = False
+        self.candidates[list(indices)] = True
+        active = self.candidates[np.repeat(np.arange(self.corpus_files_size), np.diff(self.doc_ptr))]
+        self.df = np.bincount(self.doc_terms[active], minlength=len(self.vocab)).astype(np.float64)
+        self.candidate_len_sum = float(self.doc_len[self.candidates].sum())
+
+    def discard(self, index):
+        """Remove one document from the candidate subset."""
+        if not self.candidates[index]:
+            return
+        self.candidates[index] = False
+        self.df[self.doc_terms[self._doc_slice(index)]] -= 1
+        self.candidate_len_sum -= self.doc_len[index]
+
+    def _idf(self, terms):
+        num_docs = np.count_nonzero(self.candidates)
+        present = self.df[self.df > 0]
+        if not present.size:
+            return np.zeros(len(terms))
+        average_idf = float(np.mean(np.log(num_docs - present + 0.5) - np.log(present + 0.5)))
+        df = self.df[terms]
+        idf = np.log(num_docs - df + 0.5) - np.log(df + 0.5)
+        return np.where(idf < 0, EPSILON * average_idf, idf)
+
+    def get_sim_scores(self, query_index):
+        """
+        Score the candidate documents against the document at query_index.
+        Non-candidate documents get -inf.
+        """
+        scores = np.full(self.corpus_files_size, -np.inf)
+        num_docs = np.count_nonzero(self.candidates)
+        if not num_docs:
+            return scores
+        scores[self.candidates] = 0.0
+
+        query = self._doc_slice(query_index)
+        terms, query_tfs = self.doc_terms[query], self.doc_tfs[query]
+        matched = self.df[terms] > 0
+        terms, query_tfs = terms[matched], query_tfs[matched]
+        if not terms.size or self.candidate_len_sum <= 0:
+            return scores
+
+        weights = query_tfs * self._idf(terms)
+        postings = [slice(self.term_ptr[term], self.term_ptr[term + 1]) for term in terms]
+        docs = np.concatenate([self.post_docs[posting] for posting in postings])
+        tfs = np.concatenate([self.post_tfs[posting] for posting in postings])
+        term_weights = np.repeat(weights, [posting.stop - posting.start for posting in postings])
+
+        active = self.candidates[docs]
+        docs, tfs, term_weights = docs[active], tfs[active], term_weights[active]
+        avg_dl = self.candidate_len_sum / num_docs
+        norm = PARAM_K1 * (1 - PARAM_B + PARAM_B * self.doc_len[docs] / avg_dl)
+        contributions = term_weights * tfs * (PARAM_K1 + 1) / (tfs + norm)
+        scores += np.bincount(docs, weights=contributions, minlength=self.corpus_files_size)
+        return scores
+
+    def best_match(self, query_index):
+        """Return the highest scoring candidate (lowest index on ties), or -1 if there is none."""
+        if not self.candidates.any():
+            return -1
+        return int(np.argmax(self.get_sim_scores(query_index)))
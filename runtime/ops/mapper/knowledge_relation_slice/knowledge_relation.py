@@ -4,8 +4,6 @@
 
 __all__ = ['build_llm_prompt', 'get_json_list']
 
-import math
-
 import jieba
 from loguru import logger
 
@@ -58,48 +56,18 @@ class KnowledgeSlice:
         return chunks
 
 
-class BM25Model:
-    def __init__(self, data_list):
-        self.data_list = data_list
-        self.corpus = self.load_corpus()
-
-    def bm25_similarity(self, query, num_best=1):
-        query = jieba.lcut(query)
-        bm = bm25.SimilarityAlgBM25(self.corpus)
-        scores = bm.get_sim_scores(query)
-        id_score = [(i, score) for i, score in enumerate(scores)]
-        id_score.sort(key=lambda e: e[1], reverse=True)
-
-        return id_score[0: num_best]
-
-    def load_corpus(self):
-        corpus = [jieba.lcut(data) for data in self.data_list]
-
-        return corpus
-
-
 class KnowledgeGraph:
     # class for document segmentation and create relation between knowledge
-    def __init__(self, corpus_file_string, chunk_size=500, overlap_size=100, kg_relation=True):
+    def __init__(self, corpus_file_string, chunk_size=500, overlap_size=100, kg_relation=True,
+                 search_space_size=50):
         self.corpus_file_string = corpus_file_string
         self.chunk_size = chunk_size
         self.overlap_size = overlap_size
         self.kg_relation = kg_relation
+        self.search_space_size = search_space_size
         self.slicing_corpus = []
         self.knowledge_slice = KnowledgeSlice(self.corpus_file_string, self.chunk_size, self.overlap_size)
 
-    @staticmethod
-    def update_gallery_list(gallery_list, iterated_dict):
-        # get a gallery list which not in iterated_dict
-        gallery_list_update = []
-        gallery_list_index = []
-        for i, _ in enumerate(gallery_list):
-            if i not in iterated_dict:
-                gallery_list_update.append(gallery_list[i])
-                gallery_list_index.append(i)
-
-        return gallery_list_update, gallery_list_index
-
     def document_slicing(self):
         json_list = []
         all_slices_info = self.knowledge_slice.execute()
@@ -111,57 +79,51 @@ class KnowledgeGraph:
 
         self.slicing_corpus = json_list
 
-    def build_knowledge_relation(self, slicing_corpus_list):
-        # knowledge relation for each paragraph
+    def build_knowledge_relation(self, slicing_corpus_list, bm25_index=None, offset=0):
+        # knowledge relation for each paragraph, slicing_corpus_list[i] is document offset + i of bm25_index
         if not self.kg_relation:
             return slicing_corpus_list
-        iterated_dict = {}
         kr_result_json_list = []
-        gallery_list = []
-        kr_relation_list = []
 
         if len(slicing_corpus_list) < 3:
             return slicing_corpus_list
 
-        for _, item in enumerate(slicing_corpus_list):
-            gallery_list.append(item['slice_data'])
+        if bm25_index is None:
+            bm25_index = bm25.BM25Index([jieba.lcut(item['slice_data']) for item in slicing_corpus_list])
+            offset = 0
+        # gallery: slices of this window which are not related yet
+        bm25_index.set_candidates(range(offset, offset + len(slicing_corpus_list)))
 
         for k, item in enumerate(slicing_corpus_list):
-            if k not in iterated_dict:
-                iterated_dict[k] = 1
-                cur_gallery_list, cur_gallery_src_index = self.update_gallery_list(gallery_list, iterated_dict)
-                if len(cur_gallery_list) < 1:
-                    kr_result_json_list.append({
-                        "slice_data": item['slice_data']
-                    })
-                    return kr_result_json_list
-                bm25_class = BM25Model(cur_gallery_list)
-                id_scores = bm25_class.bm25_similarity(item['slice_data'], 1)
-                kr_result_doc = item['slice_data'] + cur_gallery_list[id_scores[0][0]]
+            if not bm25_index.candidates[offset + k]:
+                continue
+            bm25_index.discard(offset + k)
+            best_index = bm25_index.best_match(offset + k)
+            if best_index < 0:
                 kr_result_json_list.append({
-                    "slice_data": kr_result_doc
+                    "slice_data": item['slice_data']
                 })
-                if cur_gallery_src_index[id_scores[0][0]] not in iterated_dict:
-                    iterated_dict[cur_gallery_src_index[id_scores[0][0]]] = 1
-            else:
-                continue
+                return kr_result_json_list
+            kr_result_json_list.append({
+                "slice_data": item['slice_data'] + slicing_corpus_list[best_index - offset]['slice_data']
+            })
+            bm25_index.discard(best_index)
 
         return kr_result_json_list
 
-    def build_graph_efficiently(self, search_space_size=50):
-        # build knowledge relation in a efficient way
+    def build_graph_efficiently(self, search_space_size=None):
+        # build knowledge relation in a efficient way, every slice is tokenized only once
+        search_space_size = search_space_size or self.search_space_size
         knowledge_total_num = len(self.slicing_corpus)
-        knowledge_chunk_num = math.ceil(knowledge_total_num / search_space_size)
         knowledge_relation_result = []
+        if not self.kg_relation or knowledge_total_num < 3:
+            return self.slicing_corpus
 
-        for i in range(0, knowledge_chunk_num):
-            cur_max_index = (i + 1) * search_space_size
-            if cur_max_index > knowledge_total_num:
-                corpus_list = self.slicing_corpus[i * search_space_size:]
-            else:
-                corpus_list = self.slicing_corpus[i * search_space_size:cur_max_index]
+        bm25_index = bm25.BM25Index([jieba.lcut(item['slice_data']) for item in self.slicing_corpus])
+        for start in range(0, knowledge_total_num, search_space_size):
+            corpus_list = self.slicing_corpus[start:start + search_space_size]
             # to do knowledge relation
-            cur_knowledge_relation_result = self.build_knowledge_relation(corpus_list)
+            cur_knowledge_relation_result = self.build_knowledge_relation(corpus_list, bm25_index, start)
             knowledge_relation_result.extend(cur_knowledge_relation_result)
 
         return knowledge_relation_result
@@ -174,9 +136,9 @@ class KnowledgeGraph:
         return kr_result_list_json
 
 
-def get_json_list(txt_string, chunk_size=500, overlap_size=100, kg_relation=True):
+def get_json_list(txt_string, chunk_size=500, overlap_size=100, kg_relation=True, search_space_size=50):
     if len(txt_string) > 0:
-        kg_extract = KnowledgeGraph(txt_string, chunk_size, overlap_size, kg_relation)
+        kg_extract = KnowledgeGraph(txt_string, chunk_size, overlap_size, kg_relation, search_space_size)
         kr_result_json_list = kg_extract.knowledge_corpus_list_json()
     else:
         kr_result_json_list = []
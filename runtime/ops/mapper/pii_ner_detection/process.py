@@ -16,6 +16,7 @@ class PiiDetector(Mapper):
 
         self.nlp_engine = None
         self.text_analyzer = None
+        self.batch_analyzer = None
         self.anom = None
 
         self.init_model(*args, **kwargs)
@@ -39,6 +40,7 @@ class PiiDetector(Mapper):
         self.text_analyzer.registry.load_predefined_recognizers()
         for recognizer in [id_recognizer, phone_recognizer, zipcode_recognizer, url_recognizer]:
             self.text_analyzer.registry.add_recognizer(recognizer)
+        self.batch_analyzer = analyzer.BatchAnalyzerEngine(analyzer_engine=self.text_analyzer)
 
         # 初始化AnonymizerEngine
         self.anom = anonymizer.AnonymizerEngine()
@@ -50,3 +52,15 @@ class PiiDetector(Mapper):
         res = self.anom.anonymize(text=text, analyzer_results=analyzer_results)
         sample['text'] = res.text
         return sample
+
+    def execute_batch(self, samples):
+        for sample in samples:
+            self.read_file_first(sample)
+        texts = [sample.get('text') for sample in samples]
+        # 批量分析时spaCy按批次推理，分摊单次调用开销
+        batch_results = self.batch_analyzer.analyze_iterator(texts=texts, language=self.support_language,
+                                                             batch_size=len(texts))
+        for sample, text, analyzer_results in zip(samples, texts, batch_results):
+            res = self.anom.anonymize(text=text, analyzer_results=analyzer_results)
+            sample['text'] = res.text
+        return samples
@@ -11,7 +11,7 @@ from typing import Dict, Any
 
 from loguru import logger
 
-from datamate.common.utils.aho_corasick import AhoCorasic
+from datamate.common.utils.aho_corasick import CompiledAhoCorasick
 from datamate.core.base_op import Mapper
 
 
@@ -25,7 +25,7 @@ class PoliticalWordCleaner(Mapper):
         special_symbols_path = str(root_path / 'special_symbols.txt')
         self.special_symbols = self.load_words_list(special_symbols_path)
         self.political_words = self.load_words_list(political_file_path)
-        self.ac_automaton = AhoCorasic(self.political_words)
+        self.ac_automaton = CompiledAhoCorasick.get_or_build(self.political_words, self.special_symbols)
 
     @staticmethod
     def load_words_list(path):
@@ -63,6 +63,6 @@ class PoliticalWordCleaner(Mapper):
         """词语过滤主函数，分行过滤"""
         filtered_rows = []
         for row in text.split('\n'):
-            matched_words = self.ac_automaton.search(row, self.special_symbols)
+            matched_words = self.ac_automaton.search(row)
             filtered_rows.append(self.words_replace(matched_words, row))
         return '\n'.join(filtered_rows)
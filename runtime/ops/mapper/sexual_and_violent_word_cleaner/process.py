@@ -11,7 +11,7 @@ from typing import Dict, Any
 
 from loguru import logger
 
-from datamate.common.utils.aho_corasick import AhoCorasic
+from datamate.common.utils.aho_corasick import CompiledAhoCorasick
 from datamate.core.base_op import Mapper
 
 
@@ -28,7 +28,7 @@ class SexualAndViolentWordCleaner(Mapper):
         self.sexual_words = self.load_words_list(self.SEXUAL_FILE_PATH)
         self.special_symbols = self.load_words_list(self.SPECIAL_SYMBOLS_PATH)
         self.words = self.violent_words | self.sexual_words
-        self.ac_automaton = AhoCorasic(self.words)
+        self.ac_automaton = CompiledAhoCorasick.get_or_build(self.words, self.special_symbols)
 
     @staticmethod
     def load_words_list(path):
@@ -66,6 +66,6 @@ class SexualAndViolentWordCleaner(Mapper):
         """词语过滤主函数，分行过滤"""
         filtered_rows = []
         for row in text.split('\n'):
-            matched_words = self.ac_automaton.search(row, self.special_symbols)
+            matched_words = self.ac_automaton.search(row)
             filtered_rows.append(self.words_replace(matched_words, row))
         return '\n'.join(filtered_rows)
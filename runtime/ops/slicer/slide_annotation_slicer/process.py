@@ -4,9 +4,7 @@
 Description: 医疗图片按坐标切片
 Create: 2025/02/08 11:00
 """
-import copy
 import time
-import os
 from typing import List, Dict, Any
 
 import xml.etree.ElementTree as ET
@@ -16,8 +14,8 @@ import numpy as np
 import cv2
 from openslide import OpenSlide
 
+from datamate.common.utils.slide_tiler import SlideTiler, Tile
 from datamate.core.base_op import Slicer
-from datamate.common.utils import bytes_transform
 
 
 class AnnotationSlicer(Slicer):
@@ -29,14 +27,11 @@ class AnnotationSlicer(Slicer):
     def execute(self, sample: Dict[str, Any]) -> List[Dict[str, Any]]:
         start = time.time()
 
-        slide: OpenSlide = OpenSlide(sample[self.filepath_key])
-        if not isinstance(slide, OpenSlide):
-            logger.error("Not desired <Image.Image> object.")
-
         annotation_path: str = sample["extraFilePath"]
         annotations = self.parse_xml_annotations(annotation_path)
 
-        patch_num = self.auto_coordinate_slicer(sample, slide, annotations)
+        with OpenSlide(sample[self.filepath_key]) as slide:
+            patch_num = self.auto_coordinate_slicer(sample, slide, annotations)
         sample["slice_num"] = patch_num
 
         file_name = sample[self.filename_key]
@@ -78,40 +73,29 @@ class AnnotationSlicer(Slicer):
             annotations: List
     ) -> int:
         """
-        自动根据给定的标注文件切片原图像
+        自动根据给定的标注文件切片原图像，各标注的外接矩形区域并发读取、编码与写出
 
         Return: 
-            List[Content] 每个 content 都是一个 data 为 patch 的 content
+            写出的切片数
         """
         wsi_width, wsi_height = slide.dimensions
 
-        patch_no = 0
+        tiles = []
         # 遍历每个 Annotation
-        for _, annotation in enumerate(annotations):
-            part_of_group = annotation['part_of_group']
-            coordinates = annotation['coordinates']
-
+        for annotation in annotations:
             # 转换坐标为整数（确保在图像范围内）
-            coordinates = coordinates.clip(min=0, max=(wsi_width, wsi_height))
-
-            # 创建掩码（mask）图像
-            mask = np.zeros((wsi_height, wsi_width), dtype=np.uint8)
-            cv2.fillPoly(mask, [coordinates], 255)  # 填充多边形区域为白色
+            coordinates = annotation['coordinates'].clip(min=0, max=(wsi_width, wsi_height))
 
-            # 找到掩码中的非零区域（肿瘤区域）
-            x, y, w, h = cv2.boundingRect(coordinates)  # 获取多边形的边界框
+            # 多边形的外接矩形即为切片区域
+            x, y, w, h = cv2.boundingRect(coordinates)
+            tiles.append(Tile(len(tiles) + 1, x, y, w, h))
 
-            # 读取 WSI 图像的切片区域
-            region = slide.read_region((x, y), 0, (w, h))
-
-            # 转换为 NumPy 数组
-            region_np = np.array(region.convert("RGB"))
-
-            patch_sample = copy.deepcopy(original_sample)
-            patch_sample[self.data_key] = bytes_transform.numpy_to_bytes(region_np, '.png')
-            patch_no += 1
+        def write_patch(patch_no: int, data: bytes):
+            patch_sample = {**original_sample, self.data_key: data}
             self.save_patch_sample(patch_sample, patch_no, save_format="image")
 
+        patch_no = SlideTiler(original_sample[self.filepath_key]).run(tiles, write_patch)
+
         logger.info(f">>> {patch_no} annotations found and sliced.")
 
         return patch_no
@@ -4,20 +4,16 @@
 Description: 医疗图片按坐标切片
 Create: 2025/02/08 11:00
 """
-import copy
 import time
 from typing import List, Tuple, Dict, Any
 
-import itertools
 from loguru import logger
 
 from openslide import OpenSlide
-import numpy as np
 
+from datamate.common.utils.slide_tiler import SlideTiler, filter_tissue_tiles, grid_tiles
 from datamate.core.base_op import Slicer
 
-from datamate.common.utils import bytes_transform
-
 
 class SimpleSlicer(Slicer):
 
@@ -26,6 +22,7 @@ class SimpleSlicer(Slicer):
 
         self._target_size = kwargs.get("sliceSize", [128, 128])
         self._overlap = kwargs.get("overlap", 0)
+        self._tissue_ratio = kwargs.get("tissueRatio", 0)
         self.last_ops = True
 
         if not isinstance(self._target_size, List):
@@ -41,19 +38,24 @@ class SimpleSlicer(Slicer):
                 f"<overlap> received an out of range value: {self._overlap}, "
                 f"but (0 <= overlap <= 1) is expected."
             )
+        if not isinstance(self._tissue_ratio, (int, float)):
+            raise TypeError(f"<tissueRatio> received as {type(self._tissue_ratio)}, but expected float.")
+        if self._tissue_ratio < 0 or self._tissue_ratio > 1:
+            raise ValueError(
+                f"<tissueRatio> received an out of range value: {self._tissue_ratio}, "
+                f"but (0 <= tissueRatio <= 1) is expected."
+            )
 
     def execute(self, sample: Dict[str, Any]) -> List[Dict]:
         start = time.time()
 
-        slide: OpenSlide = OpenSlide(sample["filePath"])
-        if not isinstance(slide, OpenSlide):
-            logger.error("Not desired <Image.Image> object.")
-        dimensions: tuple[int, int] = slide.dimensions
+        with OpenSlide(sample["filePath"]) as slide:
+            dimensions: tuple[int, int] = slide.dimensions
 
-        target_size = self._target_size
-        overlap = self._overlap
+            target_size = self._target_size
+            overlap = self._overlap
 
-        patch_num = self.auto_simple_slicer(sample, slide, dimensions, target_size, overlap)
+            patch_num = self.auto_simple_slicer(sample, slide, dimensions, target_size, overlap)
         sample["slice_num"] = patch_num
 
         file_name = sample[self.filename_key]
@@ -70,29 +72,21 @@ class SimpleSlicer(Slicer):
             overlap: float
     ) -> int:
         """
-        自动根据给定规格切片原图像
+        自动根据给定规格切片原图像，跳过组织占比过低的背景切片后并发读取、编码与写出
 
         Return: 
-            List[Content] 每个 content 都是一个 data 为 patch 的 content
+            写出的切片数
         """
-        stride_x, stride_y = map(lambda x: int(x * (1 - overlap)), target_size)
-        w, h = target_size
-
-        patch_no = 0
-        for x, y in itertools.product(
-                range(0, dimensions[0] - w + 1, stride_x),
-                range(0, dimensions[1] - h + 1, stride_y)
-        ):
-            # 切片
-            region = slide.read_region((x, y), 0, target_size)
-
-            region_np = np.array(region.convert("RGB"))
-
-            patch_sample = copy.deepcopy(original_sample)
-            patch_sample[self.data_key] = bytes_transform.numpy_to_bytes(region_np, ".png")
-            patch_no += 1
+        tiles = grid_tiles(dimensions, target_size, overlap)
+        tiles = filter_tissue_tiles(slide, tiles, self._tissue_ratio)
+
+        def write_patch(patch_no: int, data: bytes):
+            # 切片只替换 data，其余字段与原样本共享，无需深拷贝
+            patch_sample = {**original_sample, self.data_key: data}
             self.save_patch_sample(patch_sample, patch_no, save_format="image")
 
+        patch_no = SlideTiler(original_sample[self.filepath_key]).run(tiles, write_patch)
+
         logger.info(f"One image sliced into pieces: {patch_no}")
 
         return patch_no
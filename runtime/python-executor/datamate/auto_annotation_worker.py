@@ -8,9 +8,9 @@ progress back to the same table so that the datamate-python backend and
 frontend can display real-time status.
 
 设计目标（最小可用版本）:
-- 单实例 worker，串行处理 `pending` 状态的任务。
-- 对指定数据集下的所有已完成文件逐张执行目标检测。
-- 按已处理图片数更新 `processed_images`、`progress`、`detected_objects`、`status` 等字段。
+- 多个 worker 线程并发处理 `pending` 状态的任务，通过 `FOR UPDATE SKIP LOCKED` 认领任务，避免重复执行。
+- 对指定数据集下的所有已完成文件按批执行目标检测，下一批图片的解码在线程池中预取。
+- 按已处理图片数更新 `processed_images`、`progress`、`detected_objects`、`status` 等字段，进度更新按时间间隔节流。
 - 失败时将任务标记为 `failed` 并记录 `error_message`。
 
 注意:
@@ -25,6 +25,7 @@ import sys
 import threading
 import time
 import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Set
@@ -110,23 +111,41 @@ BACKEND_BASE_URL = os.getenv(
 AUTO_SYNC_ENABLED = os.getenv("AUTO_ANNOTATION_SYNC_ENABLED", "true").lower() == "true"
 AUTO_SYNC_TIMEOUT_SECONDS = float(os.getenv("AUTO_ANNOTATION_SYNC_TIMEOUT", "10"))
 
+# 并发处理任务的 worker 线程数
+WORKER_COUNT = int(os.getenv("AUTO_ANNOTATION_WORKERS", "2"))
+# 单次模型调用的图片数
+BATCH_SIZE = int(os.getenv("AUTO_ANNOTATION_BATCH_SIZE", "16"))
+# 预取解码图片的线程数
+DECODE_WORKERS = int(os.getenv("AUTO_ANNOTATION_DECODE_WORKERS", "4"))
+# 任务进度写回数据库的最小间隔（秒）
+PROGRESS_INTERVAL_SECONDS = float(os.getenv("AUTO_ANNOTATION_PROGRESS_INTERVAL", "2"))
 
-def _fetch_pending_task() -> Optional[Dict[str, Any]]:
-    """从 t_dm_auto_annotation_tasks 中取出一个 pending 任务。"""
+
+def _claim_pending_task() -> Optional[Dict[str, Any]]:
+    """从 t_dm_auto_annotation_tasks 中认领一个 pending 任务并标记为 running。
+
+    多个 worker 并发认领时，已被其他 worker 锁定的任务会被跳过。
+    """
 
     sql = text(
         """
-        SELECT id, name, dataset_id, dataset_name, config, file_ids, status,
-               total_images, processed_images, detected_objects, output_path
-        FROM t_dm_auto_annotation_tasks
-        WHERE status = 'pending' AND deleted_at IS NULL
-        ORDER BY created_at ASC
-        LIMIT 1
+        UPDATE t_dm_auto_annotation_tasks
+        SET status = 'running', progress = 0, updated_at = :updated_at
+        WHERE id = (
+            SELECT id
+            FROM t_dm_auto_annotation_tasks
+            WHERE status = 'pending' AND deleted_at IS NULL
+            ORDER BY created_at ASC
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, name, dataset_id, dataset_name, config, file_ids, status,
+                  total_images, processed_images, detected_objects, output_path
         """
     )
 
     with SQLManager.create_connect() as conn:
-        result = conn.execute(sql).fetchone()
+        result = conn.execute(sql, {"updated_at": datetime.now()}).fetchone()
         if not result:
             return None
         row = dict(result._mapping)  # type: ignore[attr-defined]
@@ -320,154 +339,167 @@ def _build_file_tags_from_detections(detections: List[Dict[str, Any]]) -> Option
     ]
 
 
-def _update_dataset_file_tags(file_id: str, tags: List[Dict[str, Any]]) -> None:
-    """将标签写入 t_dm_dataset_files.tags 并更新 tags_updated_at。"""
+def _update_dataset_file_tags_batch(file_tags: List[Tuple[str, List[Dict[str, Any]]]]) -> None:
+    """批量将标签写入 t_dm_dataset_files.tags 并更新 tags_updated_at。"""
 
-    if not file_id:
+    file_tags = [(file_id, tags) for file_id, tags in file_tags if file_id]
+    if not file_tags:
         return
 
     try:
-        now = datetime.utcnow()
         sql = text(
             """
-            UPDATE t_dm_dataset_files
-            SET tags = :tags,
+            UPDATE t_dm_dataset_files AS f
+            SET tags = CAST(v.tags AS jsonb),
                 tags_updated_at = :tags_updated_at
-            WHERE id = :file_id
+            FROM unnest(CAST(:file_ids AS text[]), CAST(:tags AS text[])) AS v(id, tags)
+            WHERE f.id = v.id
             """
         )
         params = {
-            "file_id": file_id,
-            "tags": json.dumps(tags, ensure_ascii=False),
-            "tags_updated_at": now,
+            "file_ids": [file_id for file_id, _ in file_tags],
+            "tags": [json.dumps(tags, ensure_ascii=False) for _, tags in file_tags],
+            "tags_updated_at": datetime.utcnow(),
         }
         with SQLManager.create_connect() as conn:
             conn.execute(sql, params)
     except Exception as e:  # pragma: no cover - 防御性日志
         logger.error(
-            "Failed to update tags for dataset file {}: {}",
-            file_id,
+            "Failed to update tags for {} dataset files: {}",
+            len(file_tags),
             e,
         )
 
 
-def _register_annotation_output_file(dataset_id: str, annotations_path: str) -> None:
-    """确保自动标注生成的 JSON 结果文件在 t_dm_dataset_files 中有一条记录。
+def _register_annotation_output_files(dataset_id: str, annotations_paths: List[str]) -> None:
+    """批量确保自动标注生成的 JSON 结果文件在 t_dm_dataset_files 中有记录。
 
     - 若同一 dataset_id + file_path 已存在，则仅更新文件大小和时间戳；
-    - 若不存在，则插入一条新的 ACTIVE 记录。
+    - 若不存在，则插入新的 ACTIVE 记录，并一次性更新 t_dm_datasets 的统计字段。
     """
 
-    if not annotations_path:
-        return
-
-    try:
+    files: Dict[str, int] = {}
+    for annotations_path in annotations_paths:
+        if not annotations_path or annotations_path in files:
+            continue
         if not os.path.isfile(annotations_path):
             logger.warning(
                 "Annotation JSON file not found when registering dataset file: {}",
                 annotations_path,
             )
-            return
-
-        file_name = os.path.basename(annotations_path)
-        ext = os.path.splitext(file_name)[1].lstrip(".").lower() or "other"
-
+            continue
         try:
-            file_size = os.path.getsize(annotations_path)
+            files[annotations_path] = os.path.getsize(annotations_path)
         except OSError:
-            file_size = 0
+            files[annotations_path] = 0
 
+    if not files:
+        return
+
+    try:
         now = datetime.utcnow()
 
         with SQLManager.create_connect() as conn:
-            # 先检查是否已经存在同一路径的文件记录
-            existing = conn.execute(
+            # 先查出已经存在同一路径的文件记录
+            rows = conn.execute(
                 text(
                     """
-                    SELECT id, file_size
+                    SELECT id, file_path
                     FROM t_dm_dataset_files
                     WHERE dataset_id = :dataset_id
-                      AND file_path = :file_path
+                      AND file_path = ANY(CAST(:file_paths AS text[]))
                       AND status = 'ACTIVE'
-                    LIMIT 1
                     """,
                 ),
-                {"dataset_id": dataset_id, "file_path": annotations_path},
-            ).fetchone()
+                {"dataset_id": dataset_id, "file_paths": list(files.keys())},
+            ).fetchall()
+            existing: Dict[str, str] = {}
+            for row in rows:
+                existing.setdefault(str(row[1]), str(row[0]))
 
             if existing:
                 # 已存在：仅更新文件大小及时间戳，避免重复插入
                 conn.execute(
                     text(
                         """
-                        UPDATE t_dm_dataset_files
-                        SET file_size = :file_size,
-                            updated_at = :updated_at,
-                            last_access_time = :last_access_time
-                        WHERE id = :id
+                        UPDATE t_dm_dataset_files AS f
+                        SET file_size = v.file_size,
+                            updated_at = :now,
+                            last_access_time = :now
+                        FROM unnest(CAST(:ids AS text[]), CAST(:file_sizes AS bigint[])) AS v(id, file_size)
+                        WHERE f.id = v.id
                         """,
                     ),
                     {
-                        "id": existing[0],
-                        "file_size": int(file_size),
-                        "updated_at": now,
-                        "last_access_time": now,
+                        "ids": list(existing.values()),
+                        "file_sizes": [int(files[path]) for path in existing.keys()],
+                        "now": now,
                     },
                 )
-            else:
-                # 新文件：插入记录，并尽量更新 t_dm_datasets 的统计字段
-                new_id = str(uuid.uuid4())
+
+            new_paths = [path for path in files if path not in existing]
+            if not new_paths:
+                return
+
+            # 新文件：批量插入记录
+            conn.execute(
+                text(
+                    """
+                    INSERT INTO t_dm_dataset_files
+                        (id, dataset_id, file_name, file_path, file_type, file_size, status, upload_time, created_at, updated_at)
+                    SELECT v.id, :dataset_id, v.file_name, v.file_path, v.file_type, v.file_size, 'ACTIVE', :now, :now, :now
+                    FROM unnest(
+                        CAST(:ids AS text[]),
+                        CAST(:file_names AS text[]),
+                        CAST(:file_paths AS text[]),
+                        CAST(:file_types AS text[]),
+                        CAST(:file_sizes AS bigint[])
+                    ) AS v(id, file_name, file_path, file_type, file_size)
+                    """,
+                ),
+                {
+                    "ids": [str(uuid.uuid4()) for _ in new_paths],
+                    "dataset_id": dataset_id,
+                    "file_names": [os.path.basename(path) for path in new_paths],
+                    "file_paths": new_paths,
+                    "file_types": [os.path.splitext(path)[1].lstrip(".").lower() or "other" for path in new_paths],
+                    "file_sizes": [int(files[path]) for path in new_paths],
+                    "now": now,
+                },
+            )
+
+            # 轻量更新数据集的文件数量和总大小统计
+            try:
                 conn.execute(
                     text(
                         """
-                        INSERT INTO t_dm_dataset_files
-                            (id, dataset_id, file_name, file_path, file_type, file_size, status, upload_time, created_at, updated_at)
-                        VALUES
-                            (:id, :dataset_id, :file_name, :file_path, :file_type, :file_size, 'ACTIVE', :now, :now, :now)
+                        UPDATE t_dm_datasets
+                        SET file_count = COALESCE(file_count, 0) + :count,
+                            size_bytes = COALESCE(size_bytes, 0) + :delta,
+                            updated_at = :now,
+                            status = 'ACTIVE'
+                        WHERE id = :dataset_id
                         """,
                     ),
                     {
-                        "id": new_id,
                         "dataset_id": dataset_id,
-                        "file_name": file_name,
-                        "file_path": annotations_path,
-                        "file_type": ext,
-                        "file_size": int(file_size),
+                        "count": len(new_paths),
+                        "delta": sum(int(files[path]) for path in new_paths),
                         "now": now,
                     },
                 )
-
-                # 轻量更新数据集的文件数量和总大小统计
-                try:
-                    conn.execute(
-                        text(
-                            """
-                            UPDATE t_dm_datasets
-                            SET file_count = COALESCE(file_count, 0) + 1,
-                                size_bytes = COALESCE(size_bytes, 0) + :delta,
-                                updated_at = :now,
-                                status = 'ACTIVE'
-                            WHERE id = :dataset_id
-                            """,
-                        ),
-                        {
-                            "dataset_id": dataset_id,
-                            "delta": int(file_size),
-                            "now": now,
-                        },
-                    )
-                except Exception as e_ds:  # pragma: no cover - 统计更新失败不影响主流程
-                    logger.warning(
-                        "Failed to update dataset stats for {} when registering annotation file {}: {}",
-                        dataset_id,
-                        annotations_path,
-                        e_ds,
-                    )
+            except Exception as e_ds:  # pragma: no cover - 统计更新失败不影响主流程
+                logger.warning(
+                    "Failed to update dataset stats for {} when registering {} annotation files: {}",
+                    dataset_id,
+                    len(new_paths),
+                    e_ds,
+                )
     except Exception as e:  # pragma: no cover - 防御性日志
         logger.error(
-            "Failed to register annotation output file for dataset {} at {}: {}",
+            "Failed to register {} annotation output files for dataset {}: {}",
+            len(files),
             dataset_id,
-            annotations_path,
             e,
         )
 
@@ -530,6 +562,67 @@ def _trigger_forward_sync_to_label_studio(task_id: str) -> None:
         )
 
 
+def _decoded_image(future: Future) -> Any:
+    """获取预取的解码结果，解码异常时返回 None。"""
+
+    try:
+        return future.result()
+    except Exception as e:
+        logger.warning("Failed to decode image: {}", e)
+        return None
+
+
+def _detect_batch(
+    task_id: str,
+    detector: Any,
+    samples: List[Dict[str, Any]],
+    images: List[Any],
+) -> List[Optional[Dict[str, Any]]]:
+    """对一批图片执行检测，整批失败时逐张重试，处理失败的位置返回 None。"""
+
+    try:
+        return list(detector.detect_batch(samples, images))
+    except Exception as e:
+        logger.warning(
+            "Batch inference failed for task {}, retry image by image: {}",
+            task_id,
+            e,
+        )
+
+    results: List[Optional[Dict[str, Any]]] = []
+    for sample, image in zip(samples, images):
+        try:
+            results.append(detector.detect_batch([sample], [image])[0])
+        except Exception as e:
+            logger.error(
+                "Failed to process image for task {}: file_path={}, error={}",
+                task_id,
+                sample.get("image"),
+                e,
+            )
+            results.append(None)
+    return results
+
+
+def _resolve_annotations_file(result: Dict[str, Any], file_path: str, output_dir: str) -> Optional[str]:
+    """获取算子生成的标注 JSON 路径，未返回时按约定路径查找。"""
+
+    annotations_file = (result or {}).get("annotations_file")
+    if annotations_file:
+        return annotations_file
+
+    base_name = os.path.basename(file_path)
+    stem, _ = os.path.splitext(base_name)
+    # 兼容两种目录结构：<output_dir>/annotations/<name>.json 或 <output_dir>/<name>.json
+    candidate1 = os.path.join(output_dir, "annotations", f"{stem}.json")
+    candidate2 = os.path.join(output_dir, f"{stem}.json")
+    if os.path.isfile(candidate1):
+        return candidate1
+    if os.path.isfile(candidate2):
+        return candidate2
+    return None
+
+
 def _process_single_task(task: Dict[str, Any]) -> None:
     """执行单个自动标注任务。"""
 
@@ -691,79 +784,64 @@ def _process_single_task(task: Dict[str, Any]) -> None:
 
     processed = 0
     detected_total = 0
+    last_progress_at = time.monotonic()
 
-    # 记录：文件名 -> FileTag JSON，用于给新输出数据集的文件打标签
-    tags_by_filename: Dict[str, List[Dict[str, Any]]] = {}
+    batches = [files[i:i + BATCH_SIZE] for i in range(0, total_images, max(BATCH_SIZE, 1))]
+    decode_pool = ThreadPoolExecutor(max_workers=max(DECODE_WORKERS, 1), thread_name_prefix=f"decode-{task_id[:8]}")
 
-    for file_id, file_path, file_name in files:
-        try:
-            sample = {
-                "image": file_path,
-                "filename": file_name,
-            }
-            result = detector.execute(sample)
-
-            annotations = (result or {}).get("annotations", {})
-            detections = annotations.get("detections", [])
-            detected_total += len(detections)
-            processed += 1
-
-            # 根据算子返回的 annotations_file 或约定路径，注册 JSON 文件到 t_dm_dataset_files
-            annotations_file = None
-            try:
-                annotations_file = (result or {}).get("annotations_file")
-            except Exception:
-                annotations_file = None
-
-            if not annotations_file:
-                base_name = os.path.basename(file_path)
-                stem, _ = os.path.splitext(base_name)
-                # 兼容两种目录结构：<output_dir>/annotations/<name>.json 或 <output_dir>/<name>.json
-                candidate1 = os.path.join(output_dir, "annotations", f"{stem}.json")
-                candidate2 = os.path.join(output_dir, f"{stem}.json")
-                if os.path.isfile(candidate1):
-                    annotations_file = candidate1
-                elif os.path.isfile(candidate2):
-                    annotations_file = candidate2
-
-            if annotations_file:
-                _register_annotation_output_file(dataset_id, annotations_file)
-
-            # 基于检测结果生成标签（按类别去重），并写回源数据集文件
-            file_tags = _build_file_tags_from_detections(detections)
-            if file_tags:
-                try:
-                    _update_dataset_file_tags(file_id, file_tags)
-                    # 使用源文件名作为 key，供输出数据集复用
-                    base_name = os.path.basename(file_path)
-                    tags_by_filename[base_name] = file_tags
-                except Exception as e:
-                    logger.error(
-                        "Failed to persist tags for file {} in dataset {}: {}",
-                        file_id,
-                        dataset_id,
-                        e,
-                    )
-
-            progress = int(processed * 100 / total_images) if total_images > 0 else 100
+    def _submit_decode(batch: List[Tuple[str, str, str]]) -> List[Future]:
+        return [decode_pool.submit(ImageObjectDetectionBoundingBox.load_image, file_path) for _, file_path, _ in batch]
 
-            _update_task_status(
-                task_id,
-                status="running",
-                progress=progress,
-                processed_images=processed,
-                detected_objects=detected_total,
-                total_images=total_images,
-                output_path=output_dir,
-            )
-        except Exception as e:
-            logger.error(
-                "Failed to process image for task {}: file_path={}, error={}",
-                task_id,
-                file_path,
-                e,
-            )
-            continue
+    try:
+        next_images = _submit_decode(batches[0])
+        for index, batch in enumerate(batches):
+            # 当前批推理期间，后台线程解码下一批图片
+            image_futures = next_images
+            if index + 1 < len(batches):
+                next_images = _submit_decode(batches[index + 1])
+
+            samples = [{"image": file_path, "filename": file_name} for _, file_path, file_name in batch]
+            results = _detect_batch(task_id, detector, samples, [_decoded_image(f) for f in image_futures])
+
+            annotation_files: List[str] = []
+            file_tags_updates: List[Tuple[str, List[Dict[str, Any]]]] = []
+            for (file_id, file_path, _), result in zip(batch, results):
+                if result is None:
+                    continue
+
+                annotations = (result or {}).get("annotations", {})
+                detections = annotations.get("detections", [])
+                detected_total += len(detections)
+                processed += 1
+
+                # 根据算子返回的 annotations_file 或约定路径，注册 JSON 文件到 t_dm_dataset_files
+                annotations_file = _resolve_annotations_file(result, file_path, output_dir)
+                if annotations_file:
+                    annotation_files.append(annotations_file)
+
+                # 基于检测结果生成标签（按类别去重），并写回源数据集文件
+                file_tags = _build_file_tags_from_detections(detections)
+                if file_tags:
+                    file_tags_updates.append((file_id, file_tags))
+
+            _register_annotation_output_files(dataset_id, annotation_files)
+            _update_dataset_file_tags_batch(file_tags_updates)
+
+            now = time.monotonic()
+            if now - last_progress_at >= PROGRESS_INTERVAL_SECONDS:
+                last_progress_at = now
+                progress = int(processed * 100 / total_images) if total_images > 0 else 100
+                _update_task_status(
+                    task_id,
+                    status="running",
+                    progress=progress,
+                    processed_images=processed,
+                    detected_objects=detected_total,
+                    total_images=total_images,
+                    output_path=output_dir,
+                )
+    finally:
+        decode_pool.shutdown(wait=False, cancel_futures=True)
 
     _update_task_status(
         task_id,
@@ -800,7 +878,7 @@ def _worker_loop() -> None:
 
     while True:
         try:
-            task = _fetch_pending_task()
+            task = _claim_pending_task()
             if not task:
                 time.sleep(POLL_INTERVAL_SECONDS)
                 continue
@@ -812,8 +890,9 @@ def _worker_loop() -> None:
 
 
 def start_auto_annotation_worker() -> None:
-    """在后台线程中启动自动标注 worker。"""
+    """在后台线程中启动自动标注 worker，每个线程独立认领并处理任务。"""
 
-    thread = threading.Thread(target=_worker_loop, name="auto-annotation-worker", daemon=True)
-    thread.start()
-    logger.info("Auto-annotation worker thread started: {}", thread.name)
+    for index in range(max(WORKER_COUNT, 1)):
+        thread = threading.Thread(target=_worker_loop, name=f"auto-annotation-worker-{index}", daemon=True)
+        thread.start()
+        logger.info("Auto-annotation worker thread started: {}", thread.name)
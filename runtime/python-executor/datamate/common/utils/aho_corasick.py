@@ -1,5 +1,18 @@
 # -- encoding: utf-8 --
+import hashlib
+import os
+import tempfile
+import threading
 from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# 字符编号：不在任何敏感词中的字符
+_UNKNOWN_CHAR = None
+# 字符编号：需跳过的特殊字符
+_SKIP_CHAR = -1
 
 
 class TrieNode:
@@ -113,3 +126,219 @@ def add_fail_pointer(root: TrieNode):
             else:
                 curr.fail = root
     return root
+
+
+class CompiledAhoCorasick:
+    """
+    数组化的AC自动机。
+
+    1. 字符映射为连续编号，特殊字符映射为跳过标记，不在词表中的字符直接回到根节点。
+    2. 构建时沿失败指针补全状态转移，匹配时每个字符只需一次查表，不再回溯失败指针。
+    3. 相同词表与特殊字符的自动机在进程内共享，并以NumPy数组的形式保存到缓存文件，避免每个算子实例重复构建。
+       缓存文件不含任何可执行的序列化对象，读取时禁用pickle，内容无效时重新构建。
+    """
+
+    CACHE_DIR = os.getenv("AC_AUTOMATON_CACHE_DIR", os.path.join(tempfile.gettempdir(), "datamate_ac_automaton"))
+
+    _instances: Dict[str, "CompiledAhoCorasick"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, words: Iterable[str], special_symbols: Iterable[str] = ()):
+        words = sorted({word for word in words if word})
+        special_symbols = set(special_symbols)
+        self.char_ids: Dict[str, int] = {}
+        for word in words:
+            for s in word:
+                if s not in special_symbols:
+                    self.char_ids.setdefault(s, len(self.char_ids))
+        for s in special_symbols:
+            self.char_ids[s] = _SKIP_CHAR
+        self.alphabet_size = max(len(self.char_ids), 1)
+
+        # 前缀树，children[state]为{字符编号: 子状态}
+        children: List[Dict[int, int]] = [{}]
+        self.word_len: List[int] = [0]
+        for word in words:
+            state, depth = 0, 0
+            for s in word:
+                cid = self.char_ids[s]
+                if cid == _SKIP_CHAR:
+                    continue
+                depth += 1
+                if cid not in children[state]:
+                    children.append({})
+                    self.word_len.append(0)
+                    children[state][cid] = len(children) - 1
+                state = children[state][cid]
+            if state:
+                self.word_len[state] = depth
+        self.max_depth = max(self.word_len) if words else 0
+        self._build(children)
+
+    def _build(self, children: List[Dict[int, int]]):
+        num_states = len(children)
+        fail = [0] * num_states
+        # out_next: 沿失败指针最近的单词结尾状态；longest: 当前状态可匹配的最长单词长度
+        self.out_next: List[int] = [0] * num_states
+        self.longest: List[int] = [0] * num_states
+        self.root_goto: List[int] = [0] * self.alphabet_size
+        # 非根状态的补全转移，仅保存与根节点转移不同的项，键为 state * alphabet_size + cid
+        self.delta: Dict[int, int] = {}
+
+        transitions: List[Optional[Dict[int, int]]] = [None] * num_states
+        queue = deque()
+        for cid, child in children[0].items():
+            self.root_goto[cid] = child
+            queue.append(child)
+        transitions[0] = {}
+        while queue:
+            state = queue.popleft()
+            fail_state = fail[state]
+            self.out_next[state] = fail_state if self.word_len[fail_state] else self.out_next[fail_state]
+            self.longest[state] = self.word_len[state] or self.longest[fail_state]
+
+            state_transitions = dict(transitions[fail_state])
+            for cid, child in children[state].items():
+                fail[child] = state_transitions.get(cid, self.root_goto[cid])
+                state_transitions[cid] = child
+                queue.append(child)
+            transitions[state] = state_transitions
+            for cid, target in state_transitions.items():
+                if target != self.root_goto[cid]:
+                    self.delta[state * self.alphabet_size + cid] = target
+
+    @classmethod
+    def get_or_build(cls, words: Iterable[str], special_symbols: Iterable[str] = ()) -> "CompiledAhoCorasick":
+        """按词表与特殊字符的哈希获取自动机，依次查找进程内缓存、缓存文件，均未命中时构建并写入缓存"""
+        words = sorted({word for word in words if word})
+        special_symbols = sorted(set(special_symbols))
+        digest = hashlib.sha256("\n".join(words + ["\0"] + special_symbols).encode("utf-8")).hexdigest()
+        with cls._instances_lock:
+            if digest in cls._instances:
+                return cls._instances[digest]
+
+            cache_path = os.path.join(cls.CACHE_DIR, f"{digest}.npz")
+            automaton = None
+            if os.path.exists(cache_path):
+                try:
+                    automaton = cls._load(cache_path)
+                except Exception as e:
+                    logger.warning(f"Load AC automaton cache {cache_path} failed: {e}")
+            if automaton is None:
+                automaton = cls(words, special_symbols)
+                cls._dump(automaton, cache_path)
+            cls._instances[digest] = automaton
+            return automaton
+
+    @classmethod
+    def _load(cls, cache_path: str) -> "CompiledAhoCorasick":
+        """从缓存文件中读取自动机的状态数组，不反序列化任何对象"""
+        with np.load(cache_path, allow_pickle=False) as arrays:
+            automaton = cls.__new__(cls)
+            automaton.char_ids = dict(zip(map(chr, arrays["chars"].tolist()), arrays["char_ids"].tolist()))
+            automaton.alphabet_size = int(arrays["alphabet_size"])
+            automaton.max_depth = int(arrays["max_depth"])
+            automaton.word_len = arrays["word_len"].tolist()
+            automaton.out_next = arrays["out_next"].tolist()
+            automaton.longest = arrays["longest"].tolist()
+            automaton.root_goto = arrays["root_goto"].tolist()
+            automaton.delta = dict(zip(arrays["delta_keys"].tolist(), arrays["delta_values"].tolist()))
+        num_states = len(automaton.word_len)
+        if not (len(automaton.out_next) == len(automaton.longest) == num_states
+                and len(automaton.root_goto) == automaton.alphabet_size
+                and all(0 <= state < num_states for state in automaton.delta.values())):
+            raise ValueError("inconsistent automaton arrays")
+        return automaton
+
+    @staticmethod
+    def _dump(automaton: "CompiledAhoCorasick", cache_path: str):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(f,
+                         chars=np.array([ord(s) for s in automaton.char_ids], dtype=np.uint32),
+                         char_ids=np.array(list(automaton.char_ids.values()), dtype=np.int64),
+                         alphabet_size=np.int64(automaton.alphabet_size),
+                         max_depth=np.int64(automaton.max_depth),
+                         word_len=np.array(automaton.word_len, dtype=np.int64),
+                         out_next=np.array(automaton.out_next, dtype=np.int64),
+                         longest=np.array(automaton.longest, dtype=np.int64),
+                         root_goto=np.array(automaton.root_goto, dtype=np.int64),
+                         delta_keys=np.array(list(automaton.delta.keys()), dtype=np.int64),
+                         delta_values=np.array(list(automaton.delta.values()), dtype=np.int64))
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Save AC automaton cache {cache_path} failed: {e}")
+
+    def search(self, text: str) -> List[str]:
+        """
+        匹配敏感词。
+
+        Args:
+            text: 文本
+        Returns:
+            匹配成功的字符串列表，字符串包含敏感词中间被跳过的特殊字符
+        """
+        char_ids, root_goto, delta = self.char_ids, self.root_goto, self.delta
+        longest, word_len, out_next = self.longest, self.word_len, self.out_next
+        alphabet_size = self.alphabet_size
+        seq_set = set()
+        # 最近有效字符的位置，用于还原跨越特殊字符的匹配区间
+        positions = deque(maxlen=self.max_depth)
+        state = 0
+        for i, s in enumerate(text):
+            cid = char_ids.get(s, _UNKNOWN_CHAR)
+            if cid is _UNKNOWN_CHAR:
+                state = 0
+                continue
+            if cid == _SKIP_CHAR:
+                continue
+            positions.append(i)
+            state = delta.get(state * alphabet_size + cid, root_goto[cid])
+            if longest[state]:
+                match_state = state
+                while match_state:
+                    length = word_len[match_state]
+                    if length:
+                        seq_set.add(text[positions[-length]:i + 1])
+                    match_state = out_next[match_state]
+        return list(seq_set)
+
+    def search_many(self, texts: Iterable[str]) -> List[List[str]]:
+        """批量匹配敏感词"""
+        return [self.search(text) for text in texts]
+
+    def count(self, text: str) -> int:
+        """
+        统计文本中属于敏感词的有效字符数，重叠的敏感词只统计一次。
+
+        Args:
+            text: 文本
+        Returns:
+            敏感词字数，特殊字符不纳入统计
+        """
+        char_ids, root_goto, delta, longest = self.char_ids, self.root_goto, self.delta, self.longest
+        alphabet_size = self.alphabet_size
+        target_count = 0
+        valid_count = 0  # 已遍历的有效字符数
+        covered = 0  # 已统计到的有效字符位置
+        state = 0
+        for s in text:
+            cid = char_ids.get(s, _UNKNOWN_CHAR)
+            if cid is _UNKNOWN_CHAR:
+                state = 0
+                valid_count += 1
+                continue
+            if cid == _SKIP_CHAR:
+                continue
+            valid_count += 1
+            state = delta.get(state * alphabet_size + cid, root_goto[cid])
+            if longest[state]:
+                target_count += valid_count - max(valid_count - longest[state], covered)
+                covered = valid_count
+        return target_count
+
+    def count_many(self, texts: Iterable[str]) -> List[int]:
+        """批量统计敏感词字数"""
+        return [self.count(text) for text in texts]
@@ -1,27 +1,36 @@
 import os
 import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from loguru import logger
 import mimetypes
 from datetime import datetime
+from typing import Dict, Iterator, List
 
 from datamate.sql_manager.persistence_atction import TaskInfoPersistence
 
+# 并发扫描目录的线程数，目录扫描以IO等待为主
+SCAN_WORKERS = int(os.getenv("FILE_SCAN_WORKERS", str(min(32, (os.cpu_count() or 1) * 4))))
+
+
 class FileScanner:
     def __init__(self, dataset_id):
         self.dataset_id = dataset_id
         self.persistence = TaskInfoPersistence()
 
-    def get_existing_paths(self):
-        """
-        优化点1：一次性获取所有已存在的文件路径，存为 Set
-        """
-        logger.info("Fetching existing files from DB...")
-        existing_files = self.persistence.query_existing_files(self.dataset_id)
-        # fetchall 返回的是 list of tuples [('path1',), ('path2',)]
-        # 我们将其转换为 set {'path1', 'path2'} 以实现 O(1) 查找速度
-        existing_set = {row[0] for row in existing_files}
-        logger.info(f"Found {len(existing_set)} existing files in DB.")
-        return existing_set
+    def build_sample(self, file_path, file_name, stats):
+        f_type, _ = mimetypes.guess_type(file_path)
+        if not f_type:
+            f_type = os.path.splitext(file_name)[1]
+
+        # 构造 sample 格式
+        return {
+            "fileSize": stats.st_size,
+            "fileType": f_type,
+            "fileName": file_name,
+            "dataset_id": self.dataset_id,
+            "filePath": file_path,
+            "mtime": stats.st_mtime
+        }
 
     def prepare_file_data(self, sample, file_id):
         """
@@ -35,9 +44,10 @@ class FileScanner:
         file_path = str(sample.get("filePath"))
         create_time = datetime.now()
 
-        # 获取最后访问时间，增加异常处理
+        # 获取最后访问时间，优先使用扫描时已获取的元数据，增加异常处理
         try:
-            last_access_time = datetime.fromtimestamp(os.path.getmtime(file_path))
+            mtime = sample.get("mtime")
+            last_access_time = datetime.fromtimestamp(mtime if mtime is not None else os.path.getmtime(file_path))
         except (FileNotFoundError, OSError):
             last_access_time = create_time
 
@@ -56,72 +66,71 @@ class FileScanner:
             "updated_at": create_time
         }
 
-    def scan_and_process(self, root_dir, batch_size=5000):
-        logger.info(f"Scanning directory: {root_dir}")
-
-        # 1. 内存中收集扫描到的所有文件 {path: metadata_dict}
-        scanned_files_map = {}
-
-        for root, dirs, files in os.walk(root_dir):
-            for file in files:
-                if file.startswith('.'): continue
-
-                full_path = os.path.join(root, file)
-
-                # 预先收集元数据
-                try:
-                    stats = os.stat(full_path)
-                    f_type, _ = mimetypes.guess_type(full_path)
-                    if not f_type: f_type = os.path.splitext(file)[1]
-
-                    # 构造 sample 格式
-                    scanned_files_map[full_path] = {
-                        "fileSize": stats.st_size,
-                        "fileType": f_type,
-                        "fileName": file,
-                        "dataset_id": self.dataset_id,
-                        "filePath": full_path
-                    }
-                except OSError:
-                    continue
-
-        logger.info(f"Scanned {len(scanned_files_map)} files on disk.")
-
-        # 2. 获取数据库中已有的路径
-        existing_paths = self.get_existing_paths()
-
-        # 3. 内存做差集 (Set Difference) -> 找出需要新增的路径
-        scanned_paths_set = set(scanned_files_map.keys())
-        new_paths = list(scanned_paths_set - existing_paths)
-
-        logger.info(f"Need to insert {len(new_paths)} new files.")
-
+    def _scan_dir(self, dir_path):
+        """扫描单层目录，返回 (文件元数据列表, 子目录列表)"""
+        samples, sub_dirs = [], []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            sub_dirs.append(entry.path)
+                            continue
+                        if entry.name.startswith('.'):
+                            continue
+                        samples.append(self.build_sample(entry.path, entry.name, entry.stat()))
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"Scan directory {dir_path} failed: {e}")
+        return samples, sub_dirs
+
+    def iter_directory(self, root_dir) -> Iterator[Dict]:
+        """多线程按目录并发扫描，边扫描边返回文件元数据"""
+        with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+            pending = {executor.submit(self._scan_dir, root_dir)}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    samples, sub_dirs = future.result()
+                    pending.update(executor.submit(self._scan_dir, sub_dir) for sub_dir in sub_dirs)
+                    yield from samples
+
+    def insert_new_files(self, samples: List[Dict]) -> int:
+        """按批与数据库做反连接，只插入数据库中不存在的文件"""
+        samples_map = {sample["filePath"]: sample for sample in samples}
+        new_paths = self.persistence.query_new_file_paths(self.dataset_id, list(samples_map.keys()))
         if not new_paths:
-            logger.info("No new files to insert.")
-            return
-
-        # 4. 准备批量插入的数据
-        insert_batch = []
-        total_inserted = 0
+            return 0
+        records = [self.prepare_file_data(samples_map[path], str(uuid.uuid4())) for path in new_paths]
+        self.persistence.batch_insert_files(records)
+        return len(records)
 
-        for path in new_paths:
-            sample_data = scanned_files_map[path]
-            new_file_id = str(uuid.uuid4())
-
-            # 调用转换逻辑
-            record = self.prepare_file_data(sample_data, new_file_id)
-            insert_batch.append(record)
-
-            # 优化点3：分批执行，防止一次性数据包过大导致 SQL 报错
-            if len(insert_batch) >= batch_size:
-                self.persistence.batch_insert_files(insert_batch)
-                total_inserted += len(insert_batch)
-                logger.info(f"Progress: {total_inserted}/{len(new_paths)} inserted...")
-                insert_batch = [] # 清空列表
+    def scan_and_process(self, root_dir, batch_size=5000):
+        """
+        遍历整个导出目录，将数据库中不存在的文件（包括算子写出的切片等附属文件）登记到数据集中。
 
-        # 插入剩余的数据
-        if insert_batch:
-            self.persistence.batch_insert_files(insert_batch)
-            total_inserted += len(insert_batch)
+        Args:
+            root_dir: 导出目录
+            batch_size: 每批与数据库比对、插入的文件数
+        """
+        logger.info(f"Scanning directory: {root_dir}")
+        samples = self.iter_directory(root_dir)
 
-        logger.info(f"Done. Total inserted: {total_inserted}")
+        # 边扫描边分批比对与插入，内存中只保留一批文件的元数据
+        batch = []
+        total_scanned = 0
+        total_inserted = 0
+        for sample in samples:
+            batch.append(sample)
+            if len(batch) >= batch_size:
+                total_scanned += len(batch)
+                total_inserted += self.insert_new_files(batch)
+                logger.info(f"Progress: {total_scanned} scanned, {total_inserted} inserted...")
+                batch = []
+
+        if batch:
+            total_scanned += len(batch)
+            total_inserted += self.insert_new_files(batch)
+
+        logger.info(f"Done. Total scanned: {total_scanned}, total inserted: {total_inserted}")
@@ -1,18 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import copy
+import hashlib
 import json
 import os
 import ssl
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict
-from urllib.request import Request, urlopen
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from urllib.request import getproxies, proxy_bypass
 
-import requests
 import urllib3
 from loguru import logger
 
 from datamate.common.utils import decrypt
 
+# 单个算子实例同时发往LLM服务的最大请求数
+DEFAULT_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# 响应缓存条数，0表示不缓存
+DEFAULT_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "0"))
+DEFAULT_RETRY = 2
+DEFAULT_BACKOFF = 1.0
+DEFAULT_PROMPT = "你好"
+
 
 class LlmReq:
     # 定义常量用于解释错误码
@@ -20,27 +34,93 @@ class LlmReq:
     ERRORCODE_INVALID_RESPONSE = 83006
     ERRORCODE_SERVICE_UNAVAILABLE = 83007
 
+    # 连接池按访问端点在进程内共享，证书与密钥只在首次创建时加载
+    _pools: Dict[tuple, urllib3.PoolManager] = {}
+    _pools_lock = threading.Lock()
+
     def __init__(self, url: str = None, header: Dict = None, body: Dict = None, access_type: int = None,
-                 is_https: bool = False, is_certificate: bool = False, certificate_path: Path = None):
+                 is_https: bool = False, is_certificate: bool = False, certificate_path: Path = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, cache_size: int = DEFAULT_CACHE_SIZE):
         self.url = url
         self.header = header
         self.access_type = access_type
         self.is_https = is_https
-        self.context = self._load_certificate(certificate_path, is_certificate) if is_https else None
-        self.body = body
+        self.is_certificate = is_certificate
+        self.certificate_path = certificate_path
+        self.max_concurrency = max(int(max_concurrency), 1)
+        # 请求体模板，每次调用时复制后填入提示词，不修改共享状态
+        self.body = copy.deepcopy(body)
         if not self.body.get("messages", [])[0].get("content"):
-            self.body["messages"][0]["content"] = "你好"
+            self.body["messages"][0]["content"] = DEFAULT_PROMPT
+        self.cache_size = max(int(cache_size), 0)
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()
 
     def __call__(self, input_str: str) -> str:
         outputs = ''
         try:
-            self.body["messages"][0]["content"] = input_str
-            outputs = self._call_service()
+            outputs = self._cached_call(input_str)
         except KeyError as e:
             logger.error(f"The body format is not completed, error detail: {e}")
-        self.body["messages"][0]["content"] = "你好"
         return outputs
 
+    def batch_call(self, prompts: List[str], retry: int = DEFAULT_RETRY, backoff: float = DEFAULT_BACKOFF,
+                   max_concurrency: Optional[int] = None) -> List[str]:
+        """
+        并发调用LLM服务。
+
+        Args:
+            prompts: 提示词列表
+            retry: 服务不可用时的重试次数
+            backoff: 首次重试前的等待秒数，之后每次重试翻倍
+            max_concurrency: 同时发出的最大请求数，默认使用实例配置
+        Returns:
+            与提示词一一对应的模型输出，调用失败的位置为空字符串
+        """
+        if not prompts:
+            return []
+        workers = min(max_concurrency or self.max_concurrency, len(prompts))
+        if workers == 1:
+            return [self._call_with_retry(prompt, retry, backoff) for prompt in prompts]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda prompt: self._call_with_retry(prompt, retry, backoff), prompts))
+
+    def _call_with_retry(self, prompt: str, retry: int, backoff: float) -> str:
+        retry_time = 0
+        while True:
+            try:
+                return self._cached_call(prompt)
+            except KeyError as e:
+                logger.error(f"The body format is not completed, error detail: {e}")
+                return ''
+            except RuntimeError as e:
+                if (e.args and e.args[0] == self.ERRORCODE_INCOMPLETE_CONFIG) or retry_time >= retry:
+                    logger.warning(f"Request LLM error, details: {e}")
+                    return ''
+                time.sleep(backoff * (2 ** retry_time))
+                retry_time += 1
+
+    def _cached_call(self, prompt: str) -> str:
+        if not self.cache_size:
+            return self._call_service(self._build_body(prompt))
+
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        outputs = self._call_service(self._build_body(prompt))
+        with self._cache_lock:
+            self._cache[key] = outputs
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return outputs
+
+    def _build_body(self, prompt: str) -> Dict:
+        messages = list(self.body["messages"])
+        messages[0] = {**messages[0], "content": prompt}
+        return {**self.body, "messages": messages}
+
     @staticmethod
     def _load_certificate(certificate_path: Path, is_certificate: bool) -> ssl.SSLContext:
         context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
@@ -53,7 +133,7 @@ class LlmReq:
         return context
 
     @staticmethod
-    def _pool_manager():
+    def _pool_manager(maxsize: int):
         cert_file = os.getenv("RAY_TLS_SERVER_CERT", "/certPersonal/global/identity/global.crt")
         key_file = os.getenv("RAY_TLS_SERVER_KEY", "/certPersonal/global/identity/global.key")
         ca_crt = os.getenv("RAY_TLS_CA_CERT", "/certPersonal/global/trust/ca.crt")
@@ -70,49 +150,65 @@ class LlmReq:
                                            cert_reqs='CERT_REQUIRED',
                                            ca_certs=ca_crt,
                                            assert_hostname='edatamate',
-                                           ssl_version='TLSv1_2')
+                                           ssl_version='TLSv1_2',
+                                           maxsize=maxsize)
         return pool_manager
 
-    def _call_service(self):
-        if not all([self.url, self.header, self.body.get("messages", [])[0].get("content")]):
+    def _proxy_url(self) -> Optional[str]:
+        """与urllib、requests一致，按HTTP(S)_PROXY、NO_PROXY环境变量确定访问外部服务使用的代理"""
+        target = urlparse(self.url or "")
+        if not target.hostname or proxy_bypass(target.hostname):
+            return None
+        return getproxies().get(target.scheme or ("https" if self.is_https else "http"))
+
+    def _external_pool_manager(self, maxsize: int, proxy_url: Optional[str] = None):
+        pool_kw = {"maxsize": maxsize}
+        if self.is_https:
+            pool_kw.update(ssl_context=self._load_certificate(self.certificate_path, self.is_certificate),
+                           assert_hostname=False)
+        if not proxy_url:
+            return urllib3.PoolManager(**pool_kw)
+        proxy = urllib3.util.parse_url(proxy_url)
+        proxy_headers = urllib3.make_headers(proxy_basic_auth=proxy.auth) if proxy.auth else None
+        return urllib3.ProxyManager(proxy_url, proxy_headers=proxy_headers, **pool_kw)
+
+    def _get_pool(self) -> urllib3.PoolManager:
+        proxy_url = None
+        if self.access_type:
+            proxy_url = self._proxy_url()
+            key = ("external", bool(self.is_https), bool(self.is_certificate), str(self.certificate_path), proxy_url)
+        else:
+            key = ("internal",)
+        pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+        with self._pools_lock:
+            if key not in self._pools:
+                maxsize = max(self.max_concurrency, DEFAULT_MAX_CONCURRENCY)
+                self._pools[key] = self._external_pool_manager(maxsize, proxy_url) if self.access_type \
+                    else self._pool_manager(maxsize)
+            return self._pools[key]
+
+    def _call_service(self, body: Dict):
+        if not all([self.url, self.header, body.get("messages", [])[0].get("content")]):
             logger.error("LLM is not configured completely")
             raise RuntimeError(self.ERRORCODE_INCOMPLETE_CONFIG, "LLM is not configured completely") from None
-        if not self.access_type:
-            try:
-                pool_manager = self._pool_manager()
-                response = pool_manager.request(
-                    "POST",
-                    url=self.url,
-                    body=json.dumps(self.body).encode(),
-                    headers=self.header
-                )
+        try:
+            response = self._get_pool().request(
+                "POST",
+                url=self.url,
+                body=json.dumps(body).encode(),
+                headers=self.header
+            )
+            if not self.access_type:
                 logger.info(f"Response status code: {response.status}")
-                response_json = json.loads(response.data.decode('utf-8'))
-                outputs = response_json.get("choices", [])[0].get("message", {}).get("content")
-                if not outputs:
-                    logger.error("Invalid response format for LLM, missing the 'prompt' key word")
-                    raise RuntimeError(self.ERRORCODE_INVALID_RESPONSE,
-                                       "Invalid response format for LLM, missing the 'prompt' key word") from None
-                return outputs
-            except Exception as e:
-                logger.error(f"LLM service is not available, error detail: {e}")
-                raise RuntimeError(self.ERRORCODE_SERVICE_UNAVAILABLE, "LLM service is not available") from None
-        if self.access_type:
-            try:
-                if self.is_https:
-                    req = Request(url=self.url, data=json.dumps(self.body).encode(), headers=self.header, method="POST")
-                    response_json = urlopen(req, context=self.context).read().decode("utf-8")
-                    response = json.loads(response_json)
-                else:
-                    response = requests.post(url=self.url, data=json.dumps(self.body), headers=self.header,
-                                             stream=False).json()
-                outputs = response.get("choices", [])[0].get("message", {}).get("content")
-                if not outputs:
-                    logger.error("Invalid response format for LLM, missing the 'prompt' key word")
-                    raise RuntimeError(self.ERRORCODE_INVALID_RESPONSE,
-                                       "Invalid response format for LLM, missing the 'prompt' key word") from None
-                return outputs
-            except Exception as e:
-                logger.error(f"LLM service is not available, error detail: {e}")
-                raise RuntimeError(self.ERRORCODE_SERVICE_UNAVAILABLE, "LLM service is not available") from None
-        return None  # 确保在所有情况下都返回
+            response_json = json.loads(response.data.decode('utf-8'))
+            outputs = response_json.get("choices", [])[0].get("message", {}).get("content")
+            if not outputs:
+                logger.error("Invalid response format for LLM, missing the 'prompt' key word")
+                raise RuntimeError(self.ERRORCODE_INVALID_RESPONSE,
+                                   "Invalid response format for LLM, missing the 'prompt' key word") from None
+            return outputs
+        except Exception as e:
+            logger.error(f"LLM service is not available, error detail: {e}")
+            raise RuntimeError(self.ERRORCODE_SERVICE_UNAVAILABLE, "LLM service is not available") from None
@@ -0,0 +1,102 @@
+# -- encoding: utf-8 --
+"""
+Description: 任务级共享对象句柄。
+    Ray已初始化时，以具名Actor的形式在同一任务的所有算子Actor间共享；
+    否则退化为进程内单例，便于单机调试。
+    任务级Actor的名称带有任务实例ID，执行器在任务结束时统一清理。
+Create: 2025/12/01
+"""
+from threading import Lock
+from typing import Any, Dict, Tuple
+
+import ray
+from loguru import logger
+from ray.exceptions import RayActorError
+
+_LOCAL_INSTANCES: Dict[str, Tuple[Any, Lock]] = {}
+_LOCAL_LOCK = Lock()
+# 任务级共享Actor的名称前缀
+TASK_ACTOR_PREFIX = "datamate_task"
+
+
+def task_actor_name(instance_id: str, name: str) -> str:
+    """同一任务实例内共享的Actor名称，不同任务之间互不复用"""
+    return f"{TASK_ACTOR_PREFIX}_{instance_id}_{name}"
+
+
+class SharedActor:
+    """按名称共享的有状态对象。
+
+    同名对象在整个任务内只会被创建一次，所有方法调用串行执行。
+    Actor异常退出时会按相同的构造参数重新创建，对象需自行从持久化存储中恢复状态。
+    """
+
+    MAX_RETRIES = 1
+
+    def __init__(self, cls, name: str, *args, **kwargs):
+        self._cls = cls
+        self._name = name
+        self._args = args
+        self._kwargs = kwargs
+        self._handle = None
+        self._lock = None
+
+    @property
+    def name(self):
+        return self._name
+
+    @classmethod
+    def for_task(cls, instance_id: str, actor_cls, name: str, *args, **kwargs) -> "SharedActor":
+        """创建任务级共享对象句柄，需由执行器在任务结束时调用release_task_actors清理"""
+        return cls(actor_cls, task_actor_name(instance_id, name), *args, **kwargs)
+
+    @staticmethod
+    def release_task_actors(instance_id: str):
+        """销毁该任务实例创建的全部共享对象"""
+        prefix = task_actor_name(instance_id, "")
+        if ray.is_initialized():
+            for name in ray.util.list_named_actors():
+                if not name.startswith(prefix):
+                    continue
+                try:
+                    ray.kill(ray.get_actor(name))
+                    logger.info(f"Shared actor {name} released.")
+                except ValueError:
+                    continue
+        with _LOCAL_LOCK:
+            for name in [name for name in _LOCAL_INSTANCES if name.startswith(prefix)]:
+                del _LOCAL_INSTANCES[name]
+
+    def call(self, method: str, *args, **kwargs):
+        """调用共享对象的方法并返回结果"""
+        attempt = 0
+        while True:
+            handle = self._get_handle()
+            try:
+                if self._lock is None:
+                    return ray.get(getattr(handle, method).remote(*args, **kwargs))
+                with self._lock:
+                    return getattr(handle, method)(*args, **kwargs)
+            except RayActorError as e:
+                self._handle = None
+                if attempt >= self.MAX_RETRIES:
+                    raise
+                attempt += 1
+                logger.warning(f"Shared actor {self._name} is unavailable, recreating it: {e}")
+
+    def _get_handle(self):
+        if self._handle is not None:
+            return self._handle
+
+        if ray.is_initialized():
+            actor_cls = ray.remote(self._cls)
+            # 具名Actor不随创建它的算子Actor退出，由执行器在任务结束时销毁
+            self._handle = actor_cls.options(name=self._name, get_if_exists=True, num_cpus=0, lifetime="detached",
+                                             max_restarts=0).remote(*self._args, **self._kwargs)
+            self._lock = None
+        else:
+            with _LOCAL_LOCK:
+                if self._name not in _LOCAL_INSTANCES:
+                    _LOCAL_INSTANCES[self._name] = (self._cls(*self._args, **self._kwargs), Lock())
+                self._handle, self._lock = _LOCAL_INSTANCES[self._name]
+        return self._handle
@@ -0,0 +1,197 @@
+# -- encoding: utf-8 --
+
+"""
+Description: 病理图片分块切片引擎，供 SimpleSlicer 与 AnnotationSlicer 共用
+Create: 2025/02/08 11:00
+"""
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+from loguru import logger
+from openslide import OpenSlide
+
+from datamate.common.utils import bytes_transform
+
+# 并发读取切片的线程数，每个线程持有独立的 OpenSlide 句柄
+READ_WORKERS = int(os.getenv("SLIDE_READ_WORKERS", str(min(8, os.cpu_count() or 1))))
+# 并发写出切片文件的线程数
+WRITE_WORKERS = int(os.getenv("SLIDE_WRITE_WORKERS", "4"))
+# 已编码、等待写出的切片数上限，用于限制内存占用
+MAX_PENDING_WRITES = int(os.getenv("SLIDE_MAX_PENDING_WRITES", "256"))
+# 同一行相邻切片合并读取时，单次读取的最大宽度（像素）
+MAX_BAND_WIDTH = int(os.getenv("SLIDE_MAX_BAND_WIDTH", "8192"))
+# 计算组织掩码的缩略图最长边（像素）
+THUMBNAIL_SIZE = int(os.getenv("SLIDE_THUMBNAIL_SIZE", "2048"))
+
+
+class Tile(NamedTuple):
+    """待切片区域，patch_no 为输出文件序号"""
+    patch_no: int
+    x: int
+    y: int
+    w: int
+    h: int
+
+
+def grid_tiles(dimensions: Tuple[int, int], target_size: Tuple[int, int], overlap: float) -> List[Tile]:
+    """按给定规格与重叠比例生成网格切片，序号与逐列遍历的顺序一致"""
+    w, h = target_size
+    stride_x, stride_y = map(lambda x: int(x * (1 - overlap)), target_size)
+    tiles = []
+    for x in range(0, dimensions[0] - w + 1, stride_x):
+        for y in range(0, dimensions[1] - h + 1, stride_y):
+            tiles.append(Tile(len(tiles) + 1, x, y, w, h))
+    return tiles
+
+
+def tissue_mask(slide: OpenSlide, max_size: int = THUMBNAIL_SIZE) -> Tuple[np.ndarray, float, float]:
+    """
+    基于缩略图饱和度的 Otsu 阈值计算组织掩码
+
+    Return:
+        (掩码积分图, x 方向缩放比, y 方向缩放比)
+    """
+    width, height = slide.dimensions
+    thumbnail = np.asarray(slide.get_thumbnail((max_size, max_size)).convert("RGB"))
+    saturation = cv2.cvtColor(thumbnail, cv2.COLOR_RGB2HSV)[:, :, 1]
+    _, mask = cv2.threshold(saturation, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    scale_x = mask.shape[1] / width
+    scale_y = mask.shape[0] / height
+    return cv2.integral(mask), scale_x, scale_y
+
+
+def filter_tissue_tiles(slide: OpenSlide, tiles: List[Tile], min_ratio: float) -> List[Tile]:
+    """跳过组织占比低于 min_ratio 的背景切片，保留的切片按原顺序重新编号"""
+    if min_ratio <= 0 or not tiles:
+        return tiles
+    integral, scale_x, scale_y = tissue_mask(slide)
+    max_y, max_x = integral.shape[0] - 1, integral.shape[1] - 1
+
+    kept = []
+    for tile in tiles:
+        x0 = min(int(tile.x * scale_x), max_x - 1)
+        y0 = min(int(tile.y * scale_y), max_y - 1)
+        x1 = min(max(int(np.ceil((tile.x + tile.w) * scale_x)), x0 + 1), max_x)
+        y1 = min(max(int(np.ceil((tile.y + tile.h) * scale_y)), y0 + 1), max_y)
+        tissue = integral[y1, x1] - integral[y0, x1] - integral[y1, x0] + integral[y0, x0]
+        if tissue >= min_ratio * (x1 - x0) * (y1 - y0):
+            kept.append(tile._replace(patch_no=len(kept) + 1))
+
+    logger.info(f"Tissue mask kept {len(kept)} of {len(tiles)} tiles.")
+    return kept
+
+
+def group_bands(tiles: Iterable[Tile], max_band_width: int = MAX_BAND_WIDTH) -> List[List[Tile]]:
+    """将同一行中相邻或重叠的切片合并为一次读取的行带"""
+    bands: List[List[Tile]] = []
+    for tile in sorted(tiles, key=lambda t: (t.y, t.h, t.x)):
+        band = bands[-1] if bands else None
+        if (band and band[0].y == tile.y and band[0].h == tile.h
+                and tile.x <= band[-1].x + band[-1].w
+                and tile.x + tile.w - band[0].x <= max_band_width):
+            band.append(tile)
+        else:
+            bands.append([tile])
+    return bands
+
+
+class SlideTiler:
+    """
+    多线程分块切片：按行带并发读取区域并编码为 PNG，再交给写出线程池落盘
+    """
+
+    def __init__(self, slide_path: str, read_workers: int = READ_WORKERS, write_workers: int = WRITE_WORKERS,
+                 max_pending_writes: int = MAX_PENDING_WRITES, max_band_width: int = MAX_BAND_WIDTH):
+        self.slide_path = slide_path
+        self.read_workers = max(read_workers, 1)
+        self.write_workers = max(write_workers, 1)
+        self.max_pending_writes = max(max_pending_writes, 1)
+        self.max_band_width = max_band_width
+        self._local = threading.local()
+        self._slides: List[OpenSlide] = []
+        self._slides_lock = threading.Lock()
+
+    def _get_slide(self) -> OpenSlide:
+        slide: Optional[OpenSlide] = getattr(self._local, "slide", None)
+        if slide is None:
+            slide = OpenSlide(self.slide_path)
+            self._local.slide = slide
+            with self._slides_lock:
+                self._slides.append(slide)
+        return slide
+
+    def _read_band(self, band: List[Tile]) -> List[Tuple[int, bytes]]:
+        """一次读取整条行带，按切片取视图后编码"""
+        x0, y0 = band[0].x, band[0].y
+        width = band[-1].x + band[-1].w - x0
+        region = self._get_slide().read_region((x0, y0), 0, (width, band[0].h))
+        region_np = np.asarray(region.convert("RGB"))
+        return [
+            (tile.patch_no, bytes_transform.numpy_to_bytes(region_np[:, tile.x - x0:tile.x - x0 + tile.w], ".png"))
+            for tile in band
+        ]
+
+    def _iter_patches(self, bands: List[List[Tile]]) -> Iterator[Tuple[int, bytes]]:
+        with ThreadPoolExecutor(max_workers=self.read_workers) as executor:
+            band_iter = iter(bands)
+            pending = set()
+            for band in band_iter:
+                pending.add(executor.submit(self._read_band, band))
+                if len(pending) >= self.read_workers * 2:
+                    break
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    band = next(band_iter, None)
+                    if band is not None:
+                        pending.add(executor.submit(self._read_band, band))
+                    yield from future.result()
+
+    def run(self, tiles: List[Tile], write_patch: Callable[[int, bytes], None]) -> int:
+        """
+        并发切片并写出
+
+        Params:
+            tiles: 待切片区域
+            write_patch: 写出单个切片的回调，参数为 (patch_no, PNG 字节)
+        Return:
+            写出的切片数
+        """
+        if not tiles:
+            return 0
+        bands = group_bands(tiles, self.max_band_width)
+        slots = threading.BoundedSemaphore(self.max_pending_writes)
+        errors: List[Exception] = []
+
+        def _write(patch_no: int, data: bytes):
+            try:
+                write_patch(patch_no, data)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                slots.release()
+
+        patch_num = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.write_workers) as writer:
+                for patch_no, data in self._iter_patches(bands):
+                    if errors:
+                        break
+                    slots.acquire()
+                    writer.submit(_write, patch_no, data)
+                    patch_num += 1
+        finally:
+            self.close()
+        if errors:
+            raise errors[0]
+        return patch_num
+
+    def close(self):
+        with self._slides_lock:
+            slides, self._slides = self._slides, []
+        for slide in slides:
+            slide.close()
@@ -6,9 +6,8 @@ import time
 import traceback
 import uuid
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 
-import cv2
 import numpy as np
 from loguru import logger
 from unstructured.partition.auto import partition
@@ -16,14 +15,17 @@ from unstructured.partition.auto import partition
 from datamate.common.error_code import ERROR_CODE_TABLE, UNKNOWN_ERROR_CODE
 from datamate.common.utils.llm_request import LlmReq
 from datamate.common.utils.registry import Registry
-from datamate.common.utils import check_valid_path
+from datamate.common.utils import bytes_to_numpy, check_valid_path, numpy_to_bytes
 from datamate.core.constant import Fields
-from datamate.sql_manager.persistence_atction import TaskInfoPersistence
+from datamate.sql_manager.persistence_atction import TaskResultWriter
 
 OPERATORS = Registry('Operators')
 
 FAILED_STATUS = "FAILED"
 SUCCESS_STATUS = "COMPLETED"
+# 算子间传递的已解码图片帧与其是否有尚未编码写回data的修改，仅在算子进程内使用，不作为数据集的列
+IMAGE_FRAME_KEY = "_image_frame"
+IMAGE_DIRTY_KEY = "_image_dirty"
 
 
 def get_exception_info(e):
@@ -54,6 +56,8 @@ class BaseOp:
 
     use_model = False
     custom_ops = False
+    # 算子是否通过load_image/update_image直接处理已解码的图片帧，为False时执行前先把图片帧编码写回data
+    support_image_frame = False
 
     def __init__(self, *args, **kwargs):
         self.accelerator = kwargs.get('accelerator', "cpu")
@@ -74,6 +78,15 @@ class BaseOp:
         self.export_path_key = kwargs.get('export_path_key', "export_path")
         self.ext_params_key = kwargs.get('ext_params_key', "ext_params")
         self.target_type_key = kwargs.get('target_type_key', "target_type")
+        # 为True时执行后保留图片帧，供同一Actor内的后续算子继续使用
+        self.hold_image_frame = False
+
+    def __del__(self):
+        # Actor正常退出时刷新本进程缓冲的执行结果
+        try:
+            TaskResultWriter.flush_instance()
+        except Exception as e:
+            logger.warning(f"Flush task results on teardown failed: {e}")
 
     @property
     def name(self):
@@ -129,6 +142,15 @@ class BaseOp:
         """执行函数（子类实现）"""
         raise NotImplementedError("This is in BaseOp, plese re-define this method in Sub-classes")
 
+    def execute_batch(self, samples: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """批量执行函数（子类可选实现），返回与输入一一对应的样本列表"""
+        raise NotImplementedError("This is in BaseOp, plese re-define this method in Sub-classes")
+
+    @classmethod
+    def is_batch_op(cls) -> bool:
+        """算子是否实现了批量执行函数"""
+        return cls.execute_batch.__qualname__ != "BaseOp.execute_batch"
+
     def fill_sample_params(self, sample: Dict[str, Any], **kwargs):
         if not sample.get(self.text_key, None):
             sample[self.text_key] = ""
@@ -158,14 +180,41 @@ class BaseOp:
                 sample[self.text_key] = content.decode("utf-8-sig").replace("\r\n", "\n")
                 sample[self.data_key] = b""
         elif filetype in ['jpg', 'jpeg', 'png', 'bmp']:
-            image_np = cv2.imdecode(np.fromfile(filepath, dtype=np.uint8), -1)
-            if image_np.size:
-                data = cv2.imencode(f".{filetype}", image_np)[1]
-                image_bytes = data.tobytes()
+            # 保留原始编码，首次使用图片帧时再解码
+            with open(filepath, 'rb') as f:
+                image_bytes = f.read()
+            if image_bytes:
                 sample[self.data_key] = image_bytes
                 sample[self.text_key] = ""
         return sample
 
+    def load_image(self, sample: Dict[str, Any]) -> Optional[np.ndarray]:
+        """获取样本的已解码图片，同一Actor内相邻的图片算子只解码一次"""
+        if not sample.get(self.data_key):
+            sample.pop(IMAGE_FRAME_KEY, None)
+            sample.pop(IMAGE_DIRTY_KEY, None)
+            return None
+        image_np = sample.get(IMAGE_FRAME_KEY)
+        if image_np is None:
+            image_np = bytes_to_numpy(sample[self.data_key])
+            sample[IMAGE_FRAME_KEY] = image_np
+            sample[IMAGE_DIRTY_KEY] = False
+        return image_np
+
+    @staticmethod
+    def update_image(sample: Dict[str, Any], image_np: np.ndarray):
+        """写入处理后的图片帧，编码推迟到落盘或样本离开当前Actor前"""
+        sample[IMAGE_FRAME_KEY] = image_np
+        sample[IMAGE_DIRTY_KEY] = True
+
+    def flush_image(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """按当前文件类型把有修改的图片帧编码写回data，并从样本中移除图片帧"""
+        image_np = sample.pop(IMAGE_FRAME_KEY, None)
+        dirty = sample.pop(IMAGE_DIRTY_KEY, False)
+        if dirty and image_np is not None and sample.get(self.data_key):
+            sample[self.data_key] = numpy_to_bytes(image_np, "." + sample[self.filetype_key])
+        return sample
+
     def read_file_first(self, sample):
         if self.is_first_op:
             self.read_file(sample)
@@ -173,7 +222,7 @@ class BaseOp:
     @staticmethod
     def save_file_and_db(sample):
         if FileExporter().execute(sample):
-            TaskInfoPersistence().persistence_task_info(sample)
+            TaskResultWriter.get_instance().persistence_task_info(sample)
         return sample
 
 
@@ -187,6 +236,8 @@ class Mapper(BaseOp):
             return sample
 
         self.fill_sample_params(sample, **kwargs)
+        if not self.support_image_frame:
+            self.flush_image(sample)
         execute_status = FAILED_STATUS
         try:
             sample = self.execute(sample)
@@ -199,15 +250,55 @@ class Mapper(BaseOp):
             sample["execute_status"] = execute_status
             sample[self.filesize_key] = "0"
             sample[self.filetype_key] = ""
-            TaskInfoPersistence().update_task_result(sample)
+            task_info = TaskResultWriter.get_instance()
+            task_info.update_task_result(sample)
+            # 算子执行失败会中断任务，立即刷新缓冲区中的执行结果
+            task_info.flush()
             raise e
 
         sample["execute_status"] = execute_status
+        if not self.hold_image_frame:
+            self.flush_image(sample)
+        return self.save_last_sample(sample)
+
+    def call_batch(self, samples: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """批量执行入口，批量执行失败时逐条执行以定位失败的文件"""
+        pending = []
+        for sample in samples:
+            # 该算子前已有算子执行该文件失败
+            if sample.get(Fields.result) is False:
+                continue
+            self.fill_sample_params(sample, **kwargs)
+            if not self.support_image_frame:
+                self.flush_image(sample)
+            # 批量执行作用于样本副本，失败后逐条重试时使用未被修改的原样本
+            pending.append(dict(sample))
+
+        try:
+            results = self.execute_batch(pending) if pending else []
+        except Exception as e:
+            logger.warning(f"Ops named {self.name} batch map failed, retry file by file. Error Info: {e}")
+            return [self(sample, **kwargs) for sample in samples]
+
+        results_iter = iter(results)
+        outputs = []
+        for sample in samples:
+            if sample.get(Fields.result) is False:
+                outputs.append(sample)
+                continue
+            sample = next(results_iter)
+            sample["execute_status"] = SUCCESS_STATUS
+            if not self.hold_image_frame:
+                self.flush_image(sample)
+            outputs.append(self.save_last_sample(sample))
+        return outputs
+
+    def save_last_sample(self, sample: Dict[str, Any]) -> Dict[str, Any]:
         # 加载文件成功执行信息到数据库
         if self.is_last_op:
             # 文件无内容会被过滤
             if sample[self.text_key] == "" and sample[self.data_key] == b"":
-                task_info = TaskInfoPersistence()
+                task_info = TaskResultWriter.get_instance()
                 sample[self.filesize_key] = "0"
                 sample[self.filetype_key] = ""
                 task_info.update_task_result(sample)
@@ -246,7 +337,7 @@ class Slicer(BaseOp):
             sample["execute_status"] = execute_status
             sample[self.filesize_key] = "0"
             sample[self.filetype_key] = ""
-            TaskInfoPersistence().update_task_result(sample)
+            TaskResultWriter.get_instance().update_task_result(sample)
             return [sample]
 
         self.load_sample_to_sample(sample, sample_list)
@@ -335,13 +426,48 @@ class Filter(BaseOp):
                          f"{str(get_exception_info(e))}")
             sample[self.filesize_key] = "0"
             sample[self.filetype_key] = ""
-            TaskInfoPersistence().update_task_result(sample)
+            task_info = TaskResultWriter.get_instance()
+            task_info.update_task_result(sample)
+            # 算子执行失败会中断任务，立即刷新缓冲区中的执行结果
+            task_info.flush()
             raise e
 
         sample["execute_status"] = execute_status
+        return self.keep_sample(sample)
+
+    def call_batch(self, samples: List[Dict[str, Any]], **kwargs) -> List[Dict[str, Any]]:
+        """批量执行入口，返回保留的文件；批量执行失败时逐条执行以定位失败的文件"""
+        pending = []
+        for sample in samples:
+            # 该算子前已有算子执行该文件失败
+            if sample.get(Fields.result) is False:
+                continue
+            self.fill_sample_params(sample, **kwargs)
+            # 批量执行作用于样本副本，失败后逐条重试时使用未被修改的原样本
+            pending.append(dict(sample))
+
+        try:
+            results = self.execute_batch(pending) if pending else []
+        except Exception as e:
+            logger.warning(f"Ops named {self.name} batch filter failed, retry file by file. Error Info: {e}")
+            return [sample for sample in samples if self(sample, **kwargs)]
+
+        results_iter = iter(results)
+        outputs = []
+        for sample in samples:
+            if sample.get(Fields.result) is False:
+                outputs.append(sample)
+                continue
+            sample = next(results_iter)
+            sample["execute_status"] = SUCCESS_STATUS
+            if self.keep_sample(sample):
+                outputs.append(sample)
+        return outputs
+
+    def keep_sample(self, sample: Dict[str, Any]) -> bool:
         # 文件无内容会被过滤
         if sample[self.text_key] == "" and sample[self.data_key] == b"":
-            task_info = TaskInfoPersistence()
+            task_info = TaskResultWriter.get_instance()
             sample[self.filesize_key] = "0"
             sample[self.filetype_key] = ""
             task_info.update_task_result(sample)
@@ -442,6 +568,8 @@ class FileExporter(BaseOp):
         self.medical_support_ext = kwargs.get("medical_support_ext", ['svs', 'tif', 'tiff'])
 
     def execute(self, sample: Dict[str, Any]):
+        # 图片在整个处理流程中只在落盘前编码一次
+        self.flush_image(sample)
         file_name = sample[self.filename_key]
         file_type = sample[self.filetype_key]
 
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from typing import Set, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+from ray import data as rd
+
+from datamate.core.base_op import FAILED_STATUS, SUCCESS_STATUS
+from datamate.sql_manager.persistence_atction import TaskInfoPersistence
+
+SOURCE_FILE_ID = "sourceFileId"
+# 未补齐源文件信息时，源文件ID即为文件ID
+FILE_ID = "fileId"
+
+
+def drop_completed_files(table: pa.Table, completed_ids: pa.Array) -> pa.Table:
+    """过滤掉已执行成功的源文件"""
+    id_column = next((name for name in (SOURCE_FILE_ID, FILE_ID) if name in table.column_names), None)
+    if id_column is None:
+        logger.warning(f"Neither {SOURCE_FILE_ID} nor {FILE_ID} found in dataset, skip dropping completed files.")
+        return table
+    source_file_ids = table[id_column].cast(pa.string())
+    completed = pc.fill_null(pc.is_in(source_file_ids, value_set=completed_ids), False)
+    return table.filter(pc.invert(completed))
+
+
+class CleanResultCheckpointer:
+    """
+    基于清洗结果表的断点续跑。
+
+    同一任务实例中已执行成功的源文件会记录在 t_clean_result 中，重新提交任务时在第一个算子执行前过滤掉这些文件；
+    上次执行存在失败记录时清理这些记录，失败的文件会被重新执行。
+    """
+
+    def __init__(self, instance_id: str):
+        self.instance_id = instance_id
+        self.persistence = TaskInfoPersistence()
+
+    def load_file_results(self) -> Tuple[Set[str], bool]:
+        """返回 (已执行成功的源文件ID, 是否存在执行失败的记录)"""
+        completed_ids, has_failed = set(), False
+        for src_file_id, status in self.persistence.query_file_results(self.instance_id):
+            if status == SUCCESS_STATUS:
+                completed_ids.add(str(src_file_id))
+            elif status == FAILED_STATUS:
+                has_failed = True
+        return completed_ids, has_failed
+
+    def filter_completed(self, dataset: rd.Dataset) -> rd.Dataset:
+        completed_ids, has_failed = self.load_file_results()
+        # 仅在续跑上次存在失败记录的任务时清理，首次执行无需删除
+        if has_failed:
+            logger.info(f"instance_id: {self.instance_id}, failed files of the last run will be executed again.")
+            self.persistence.delete_failed_results(self.instance_id)
+        if not completed_ids:
+            return dataset
+
+        logger.info(f"instance_id: {self.instance_id}, resume from checkpoint, "
+                    f"{len(completed_ids)} completed files will be skipped.")
+        return dataset.map_batches(drop_completed_files,
+                                   fn_kwargs={"completed_ids": pa.array(sorted(completed_ids), type=pa.string())},
+                                   batch_format="pyarrow",
+                                   num_cpus=0.05)
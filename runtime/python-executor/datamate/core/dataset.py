@@ -10,6 +10,9 @@ from abc import ABC, abstractmethod
 
 import pyarrow as pa
 from enum import Enum
+from typing import Any, Dict, List
+
+import numpy as np
 from loguru import logger
 from ray import data as rd
 
@@ -21,6 +24,9 @@ from core.base_op import Filter as RELATIVE_Filter, Mapper as RELATIVE_Mapper, S
 
 rd.DataContext.get_current().enable_progress_bars = False
 
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_BATCH_FORMAT = "pyarrow"
+
 
 class Formatters(Enum):
     """
@@ -83,6 +89,60 @@ def preprocess_dataset(dataset: rd.Dataset, cfg) -> rd.Dataset:
     return dataset
 
 
+def batch_to_rows(batch) -> List[Dict[str, Any]]:
+    """map_batches的输入批次转为样本列表"""
+    if isinstance(batch, pa.Table):
+        return batch.to_pylist()
+    columns = list(batch.keys())
+    num_rows = len(batch[columns[0]]) if columns else 0
+    return [{column: batch[column][i] for column in columns} for i in range(num_rows)]
+
+
+def rows_to_batch(rows: List[Dict[str, Any]], input_columns: List[str] = None) -> Dict[str, np.ndarray]:
+    """样本列表转为列式批次，使用object类型避免字节、字典等字段被错误推断
+
+    样本列表为空时按输入批次的列input_columns返回0行批次，避免产生没有列的数据块
+    """
+    if not rows:
+        return {column: np.empty(0, dtype=object) for column in input_columns or []}
+    columns = {}
+    for row in rows:
+        for column in row.keys():
+            columns.setdefault(column, np.empty(len(rows), dtype=object))
+    for i, row in enumerate(rows):
+        for column, values in columns.items():
+            values[i] = row.get(column)
+    return columns
+
+
+class BatchOpWrapper:
+    """实现了execute_batch的算子在map_batches中的执行入口"""
+
+    def __init__(self, operators_cls, **init_kwargs):
+        self.op = operators_cls(**init_kwargs)
+
+    def __call__(self, batch, **kwargs):
+        rows = self.op.call_batch(batch_to_rows(batch), **kwargs)
+        input_columns = batch.column_names if isinstance(batch, pa.Table) else list(batch.keys())
+        return rows_to_batch(rows, input_columns)
+
+
+class FusedMapper:
+    """融合后的Mapper，在同一个Actor内依次执行多个算子，避免样本在多个Actor池之间序列化传输"""
+
+    def __init__(self, operators_cls_list, init_kwargs_list):
+        self.ops = [operators_cls(**init_kwargs)
+                    for operators_cls, init_kwargs in zip(operators_cls_list, init_kwargs_list)]
+        # 组内算子之间直接传递已解码的图片帧，由最后一个算子编码写回
+        for op in self.ops[:-1]:
+            op.hold_image_frame = True
+
+    def __call__(self, sample: Dict[str, Any], **kwargs):
+        for op in self.ops:
+            sample = op(sample, **kwargs)
+        return sample
+
+
 class RayDataset(BasicDataset):
 
     def __init__(self,
@@ -119,10 +179,50 @@ class RayDataset(BasicDataset):
             init_kwargs["instance_id"] = kwargs.get("instance_id", str(uuid.uuid4()))
             init_kwargs_list.append(init_kwargs)
 
-        for cls_id, operators_cls in enumerate(operators_cls_list):
-            self._run_single_op(operators_cls, init_kwargs_list[cls_id], **kwargs)
+        if checkpointer is not None:
+            self.data = checkpointer.filter_completed(self.data)
+
+        fused_plan = self.plan_fusion(operators_cls_list, init_kwargs_list)
+        logger.info("Ops execution plan: " + " -> ".join(
+            "[" + " + ".join(init_kwargs_list[cls_id]["op_name"] for cls_id in group) + "]"
+            for group in fused_plan))
+
+        for group in fused_plan:
+            if len(group) == 1:
+                self._run_single_op(operators_cls_list[group[0]], init_kwargs_list[group[0]], **kwargs)
+            else:
+                self._run_fused_ops([operators_cls_list[cls_id] for cls_id in group],
+                                    [init_kwargs_list[cls_id] for cls_id in group], **kwargs)
         return self
 
+    @staticmethod
+    def is_fusible_op(operators_cls, init_kwargs) -> bool:
+        """仅使用CPU的轻量级Mapper可以与相邻算子融合"""
+        return (issubclass(operators_cls, (Mapper, RELATIVE_Mapper))
+                and not operators_cls.is_batch_op()
+                and not operators_cls.use_model
+                and init_kwargs.get("npu", 0) <= 0
+                and init_kwargs.get("accelerator", "cpu") == "cpu")
+
+    def plan_fusion(self, operators_cls_list, init_kwargs_list) -> List[List[int]]:
+        """将连续的、资源需求一致的可融合Mapper划分为一组，返回每组算子的下标"""
+        fusion_enabled = os.getenv("OP_FUSION_ENABLED", "true").lower() == "true"
+        plan = []
+        last_key = None
+        for cls_id, (operators_cls, init_kwargs) in enumerate(zip(operators_cls_list, init_kwargs_list)):
+            if not fusion_enabled or not self.is_fusible_op(operators_cls, init_kwargs):
+                plan.append([cls_id])
+                last_key = None
+                continue
+            resources, _, memory = self._get_op_resources(init_kwargs)
+            fusion_key = (tuple(sorted(resources.items())), memory)
+            if last_key is not None and fusion_key == last_key:
+                plan[-1].append(cls_id)
+            else:
+                plan.append([cls_id])
+            last_key = fusion_key
+        return plan
+
     def load_ops_module(self, op_name):
         '''
         加载算子模块
@@ -151,9 +251,8 @@ class RayDataset(BasicDataset):
             res = None
         return res
 
-    def _run_single_op(self, operators_cls, init_kwargs, **kwargs):
-        max_actor_nums = os.getenv("MAX_ACTOR_NUMS", "20")
-
+    @staticmethod
+    def _get_op_resources(init_kwargs):
         resources = {}
 
         if init_kwargs.get("npu", 0) > 0:
@@ -164,10 +263,54 @@ class RayDataset(BasicDataset):
 
         cpu = init_kwargs.get("cpu", 0.05)
         memory = init_kwargs.get("memory", None)
+        return resources, cpu, memory
+
+    def _run_fused_ops(self, operators_cls_list, init_kwargs_list, **kwargs):
+        max_actor_nums = os.getenv("MAX_ACTOR_NUMS", "20")
+        resources, _, memory = self._get_op_resources(init_kwargs_list[0])
+        cpu = max(self._get_op_resources(init_kwargs)[1] for init_kwargs in init_kwargs_list)
+
+        kwargs.update({"ext_params": {}, "failed_reason": {}, "target_type": None})
+        try:
+            self.data = self.data.map(FusedMapper,
+                                      fn_constructor_kwargs={"operators_cls_list": operators_cls_list,
+                                                             "init_kwargs_list": init_kwargs_list},
+                                      fn_kwargs=kwargs,
+                                      resources=resources,
+                                      num_cpus=cpu,
+                                      memory=memory,
+                                      compute=rd.ActorPoolStrategy(min_size=1,
+                                                                   max_size=int(max_actor_nums)))
+        except Exception as e:
+            logger.error(e)
+            raise Exception("Error! Ops Details:") from e
+
+    def _run_single_op(self, operators_cls, init_kwargs, **kwargs):
+        max_actor_nums = os.getenv("MAX_ACTOR_NUMS", "20")
+
+        resources, cpu, memory = self._get_op_resources(init_kwargs)
 
         kwargs.update({"ext_params": {}, "failed_reason": {}, "target_type": None})
         try:
-            if issubclass(operators_cls, (Mapper, RELATIVE_Mapper)):
+            if issubclass(operators_cls, (Mapper, RELATIVE_Mapper, Filter, RELATIVE_Filter)) \
+                    and operators_cls.is_batch_op():
+                batch_size = int(init_kwargs.get("batch_size", os.getenv("OP_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+                batch_format = init_kwargs.get("batch_format", DEFAULT_BATCH_FORMAT)
+                logger.info(f"Ops {init_kwargs.get('op_name')} run in batch mode, batch size: {batch_size}, "
+                            f"batch format: {batch_format}.")
+                self.data = self.data.map_batches(BatchOpWrapper,
+                                                  fn_constructor_args=(operators_cls,),
+                                                  fn_constructor_kwargs=init_kwargs,
+                                                  fn_kwargs=kwargs,
+                                                  batch_size=batch_size,
+                                                  batch_format=batch_format,
+                                                  resources=resources,
+                                                  num_cpus=cpu,
+                                                  memory=memory,
+                                                  compute=rd.ActorPoolStrategy(min_size=1,
+                                                                               max_size=int(max_actor_nums)))
+
+            elif issubclass(operators_cls, (Mapper, RELATIVE_Mapper)):
                 self.data = self.data.map(operators_cls,
                                           fn_constructor_kwargs=init_kwargs,
                                           fn_kwargs=kwargs,
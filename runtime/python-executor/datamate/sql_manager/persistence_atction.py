@@ -1,18 +1,32 @@
 # -*- coding: utf-8 -*-
 
+import atexit
 import json
 import os
+import threading
 import time
 import uuid
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from loguru import logger
-from sqlalchemy import text
+from sqlalchemy import column, insert, table, text
 
+from datamate.common.utils.shared_actor import SharedActor
 from datamate.sql_manager.sql_manager import SQLManager
 
+CLEAN_RESULT_TABLE = "t_clean_result"
+DATASET_FILE_TABLE = "t_dm_dataset_files"
+
+
+@lru_cache(maxsize=None)
+def _load_sql_dict():
+    sql_config_path = str(Path(__file__).parent / 'sql' / 'sql_config.json')
+    with open(sql_config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 
 class TaskInfoPersistence:
     def __init__(self):
@@ -20,12 +34,15 @@ class TaskInfoPersistence:
 
     @staticmethod
     def load_sql_dict():
-        """获取sql语句"""
-        sql_config_path = str(Path(__file__).parent / 'sql' / 'sql_config.json')
-        with open(sql_config_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        """获取sql语句，进程内只读取一次配置文件"""
+        return _load_sql_dict()
 
     def update_task_result(self, sample, file_id = None):
+        result_data = self.build_task_result(sample, file_id)
+        self.insert_result(result_data, str(self.sql_dict.get("insert_clean_result_sql")))
+
+    @staticmethod
+    def build_task_result(sample, file_id = None):
         if file_id is None:
             file_id = str(uuid.uuid4())
         instance_id = str(sample.get("instance_id"))
@@ -53,9 +70,14 @@ class TaskInfoPersistence:
             "status": status,
             "result": failed_reason
         }
-        self.insert_result(result_data, str(self.sql_dict.get("insert_clean_result_sql")))
+        return result_data
 
     def update_file_result(self, sample, file_id):
+        file_data = self.build_file_result(sample, file_id)
+        self.insert_result(file_data, str(self.sql_dict.get("insert_dataset_file_sql")))
+
+    @staticmethod
+    def build_file_result(sample, file_id):
         file_size = str(sample.get("fileSize"))
         file_type = str(sample.get("fileType"))
         file_name = str(sample.get("fileName"))
@@ -76,7 +98,7 @@ class TaskInfoPersistence:
             "created_at": create_time,
             "updated_at": create_time
         }
-        self.insert_result(file_data, str(self.sql_dict.get("insert_dataset_file_sql")))
+        return file_data
 
     def query_existing_files(self, dataset_id: str):
         result = None
@@ -86,10 +108,39 @@ class TaskInfoPersistence:
             result = execute_result.fetchall()
         return result
 
+    def query_new_file_paths(self, dataset_id: str, file_paths: List[str]) -> List[str]:
+        """返回file_paths中尚未登记到数据集的路径"""
+        if not file_paths:
+            return []
+        query_sql = str(self.sql_dict.get("query_new_dataset_files_sql"))
+        with SQLManager.create_connect() as conn:
+            execute_result = conn.execute(text(query_sql), {"dataset_id": dataset_id, "file_paths": file_paths})
+            return [row[0] for row in execute_result]
+
+    def query_file_results(self, instance_id: str):
+        query_sql = str(self.sql_dict.get("query_file_results_sql"))
+        with SQLManager.create_connect() as conn:
+            execute_result = conn.execute(text(query_sql), {"instance_id": instance_id})
+            result = execute_result.fetchall()
+        return result
+
+    def delete_failed_results(self, instance_id: str):
+        delete_sql = str(self.sql_dict.get("delete_failed_results_sql"))
+        self.insert_result({"instance_id": instance_id}, delete_sql)
+
     def batch_insert_files(self, samples):
         insert_sql = str(self.sql_dict.get("insert_dataset_file_sql"))
         self.batch_execute(insert_sql, samples)
 
+    @staticmethod
+    def bulk_insert(table_name: str, rows: List[Dict[str, Any]]):
+        """多行 VALUES 批量插入，rows 中每行的字段需一致"""
+        if not rows:
+            return
+        target = table(table_name, *[column(name) for name in rows[0].keys()])
+        with SQLManager.create_connect() as conn:
+            conn.execute(insert(target), rows)
+
     def persistence_task_info(self, sample: Dict[str, Any]):
         file_id = str(uuid.uuid4())
         self.update_task_result(sample, file_id)
@@ -213,3 +264,157 @@ class TaskInfoPersistence:
                 conn.execute(text(delete_similar_text_tables_sql), {"instance_id": instance_id})
         except Exception as e:
             logger.warning(f"delete database for flow: {instance_id} error", e)
+
+
+class ResultFlushTracker:
+    """任务级的执行结果刷新状态，记录缓冲区中仍有未写入数据库记录的写入器"""
+
+    def __init__(self):
+        self._pending_writers = set()
+
+    def mark(self, writer_id: str, pending: bool):
+        if pending:
+            self._pending_writers.add(writer_id)
+        else:
+            self._pending_writers.discard(writer_id)
+
+    def pending_count(self) -> int:
+        return len(self._pending_writers)
+
+
+class TaskResultWriter:
+    """进程级的任务结果缓冲写入器
+
+    算子按文件产生的清洗结果与数据集文件记录先写入缓冲区，达到行数阈值或超过刷新间隔后批量插入数据库，
+    进程退出时再刷新一次缓冲区。缓冲区由空变为非空、由非空变为空时更新任务共享的 ResultFlushTracker，
+    执行器在阶段结束、扫描导出目录前通过 wait_for_results_flushed 等待所有写入器写完。
+    批量插入失败时逐行重试，多次写入失败的记录记录日志后丢弃，避免单条坏记录阻塞整张表。
+    """
+
+    BATCH_SIZE = int(os.getenv("RESULT_WRITER_BATCH_SIZE", "200"))
+    FLUSH_INTERVAL = float(os.getenv("RESULT_WRITER_FLUSH_INTERVAL", "2"))
+    MAX_ATTEMPTS = int(os.getenv("RESULT_WRITER_MAX_ATTEMPTS", "3"))
+    # 执行器等待各写入器刷新完成的最长时间（秒）
+    FLUSH_TIMEOUT = float(os.getenv("RESULT_WRITER_FLUSH_TIMEOUT", "60"))
+    TRACKER_NAME = "result_flush_tracker"
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.persistence = TaskInfoPersistence()
+        # 缓冲区元素为 (记录, 已失败次数)
+        self._buffers = {CLEAN_RESULT_TABLE: [], DATASET_FILE_TABLE: []}
+        self._lock = threading.RLock()
+        self._last_flush_time = time.time()
+        self._writer_id = str(uuid.uuid4())
+        self._tracker = None
+        self._pending = False
+        self._flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+        self._flush_thread.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @classmethod
+    def flush_instance(cls):
+        """刷新当前进程写入器的缓冲区，进程中尚未创建写入器时不做任何操作"""
+        if cls._instance is not None:
+            cls._instance.flush()
+
+    @classmethod
+    def get_tracker(cls, instance_id: str) -> SharedActor:
+        return SharedActor.for_task(instance_id, ResultFlushTracker, cls.TRACKER_NAME)
+
+    @classmethod
+    def wait_for_results_flushed(cls, instance_id: str) -> bool:
+        """等待任务中所有写入器把缓冲的执行结果写入数据库，超时返回False"""
+        tracker = cls.get_tracker(instance_id)
+        deadline = time.time() + cls.FLUSH_TIMEOUT
+        while True:
+            pending_count = tracker.call("pending_count")
+            if not pending_count:
+                return True
+            if time.time() >= deadline:
+                logger.warning(f"instance_id: {instance_id}, {pending_count} result writers are still flushing "
+                               f"after {cls.FLUSH_TIMEOUT}s.")
+                return False
+            time.sleep(min(cls.FLUSH_INTERVAL, 0.2))
+
+    def update_task_result(self, sample, file_id = None):
+        self._append(CLEAN_RESULT_TABLE, [TaskInfoPersistence.build_task_result(sample, file_id)],
+                     sample.get("instance_id"))
+
+    def persistence_task_info(self, sample: Dict[str, Any]):
+        file_id = str(uuid.uuid4())
+        with self._lock:
+            self._append(CLEAN_RESULT_TABLE, [TaskInfoPersistence.build_task_result(sample, file_id)],
+                         sample.get("instance_id"))
+            self._append(DATASET_FILE_TABLE, [TaskInfoPersistence.build_file_result(sample, file_id)],
+                         sample.get("instance_id"))
+
+    def _append(self, table_name: str, rows: List[Dict[str, Any]], instance_id: str = None):
+        with self._lock:
+            self._buffers[table_name].extend((row, 0) for row in rows)
+            if instance_id and self._tracker is None:
+                self._tracker = self.get_tracker(instance_id)
+            self._mark_pending(True)
+            if sum(len(buffer) for buffer in self._buffers.values()) >= self.BATCH_SIZE:
+                self.flush()
+
+    def _mark_pending(self, pending: bool):
+        """缓冲区状态变化时更新任务共享的刷新状态"""
+        if self._pending == pending or self._tracker is None:
+            return
+        try:
+            self._tracker.call("mark", self._writer_id, pending)
+            self._pending = pending
+        except Exception as e:
+            logger.warning(f"Update result flush tracker failed: {e}")
+
+    def flush(self):
+        """将缓冲区中的记录批量写入数据库，批量写入失败时逐行写入，失败的记录保留到下次刷新直至达到重试上限"""
+        with self._lock:
+            self._last_flush_time = time.time()
+            for table_name, buffer in self._buffers.items():
+                if not buffer:
+                    continue
+                entries = list(buffer)
+                buffer.clear()
+                try:
+                    self.persistence.bulk_insert(table_name, [row for row, _ in entries])
+                    continue
+                except Exception as e:
+                    logger.warning(f"Flush {len(entries)} rows into {table_name} failed, retry row by row: {e}")
+                for row, attempts in entries:
+                    try:
+                        self.persistence.bulk_insert(table_name, [row])
+                    except Exception as e:
+                        if attempts + 1 >= self.MAX_ATTEMPTS:
+                            logger.error(f"Drop row of {table_name} after {attempts + 1} failed attempts: {row}, "
+                                         f"error: {e}")
+                        else:
+                            buffer.append((row, attempts + 1))
+            self._mark_pending(any(self._buffers.values()))
+
+    def close(self):
+        """进程退出时最后一次刷新缓冲区，仍写入失败的记录记录日志"""
+        with self._lock:
+            self.flush()
+            for table_name, buffer in self._buffers.items():
+                for row, attempts in buffer:
+                    logger.error(f"Drop row of {table_name} on exit after {attempts + 1} failed attempts: {row}")
+                buffer.clear()
+            self._mark_pending(False)
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.FLUSH_INTERVAL)
+            if time.time() - self._last_flush_time >= self.FLUSH_INTERVAL:
+                self.flush()
@@ -1,11 +1,15 @@
 import base64
+import glob
+import os
+import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from json import dumps as jdumps
 from json import loads as jloads
-from typing import Dict, Optional
+from typing import Dict, List, Optional
 from urllib.parse import urljoin
 
-import ray
+import pyarrow as pa
 import requests
 import yaml
 from jsonargparse import ArgumentParser
@@ -13,9 +17,16 @@ from loguru import logger
 
 from datamate.core.base_op import FileExporter, SUCCESS_STATUS
 from datamate.core.constant import Fields
+from datamate.sql_manager.persistence_atction import TaskResultWriter
 from datamate.wrappers.executor import RayExecutor
 
 DJ_OUTPUT = "outputs"
+# 交给Data-Juicer的数据集分片数，由Ray并行写出
+DJ_NUM_SHARDS = int(os.getenv("DJ_NUM_SHARDS", "8"))
+# 同时提交给Data-Juicer服务处理的分片数
+DJ_CONCURRENCY = int(os.getenv("DJ_CONCURRENCY", "4"))
+# 需要看到完整数据集的算子（全局去重、按全局统计选取），流程中包含时所有分片作为一个数据集提交
+GLOBAL_OP_SUFFIXES = ("_deduplicator", "_selector")
 
 
 class DataJuicerClient:
@@ -79,45 +90,82 @@ class DataJuicerExecutor(RayExecutor):
     def __init__(self, cfg = None, meta = None):
         super().__init__(cfg, meta)
         self.client = DataJuicerClient(base_url="http://datamate-data-juicer:8000")
-        self.dataset_path = f"/flow/{self.cfg.instance_id}/dataset_on_dj.jsonl"
-        self.export_path = f"/flow/{self.cfg.instance_id}/processed_dataset.jsonl"
+        self.dataset_path = f"/flow/{self.cfg.instance_id}/dataset_on_dj"
+        self.export_path = f"/flow/{self.cfg.instance_id}/processed_dataset"
 
-    def add_column(self, batch):
-        batch_size = len(batch["filePath"])
-        batch["execute_status"] = [SUCCESS_STATUS] * batch_size
-        batch[Fields.instance_id] = [self.cfg.instance_id] * batch_size
-        batch[Fields.export_path] = [self.cfg.export_path] * batch_size
-        return batch
+    def is_global_process(self) -> bool:
+        """流程中是否包含必须作用于完整数据集的算子"""
+        return any(op_name.endswith(GLOBAL_OP_SUFFIXES) for op in self.cfg.process for op_name in op)
+
+    def write_shards(self, dataset) -> List[str]:
+        """由Ray并行读取文件并写出JSONL分片，返回待提交的分区（分片文件或分片目录）"""
+        dataset = dataset.map(FileExporter().read_file, num_cpus=0.05)
+        # 清理重试时残留的分片，避免重复提交
+        shutil.rmtree(self.dataset_path, ignore_errors=True)
+        dataset.repartition(max(DJ_NUM_SHARDS, 1)).write_json(self.dataset_path)
+        shards = sorted(glob.glob(os.path.join(glob.escape(self.dataset_path), "*.json*")))
+        if self.is_global_process():
+            logger.info("Process contains dataset level ops, submit all shards as one partition.")
+            return [self.dataset_path] if shards else []
+        return shards
+
+    def process_partition(self, index: int, partition_path: str) -> str:
+        """提交单个分区给Data-Juicer处理，返回处理结果路径"""
+        export_path = os.path.join(self.export_path, f"part-{index:05d}.jsonl")
+        dj_config = self.client.init_config(partition_path, export_path, self.cfg.process)
+        return self.client.execute_config(dj_config)
+
+    def save_batch(self, batch: pa.Table) -> pa.Table:
+        """批量落盘并登记处理结果，只把写出的文件路径返回给下游"""
+        exporter = FileExporter()
+        task_info = TaskResultWriter.get_instance()
+        file_paths = []
+        for sample in batch.to_pylist():
+            sample["execute_status"] = SUCCESS_STATUS
+            sample[Fields.instance_id] = self.cfg.instance_id
+            sample[Fields.export_path] = self.cfg.export_path
+            if exporter.execute(sample):
+                task_info.persistence_task_info(sample)
+            file_paths.append(sample.get("filePath"))
+        # 结果离开当前批次前写入数据库，避免与后续的导出目录扫描重复登记
+        task_info.flush()
+        return pa.table({"filePath": pa.array(file_paths, type=pa.string())})
+
+    def save_partition(self, result_path: str):
+        """流式读取单个分区的处理结果并批量落盘"""
+        processed_dataset = self.load_dataset(result_path)
+        processed_dataset = processed_dataset.map_batches(self.save_batch, batch_format="pyarrow", num_cpus=0.05)
+        for _ in processed_dataset.iter_batches(batch_format="pyarrow"):
+            pass
 
     def run(self):
         # 1. 加载数据集
         logger.info('Loading dataset with Ray...')
 
         if self.meta:
-            file_content = base64.b64decode(self.meta)
-            lines = file_content.splitlines()
-            dataset = ray.data.from_items([jloads(line) for line in lines])
+            dataset = self.load_meta_dataset(self.meta)
         else:
             dataset = self.load_dataset()
 
         logger.info('Read data...')
-        dataset = dataset.map(FileExporter().read_file, num_cpus=0.05)
-
-        with open(self.dataset_path, "w", encoding="utf-8") as f:
-            for batch_df in dataset.iter_batches(batch_format="pandas", batch_size=2048):
-                batch_df.to_json(f, orient="records", lines=True, force_ascii=False)
+        partitions = self.write_shards(dataset)
 
-        logger.info('Processing data...')
+        logger.info(f'Processing data in {len(partitions)} partitions...')
         tstart = time.time()
+        os.makedirs(self.export_path, exist_ok=True)
         try:
-            dj_config = self.client.init_config(self.dataset_path, self.export_path, self.cfg.process)
-            result_path = self.client.execute_config(dj_config)
-
-            processed_dataset = self.load_dataset(result_path)
-            processed_dataset = processed_dataset.map_batches(self.add_column, num_cpus=0.05)
-            processed_dataset = processed_dataset.map(FileExporter().save_file_and_db, num_cpus=0.05)
-            for _ in processed_dataset.iter_batches():
-                pass
+            # 各分区并发交给Data-Juicer处理，先完成的分区先落盘
+            with ThreadPoolExecutor(max_workers=max(DJ_CONCURRENCY, 1)) as executor:
+                futures = [executor.submit(self.process_partition, index, partition_path)
+                           for index, partition_path in enumerate(partitions)]
+                try:
+                    for future in as_completed(futures):
+                        self.save_partition(future.result())
+                except Exception:
+                    # 任一分区失败时不再提交尚未开始的分区
+                    for future in futures:
+                        future.cancel()
+                    raise
         except Exception as e:
             logger.error(f"An unexpected error occurred.", e)
             raise e
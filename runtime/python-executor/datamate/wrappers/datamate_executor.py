@@ -1,14 +1,13 @@
 # -*- coding: utf-8 -*-
 
 import base64
-import json
 import time
 
-import ray
 import yaml
 from jsonargparse import ArgumentParser
 from loguru import logger
 
+from datamate.core.checkpoint import CleanResultCheckpointer
 from datamate.core.dataset import RayDataset
 from datamate.wrappers.executor import RayExecutor
 
@@ -30,9 +29,7 @@ class DataMateExecutor(RayExecutor):
         logger.info('Loading dataset with Ray...')
 
         if self.meta:
-            file_content = base64.b64decode(self.meta)
-            lines = file_content.splitlines()
-            dataset = ray.data.from_items([json.loads(line) for line in lines])
+            dataset = self.load_meta_dataset(self.meta)
         else:
             dataset = self.load_dataset()
         dataset = RayDataset(dataset, self.cfg)
@@ -40,12 +37,18 @@ class DataMateExecutor(RayExecutor):
         # 3. 处理数据
         logger.info('Processing data...')
         tstart = time.time()
-        dataset.process(self.cfg.process, **getattr(self.cfg, 'kwargs', {}))
-        tend = time.time()
-        logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
-
-        for _ in dataset.data.iter_batches():
-            pass
+        try:
+            dataset.process(self.cfg.process,
+                            checkpointer=CleanResultCheckpointer(self.cfg.instance_id),
+                            **getattr(self.cfg, 'kwargs', {}))
+            tend = time.time()
+            logger.info(f'All Ops are done in {tend - tstart:.3f}s.')
+
+            for _ in dataset.data.iter_batches():
+                pass
+            self.wait_for_results_flushed()
+        finally:
+            self.release_shared_actors()
 
         self.scan_files()
 
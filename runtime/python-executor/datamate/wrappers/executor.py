@@ -1,14 +1,119 @@
+import base64
 import json
 import time
+from io import BytesIO
 from typing import Dict
 
 from datamate.common.utils.file_scanner import FileScanner
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.json as pa_json
 import ray
 from jsonargparse import dict_to_namespace
 from loguru import logger
 
 from datamate.common.utils import check_valid_path
-from datamate.sql_manager.persistence_atction import TaskInfoPersistence
+from datamate.common.utils.shared_actor import SharedActor
+from datamate.sql_manager.persistence_atction import TaskInfoPersistence, TaskResultWriter
+
+
+# 源文件信息字段 -> 保存源文件信息的字段
+SOURCE_META_COLUMNS = {
+    "fileId": "sourceFileId",
+    "fileName": "sourceFileName",
+    "fileType": "sourceFileType",
+    "fileSize": "sourceFileSize",
+}
+# 元数据中按字符串处理的列，避免不同数据块推断出不同类型
+META_STRING_COLUMNS = ("filePath", "extraFilePath", "extraFileType",
+                       *SOURCE_META_COLUMNS.keys(), *SOURCE_META_COLUMNS.values())
+# 数据集文件中通常为字符串的元数据列，按字符串解析；fileSize等数值列解析后再转为字符串
+META_PARSE_OPTIONS = pa_json.ParseOptions(explicit_schema=pa.schema(
+    [(name, pa.string()) for name in ("filePath", "fileId", "fileName", "fileType")]))
+# 读取元数据JSONL时每个数据块的目标字节数
+META_BLOCK_SIZE = 8 << 20
+
+
+def _is_truthy(array: pa.ChunkedArray) -> pa.ChunkedArray:
+    """与Python真值判断一致：空值、空字符串、0均视为假"""
+    if pa.types.is_string(array.type) or pa.types.is_large_string(array.type):
+        mask = pc.not_equal(array, "")
+    elif pa.types.is_integer(array.type) or pa.types.is_floating(array.type):
+        mask = pc.not_equal(array, 0)
+    elif pa.types.is_boolean(array.type):
+        mask = array
+    elif pa.types.is_null(array.type):
+        return pa.chunked_array([pa.array([False] * len(array), type=pa.bool_())])
+    else:
+        mask = pc.is_valid(array)
+    return pc.fill_null(mask, False)
+
+
+def _set_column(table: pa.Table, name: str, array) -> pa.Table:
+    if name in table.column_names:
+        return table.set_column(table.column_names.index(name), name, array)
+    return table.append_column(name, array)
+
+
+def _meta_to_string(value):
+    return None if value is None else str(value)
+
+
+def parse_meta_lines(lines) -> pa.Table:
+    """将JSONL文本行解析为Arrow表，同一列类型不一致时逐行解析并把元数据列转为字符串"""
+    lines = [line for line in lines if line and line.strip()]
+    if not lines:
+        return pa.table({name: pa.array([], type=pa.string()) for name in META_STRING_COLUMNS})
+    try:
+        return pa_json.read_json(BytesIO("\n".join(lines).encode("utf-8")), parse_options=META_PARSE_OPTIONS)
+    except pa.ArrowInvalid as e:
+        logger.warning(f"Parse metadata with inferred types failed, parse line by line: {e}")
+    rows = [json.loads(line) for line in lines]
+    # 按全部行的字段并集构造列，元数据列固定为字符串，其余列按各自取值推断类型
+    names = list(dict.fromkeys(name for row in rows for name in row))
+    return pa.table({
+        name: pa.array([_meta_to_string(row.get(name)) for row in rows], type=pa.string())
+        if name in META_STRING_COLUMNS else pa.array([row.get(name) for row in rows])
+        for name in names
+    })
+
+
+def fill_source_meta(table: pa.Table, dataset_id: str) -> pa.Table:
+    """load_meta的列式实现，对一个Arrow批次整体补齐源文件信息"""
+    num_rows = len(table)
+    for column in META_STRING_COLUMNS:
+        if column in table.column_names and not pa.types.is_string(table[column].type):
+            table = _set_column(table, column, table[column].cast(pa.string()))
+    for column, source_column in SOURCE_META_COLUMNS.items():
+        if column not in table.column_names:
+            continue
+        values = table[column]
+        if source_column in table.column_names:
+            fallback = table[source_column]
+        else:
+            fallback = pa.nulls(num_rows, type=pa.string())
+        table = _set_column(table, source_column, pc.if_else(_is_truthy(values), values, fallback))
+
+    if "totalPageNum" in table.column_names and not pa.types.is_null(table["totalPageNum"].type):
+        values = table["totalPageNum"]
+        table = _set_column(table, "totalPageNum",
+                            pc.if_else(_is_truthy(values), values, pa.scalar(0).cast(values.type)))
+    else:
+        table = _set_column(table, "totalPageNum", pa.array([0] * num_rows, type=pa.int64()))
+
+    for column in ("extraFilePath", "extraFileType"):
+        if column in table.column_names and not pa.types.is_null(table[column].type):
+            values = table[column]
+            table = _set_column(table, column,
+                                pc.if_else(_is_truthy(values), values, pa.scalar(None, type=values.type)))
+        else:
+            table = _set_column(table, column, pa.nulls(num_rows, type=pa.string()))
+
+    return _set_column(table, "dataset_id", pa.array([dataset_id] * num_rows, type=pa.string()))
+
+
+def _parse_meta_batch(batch: pa.Table, dataset_id: str) -> pa.Table:
+    return fill_source_meta(parse_meta_lines(batch["text"].to_pylist()), dataset_id)
 
 
 class RayExecutor:
@@ -52,6 +157,18 @@ class RayExecutor:
         meta["dataset_id"] = self.cfg.dataset_id
         return meta
 
+    def load_meta_dataset(self, meta):
+        """从base64编码的元数据JSONL构建数据集，driver只按行切分，解析与补齐元数据在各个数据块上完成"""
+        lines = base64.b64decode(meta).decode("utf-8").splitlines()
+        num_blocks = max(1, sum(len(line) for line in lines) // META_BLOCK_SIZE)
+        dataset = ray.data.from_arrow(pa.table({"text": pa.array(lines, type=pa.string())}))
+        return self.parse_meta_dataset(dataset.repartition(num_blocks))
+
+    def parse_meta_dataset(self, dataset):
+        """逐个数据块解析JSONL文本行并补齐源文件信息"""
+        return dataset.map_batches(_parse_meta_batch, fn_kwargs={"dataset_id": self.cfg.dataset_id},
+                                   batch_format="pyarrow", batch_size=None, num_cpus=0.05)
+
     def run(self):
         pass
 
@@ -62,10 +179,9 @@ class RayExecutor:
             jsonl_file_path = self.cfg.dataset_path
         while True:
             if check_valid_path(jsonl_file_path):
-                with open(jsonl_file_path, "r", encoding='utf-8') as meta:
-                    lines = meta.readlines()
-                    dataset = ray.data.from_items([self.load_meta(line) for line in lines])
-                    break
+                # 由Ray并行读取JSONL并在各个数据块上补齐元数据，driver不持有全部文件信息
+                dataset = self.parse_meta_dataset(ray.data.read_text(jsonl_file_path))
+                break
             if retry < 5:
                 retry += 1
                 time.sleep(retry)
@@ -76,6 +192,14 @@ class RayExecutor:
 
         return dataset
 
+    def wait_for_results_flushed(self):
+        """阶段结束、扫描导出目录前等待各算子进程缓冲的执行结果写入数据库"""
+        TaskResultWriter.wait_for_results_flushed(self.cfg.instance_id)
+
+    def release_shared_actors(self):
+        """任务结束时销毁该任务实例创建的共享Actor"""
+        SharedActor.release_task_actors(self.cfg.instance_id)
+
     def update_db(self, status):
         task_info = TaskInfoPersistence()
         task_info.update_result(self.cfg.dataset_id, self.cfg.instance_id, status)